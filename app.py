@@ -5,6 +5,12 @@ from routes.main_routes import main_bp
 from routes.history_routes import history_bp
 from routes.download_routes import download_bp
 from routes.sync_routes import sync_bp
+from routes.timeline_routes import timeline_bp
+from routes.analytics_routes import analytics_bp
+from routes.session_routes import session_bp
+from routes.ioc_routes import ioc_bp
+from routes.progress_routes import progress_bp
+from routes.admin_routes import admin_bp
 from utils.file_utils import ensure_upload_directory
 
 app = Flask(__name__,
@@ -20,6 +26,12 @@ app.register_blueprint(main_bp)
 app.register_blueprint(history_bp)
 app.register_blueprint(download_bp)
 app.register_blueprint(sync_bp,)
+app.register_blueprint(timeline_bp)
+app.register_blueprint(analytics_bp)
+app.register_blueprint(session_bp)
+app.register_blueprint(ioc_bp)
+app.register_blueprint(progress_bp)
+app.register_blueprint(admin_bp)
 
 if __name__ == '__main__':
     app.run(debug=app.config['DEBUG'], host=app.config['HOST'], port=app.config['PORT'])
\ No newline at end of file
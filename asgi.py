@@ -0,0 +1,263 @@
+"""
+ASGI entry point for serving the Flask app from an async server.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5002
+
+Flask views run on a bounded thread pool (Config.ASGI_THREADS), so hundreds
+of page and polling requests are served concurrently from one process.
+File responses (exports, static files) come back through the bridge's
+wsgi.file_wrapper with their file still open and are streamed by the event
+loop itself, so a slow client downloading a large export only holds a
+suspended coroutine, never a thread. Range requests get only the bytes of
+their 206 Content-Range. The Flask app's configuration is left untouched.
+
+Event streams (text/event-stream, e.g. /progress) are forwarded chunk by
+chunk as the view yields them. The bridge sets
+environ['flask_asgi.async_streams']; a view that then stores a
+subscribe(callback) function in environ['flask_asgi.stream_subscribe']
+promises a body that never blocks: it yields an empty chunk when it has
+nothing to send, and the bridge awaits the next callback (or
+STREAM_POLL_SECONDS) on the event loop, so an idle stream holds no pool
+thread. Set PROCESSING_WORKERS to also move history parsing into worker
+processes.
+"""
+import asyncio
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+from config import Config
+from app import app as flask_app
+
+# Chunk size for streaming file responses
+SEND_FILE_CHUNK_SIZE = 256 * 1024
+
+# Longest wait for a subscribed event stream's notification before asking it again
+STREAM_POLL_SECONDS = 1.0
+
+_CONTENT_RANGE_PATTERN = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+
+
+class FileBody:
+    """
+    The bridge's wsgi.file_wrapper. send_file() hands its open file back in
+    one of these, and the bridge streams it from the event loop's side; it
+    only reads the file itself when iterated by other WSGI middleware.
+    """
+
+    def __init__(self, file, block_size=8192):
+        self.file = file
+        self.block_size = block_size
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        data = self.file.read(self.block_size)
+        if not data:
+            raise StopIteration
+        return data
+
+    def seekable(self):
+        return hasattr(self.file, 'seekable') and self.file.seekable()
+
+    def seek(self, *args):
+        return self.file.seek(*args)
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        if hasattr(self.file, 'close'):
+            self.file.close()
+
+
+class FlaskASGI:
+    """Minimal WSGI-to-ASGI bridge with a thread pool and async file streaming"""
+
+    def __init__(self, wsgi_app, threads):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='flask')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        else:
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        loop = asyncio.get_running_loop()
+        with SpooledTemporaryFile(max_size=1024 * 1024) as body:
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                body.write(message.get('body', b''))
+                if not message.get('more_body'):
+                    break
+            body.seek(0)
+
+            environ = self._build_environ(scope, body)
+            status, headers, chunks = await loop.run_in_executor(self.executor, self._run_wsgi, environ)
+
+        content_range = None
+        response_headers = []
+        for name, value in headers:
+            if name.lower() == 'content-range':
+                content_range = value
+            response_headers.append((name.lower().encode('latin-1'), value.encode('latin-1')))
+
+        await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+        if isinstance(chunks, FileBody):
+            try:
+                # 304, 416 and other answers to conditional/range requests carry no file bytes
+                if status == 200 and scope['method'] != 'HEAD':
+                    await self._send_file(loop, chunks.file, send)
+                elif status == 206 and scope['method'] != 'HEAD':
+                    match = _CONTENT_RANGE_PATTERN.match(content_range or '')
+                    if match:
+                        start, end = int(match.group(1)), int(match.group(2))
+                        await self._send_file(loop, chunks.file, send, start, end - start + 1)
+            finally:
+                chunks.close()
+        elif not isinstance(chunks, list):
+            await self._send_stream(loop, chunks, send, environ.get('flask_asgi.stream_subscribe'))
+        else:
+            for chunk in chunks:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    def _run_wsgi(self, environ):
+        """Run the Flask app in a pool thread and collect its (small) response body"""
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = headers
+
+        iterable = self.wsgi_app(environ, start_response)
+        # A range response wraps the file body in werkzeug's range iterator
+        file_body = iterable if isinstance(iterable, FileBody) else getattr(iterable, 'iterable', None)
+        if isinstance(file_body, FileBody):
+            # Read by _send_file on the event loop's side, not here
+            return response['status'], response['headers'], file_body
+        if self._is_event_stream(response['headers']):
+            # Forwarded by _send_stream as it is produced, not buffered
+            return response['status'], response['headers'], iterable
+        try:
+            # File bodies are sent by _send_file, so what remains is buffered JSON/HTML
+            chunks = [chunk for chunk in iterable if chunk]
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
+        return response['status'], response['headers'], chunks
+
+    @staticmethod
+    def _is_event_stream(headers):
+        return any(name.lower() == 'content-type' and value.startswith('text/event-stream')
+                   for name, value in headers)
+
+    async def _send_stream(self, loop, iterable, send, subscribe=None):
+        """
+        Send each chunk of a streaming WSGI body as soon as it is produced. With
+        subscribe, an empty chunk means nothing is ready yet: wait for the next
+        notification on the event loop rather than in a pool thread.
+        """
+        ready = asyncio.Event()
+
+        def notify():
+            try:
+                loop.call_soon_threadsafe(ready.set)
+            except RuntimeError:
+                # The loop has closed
+                pass
+
+        unsubscribe = subscribe(notify) if subscribe is not None else None
+        iterator = iter(iterable)
+        try:
+            while True:
+                ready.clear()
+                chunk = await loop.run_in_executor(self.executor, next, iterator, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                elif unsubscribe is not None:
+                    try:
+                        await asyncio.wait_for(ready.wait(), STREAM_POLL_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            if unsubscribe is not None:
+                unsubscribe()
+            if hasattr(iterable, 'close'):
+                await loop.run_in_executor(self.executor, iterable.close)
+
+    async def _send_file(self, loop, f, send, start=0, length=None):
+        """
+        Stream an open file (or length bytes of it from start) to the client;
+        awaiting send() applies the client's backpressure
+        """
+        if start:
+            f.seek(start)
+        remaining = length
+        while remaining is None or remaining > 0:
+            size = SEND_FILE_CHUNK_SIZE if remaining is None else min(SEND_FILE_CHUNK_SIZE, remaining)
+            chunk = await loop.run_in_executor(None, f.read, size)
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+
+    @staticmethod
+    def _build_environ(scope, body):
+        """Translate an ASGI HTTP scope into a PEP 3333 environ"""
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+            'wsgi.file_wrapper': FileBody,
+            'flask_asgi.async_streams': True,
+        }
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name == 'CONTENT_TYPE':
+                environ['CONTENT_TYPE'] = value
+            elif name == 'CONTENT_LENGTH':
+                environ['CONTENT_LENGTH'] = value
+            else:
+                key = f"HTTP_{name}"
+                environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+
+app = FlaskASGI(flask_app, Config.ASGI_THREADS)
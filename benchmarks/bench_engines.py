@@ -0,0 +1,80 @@
+"""
+Compare the pandas, streaming and parallel processing engines.
+
+Each engine runs in a fresh process so peak RSS is measured in isolation
+(the parallel engine's range readers are separate processes, not counted).
+
+Usage:
+    python -m benchmarks.bench_engines --visits 200000 --urls 20000
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic_profiles import create_chrome_history, create_firefox_places
+
+
+def _run_engine(engine, browser_type, db_path, queue):
+    """Process db_path with one engine and report elapsed time and peak RSS"""
+    from services.history_processor import process_history_file
+
+    start = time.perf_counter()
+    result = process_history_file(db_path, browser_type, f"bench-{engine}", 1, 1000, engine=engine)
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = max_rss / (1024 * 1024) if sys.platform == 'darwin' else max_rss / 1024
+
+    queue.put({
+        'engine': engine,
+        'elapsed': elapsed,
+        'peak_mb': peak_mb,
+        'rows': result.get('total_entries', 0),
+        'error': result.get('error')
+    })
+
+
+def run_benchmark(browser_type, db_path, engines):
+    """Run each engine in its own process and collect the measurements"""
+    ctx = multiprocessing.get_context('spawn')
+    results = []
+    for engine in engines:
+        queue = ctx.Queue()
+        process = ctx.Process(target=_run_engine, args=(engine, browser_type, db_path, queue))
+        process.start()
+        results.append(queue.get())
+        process.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--browser', choices=['chrome', 'firefox'], default='chrome')
+    parser.add_argument('--visits', type=int, default=200000)
+    parser.add_argument('--urls', type=int, default=20000)
+    parser.add_argument('--engines', default='pandas,streaming,parallel')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.browser == 'firefox':
+            db_path = create_firefox_places(os.path.join(tmp_dir, 'places.sqlite'), args.urls, args.visits)
+        else:
+            db_path = create_chrome_history(os.path.join(tmp_dir, 'History'), args.urls, args.visits)
+
+        print(f"{args.browser}: {args.visits} visits over {args.urls} urls")
+        print(f"{'engine':<12}{'seconds':>10}{'rows/s':>14}{'peak MB':>10}")
+        for result in run_benchmark(args.browser, db_path, args.engines.split(',')):
+            if result['error']:
+                print(f"{result['engine']:<12} failed: {result['error']}")
+                continue
+            rate = result['rows'] / result['elapsed'] if result['elapsed'] else 0
+            print(f"{result['engine']:<12}{result['elapsed']:>10.2f}{rate:>14,.0f}{result['peak_mb']:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
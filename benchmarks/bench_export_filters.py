@@ -0,0 +1,93 @@
+"""
+Time filtered history exports against exporting everything.
+
+Builds a visit store directly (the same synthetic layout as
+bench_url_analytics), then for a few filters times selecting the matching
+visits through services.visit_query (first call, which builds the indexes,
+and repeated calls) and writing only those rows as CSV. Every selection is
+checked against a brute-force NumPy mask. The last row is the unfiltered
+export a client had to download and filter before.
+
+Usage:
+    python -m benchmarks.bench_export_filters --visits 2000000 --urls 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_url_analytics import build_store
+from benchmarks.synthetic_profiles import BASE_UNIX_TIME
+from services.exporters import history_chunks, write_export
+from services.visit_query import select_visits
+from services.visit_store import _column_array
+from utils.time_utils import resolve_timezone
+
+FIELDS = ['url', 'title', 'visit_time', 'visit_timestamp', 'visit_count', 'domain', 'registrable_domain']
+
+
+def brute_force(store, filters):
+    """Positions matching filters by masking every visit"""
+    epochs = store.epoch_array()
+    mask = np.ones(len(store), dtype=bool)
+    if 'start' in filters:
+        mask &= epochs >= filters['start']
+    if 'end' in filters:
+        mask &= epochs <= filters['end']
+    if 'domain' in filters:
+        mask &= store.domain_code_array() == store.domains.lookup(filters['domain'])
+    if 'registrable_domain' in filters:
+        mask &= store.registrable_code_array() == store.registrable_domains.lookup(filters['registrable_domain'])
+    if 'search' in filters:
+        titles = store.titles.values
+        matches = np.array([filters['search'] in f"{url} {titles[store.url_title_codes[code]]}".lower()
+                            for code, url in enumerate(store.url_values)], dtype=bool)
+        mask &= matches[_column_array(store.url_codes)]
+    return np.flatnonzero(mask)
+
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--visits', type=int, default=2000000)
+    parser.add_argument('--urls', type=int, default=100000)
+    args = parser.parse_args()
+
+    store, elapsed = _timed(lambda: build_store(args.urls, args.visits))
+    store.link_registrable_domains()
+    print(f"{args.visits} visits over {args.urls} urls built in {elapsed:.1f}s")
+
+    tz = resolve_timezone('UTC')
+    day = BASE_UNIX_TIME + 86400 * 100
+    cases = [
+        ('one day', {'start': day, 'end': day + 86399}),
+        ('domain, one day', {'domain': 'github.com', 'start': day, 'end': day + 86399}),
+        ('registrable domain', {'registrable_domain': 'example.co.uk'}),
+        ('search, one week', {'search': 'page12', 'start': day, 'end': day + 7 * 86400 - 1}),
+    ]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'export.csv')
+        print(f"{'filter':<22}{'rows':>10}{'first ms':>10}{'select ms':>11}{'export ms':>11}{'check':>7}")
+        for name, filters in cases:
+            _, first = _timed(lambda: select_visits(store, filters))
+            positions, select = _timed(lambda: select_visits(store, filters))
+            _, export = _timed(lambda: write_export('csv', history_chunks(store, FIELDS, tz, positions=positions),
+                                                    FIELDS, path))
+            check = 'ok' if np.array_equal(positions, brute_force(store, filters)) else 'FAIL'
+            print(f"{name:<22}{len(positions):>10}{first * 1000:>10.1f}{select * 1000:>11.2f}"
+                  f"{export * 1000:>11.1f}{check:>7}")
+
+        rows, export = _timed(lambda: write_export('csv', history_chunks(store, FIELDS, tz), FIELDS, path))
+        print(f"{'none (full export)':<22}{rows:>10}{'':>10}{'':>11}{export * 1000:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
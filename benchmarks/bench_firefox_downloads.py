@@ -0,0 +1,102 @@
+"""
+Compare the legacy LIKE '%download%' Firefox downloads queries with the
+targeted attribute-id lookup in services/firefox_downloads.py.
+
+Usage:
+    python -m benchmarks.bench_firefox_downloads --places 200000 --downloads 20000
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from benchmarks.synthetic_profiles import create_firefox_places
+
+# The query process_firefox_downloads used before the pivoted lookup
+LEGACY_QUERY = """
+SELECT
+    a.content as filename,
+    p.url as url,
+    a.dateAdded as download_time_us,
+    '' as mime_type,
+    0 as file_size
+FROM moz_annos a
+JOIN moz_places p ON a.place_id = p.id
+WHERE a.anno_attribute_id IN (
+    SELECT id FROM moz_anno_attributes WHERE name LIKE '%download%'
+)
+ORDER BY a.dateAdded DESC
+"""
+
+# Its fallback when the query above found nothing: every annotation in the profile
+LEGACY_FALLBACK_QUERY = """
+SELECT
+    a.content as filename,
+    p.url as url,
+    a.dateAdded as download_time_us,
+    a.type as file_type
+FROM moz_annos a
+JOIN moz_places p ON a.place_id = p.id
+ORDER BY a.dateAdded DESC
+"""
+
+
+def _time(func, repeat):
+    """Best wall-clock time of repeat calls, with the last result"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--places', type=int, default=200000)
+    parser.add_argument('--visits', type=int, default=200000)
+    parser.add_argument('--downloads', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    from services.firefox_downloads import (
+        FIREFOX_DOWNLOADS_QUERY, read_firefox_downloads, resolve_download_attributes,
+        DESTINATION_ATTRIBUTE, METADATA_ATTRIBUTE
+    )
+    from services.schema_detection import get_query_plan
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = create_firefox_places(os.path.join(tmp_dir, 'places.sqlite'),
+                                        args.places, args.visits, args.downloads)
+        plan = get_query_plan(db_path)
+        conn = sqlite3.connect(db_path)
+        annotations = conn.execute("SELECT COUNT(*) FROM moz_annos").fetchone()[0]
+
+        def targeted_sql():
+            attributes = resolve_download_attributes(conn)
+            return conn.execute(FIREFOX_DOWNLOADS_QUERY, {
+                'destination': attributes[DESTINATION_ATTRIBUTE],
+                'metadata': attributes[METADATA_ATTRIBUTE]
+            }).fetchall()
+
+        results = [
+            ('legacy', 'filename, url, time; metaData rows mixed in',
+             _time(lambda: conn.execute(LEGACY_QUERY).fetchall(), args.repeat)),
+            ('fallback', 'every annotation in the profile',
+             _time(lambda: conn.execute(LEGACY_FALLBACK_QUERY).fetchall(), args.repeat)),
+            ('targeted', 'SQL only',
+             _time(targeted_sql, args.repeat)),
+            ('extract', 'targeted + metaData parsing: end time, state, size',
+             _time(lambda: read_firefox_downloads(conn, plan), args.repeat))
+        ]
+        conn.close()
+
+    print(f"{args.downloads} downloads, {annotations} annotations over {args.places} places")
+    print(f"{'query':<10}{'seconds':>10}{'rows':>10}  notes")
+    for name, notes, (elapsed, rows) in results:
+        print(f"{name:<10}{elapsed:>10.3f}{len(rows):>10}  {notes}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Time IOC list compilation and matching at threat-intel list sizes.
+
+Generates --indicators indicators (70% domains, 25% URLs, 5% hashes) with a
+few hundred planted hits on the synthetic hosts, builds a visit store of
+--visits Zipf-distributed visits over --urls URLs, then times compiling
+the list and matching the store with each available Aho-Corasick backend.
+
+Usage:
+    python -m benchmarks.bench_ioc --indicators 1000000 --visits 2000000 --urls 200000
+"""
+import argparse
+import random
+import time
+
+from benchmarks.bench_url_analytics import build_store
+from benchmarks.synthetic_profiles import HOSTS
+from services import ioc_matcher
+from services.ioc_matcher import IndicatorSet, match_store
+
+
+def generate_indicators(count, seed=1):
+    """Random domains, URLs and hashes, with some planted matches for the synthetic URLs"""
+    rng = random.Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyz0123456789'
+
+    def word(length):
+        return ''.join(rng.choice(letters) for _ in range(length))
+
+    indicators = []
+    for i in range(count):
+        kind = rng.random()
+        if kind < 0.70:
+            indicators.append(f"{word(rng.randint(5, 12))}.{rng.choice(['com', 'net', 'org', 'ru', 'xyz'])}")
+        elif kind < 0.95:
+            indicators.append(f"http://{word(8)}.com/{word(6)}/{word(10)}")
+        else:
+            indicators.append(f"{rng.getrandbits(256):064x}")
+
+    # Planted hits: one host and a few path substrings of the synthetic profiles
+    indicators.append(HOSTS[4])
+    indicators += [f"url:/page{index}" for index in range(1000, 1300)]
+    return indicators
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--indicators', type=int, default=1000000)
+    parser.add_argument('--visits', type=int, default=2000000)
+    parser.add_argument('--urls', type=int, default=200000)
+    args = parser.parse_args()
+
+    indicators = generate_indicators(args.indicators)
+    store = build_store(args.urls, args.visits)
+    print(f"{len(indicators)} indicators against {args.visits} visits over {args.urls} urls")
+
+    backends = [('pyahocorasick', ioc_matcher.ahocorasick)] if ioc_matcher.ahocorasick else []
+    backends.append(('python', None))
+    print(f"{'backend':<15}{'compile s':>11}{'match s':>10}{'visits hit':>12}{'indicators hit':>16}")
+    for name, module in backends:
+        ioc_matcher.ahocorasick = module
+        start = time.perf_counter()
+        indicator_set = IndicatorSet(indicators)
+        compile_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        positions, _, summary = match_store(store, indicator_set)
+        match_seconds = time.perf_counter() - start
+        print(f"{name:<15}{compile_seconds:>11.2f}{match_seconds:>10.2f}{len(positions):>12}{len(summary):>16}")
+
+
+if __name__ == '__main__':
+    main()
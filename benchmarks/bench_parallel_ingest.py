@@ -0,0 +1,71 @@
+"""
+Visit ingest of one history database: sequential cursor vs rowid ranges.
+
+Creates a synthetic Chrome History, then times reading its visits into a
+VisitStore with the streaming engine's single cursor and with
+services.parallel_ingest at increasing worker counts (each count gets a
+fresh pool, whose start-up is included). Every parallel store is checked
+against the sequential one, column by column.
+
+Usage:
+    python -m benchmarks.bench_parallel_ingest --visits 2000000 --urls 200000 --workers 1,2,4,8
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.synthetic_profiles import create_chrome_history
+from config import Config
+from services import parallel_ingest
+from services.streaming_processor import CHROME_VISITS_QUERY, read_visits
+from services.visit_store import _column_array
+
+
+def _same(a, b):
+    return (len(a) == len(b) and list(a.url_values) == list(b.url_values) and a.domains.values == b.domains.values
+            and all(np.array_equal(_column_array(getattr(a, name)), _column_array(getattr(b, name)))
+                    for name in ('url_codes', 'visit_micros', 'visit_ids', 'from_visits', 'transitions')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--visits', type=int, default=2000000)
+    parser.add_argument('--urls', type=int, default=200000)
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--chunk-rows', type=int, default=Config.INGEST_CHUNK_ROWS)
+    args = parser.parse_args()
+    Config.INGEST_CHUNK_ROWS = args.chunk_rows
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = create_chrome_history(os.path.join(tmp_dir, 'History'), args.urls, args.visits)
+        ranges = len(parallel_ingest.rowid_ranges(db_path, 'visits'))
+        print(f"{args.visits} visits over {args.urls} urls, {ranges} ranges of {args.chunk_rows} rowids, "
+              f"{os.cpu_count()} CPUs")
+
+        conn = sqlite3.connect(db_path)
+        start = time.perf_counter()
+        expected = read_visits(conn.cursor(), CHROME_VISITS_QUERY)
+        sequential = time.perf_counter() - start
+        conn.close()
+
+        print(f"{'reader':<16}{'seconds':>10}{'visits/s':>14}{'speedup':>9}{'check':>7}")
+        print(f"{'sequential':<16}{sequential:>10.2f}{len(expected) / sequential:>14,.0f}{1:>8.2f}x{'':>7}")
+        for workers in [int(value) for value in args.workers.split(',')]:
+            Config.INGEST_WORKERS = workers
+            parallel_ingest._ingest_pool = None
+            start = time.perf_counter()
+            store = parallel_ingest.read_visits_parallel(db_path, 'chrome')
+            elapsed = time.perf_counter() - start
+            if parallel_ingest._ingest_pool is not None:
+                parallel_ingest._ingest_pool.shutdown()
+            check = 'ok' if _same(store, expected) else 'FAIL'
+            print(f"{f'{workers} workers':<16}{elapsed:>10.2f}{len(store) / elapsed:>14,.0f}"
+                  f"{sequential / elapsed:>8.2f}x{check:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Time-window queries with and without partition pruning.
+
+Builds a visit store (the same synthetic layout as bench_url_analytics, one
+visit per minute), saves it and memory-maps it twice: once with its time
+partitions and once without them, as stores saved before partitioning
+were. For a few windows it times an hourly histogram, exact top domains
+and a visit selection on both, checks that the answers are identical and
+reports how many visits each query had to read.
+
+Usage:
+    python -m benchmarks.bench_partitions --visits 5000000 --urls 200000 --granularity month
+"""
+import argparse
+import os
+import tempfile
+import time
+from array import array
+
+from benchmarks.bench_url_analytics import build_store
+from benchmarks.synthetic_profiles import BASE_UNIX_TIME
+from services.histogram import build_histogram
+from services.url_analytics import top_values
+from services.visit_query import select_visits
+from services.visit_store import VisitStore
+
+
+def _timed(func, repeat=3):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--visits', type=int, default=5000000)
+    parser.add_argument('--urls', type=int, default=200000)
+    parser.add_argument('--granularity', default='month', choices=VisitStore.PARTITION_GRANULARITIES)
+    args = parser.parse_args()
+
+    store, elapsed = _timed(lambda: build_store(args.urls, args.visits), repeat=1)
+    store.link_registrable_domains()
+    print(f"{args.visits} visits over {args.urls} urls built in {elapsed:.1f}s")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'columns')
+        store.save(path)
+        flat = VisitStore.load(path)
+        partitioned = VisitStore.load(path)
+        _, elapsed = _timed(lambda: partitioned.build_partitions(args.granularity), repeat=1)
+        print(f"{len(partitioned.partition_offsets) - 1} {args.granularity} partitions built in {elapsed * 1000:.1f}ms")
+        flat.partition_offsets = array('q')
+
+        newest = BASE_UNIX_TIME + (args.visits - 1) * 60
+        windows = [('last day', 86400), ('last week', 7 * 86400), ('last 30 days', 30 * 86400)]
+        queries = [
+            ('histogram', lambda s, start, end: build_histogram(s, 'hour', None, start, end)),
+            ('top domains', lambda s, start, end: top_values(s, 'domain', 20, start, end, mode='exact')),
+            ('select', lambda s, start, end: select_visits(s, {'start': start, 'end': end}).tolist())
+        ]
+
+        print(f"{'window':<14}{'query':<13}{'read':>10}{'flat ms':>10}{'pruned ms':>11}{'speedup':>9}{'check':>7}")
+        for name, seconds in windows:
+            start, end = newest - seconds + 1, newest
+            lo, hi = partitioned.time_span(start, end)
+            for query, func in queries:
+                expected, flat_time = _timed(lambda: func(flat, start, end))
+                result, pruned_time = _timed(lambda: func(partitioned, start, end))
+                check = 'ok' if result == expected else 'FAIL'
+                print(f"{name:<14}{query:<13}{hi - lo:>10}{flat_time * 1000:>10.1f}{pruned_time * 1000:>11.1f}"
+                      f"{flat_time / max(pruned_time, 1e-9):>8.1f}x{check:>7}")
+        print(f"(read: visits in the overlapping partitions, of {len(store)}; "
+              f"visits are stored newest first, so select already binary-searched without partitions)")
+
+
+if __name__ == '__main__':
+    main()
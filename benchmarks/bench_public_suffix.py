@@ -0,0 +1,90 @@
+"""
+Time registrable-domain (eTLD+1) resolution over many unique hosts.
+
+Generates --hosts distinct hosts of zero to three random labels under
+suffixes drawn from the bundled Public Suffix List (half of them) or a few
+common ones, then times loading the list, the per-host trie walk
+(split_host) and the vectorized column lookup (split_hosts) used at ingest,
+and checks that both agree. A final row times the domain roll-up query on
+a store that visits every host once.
+
+Usage:
+    python -m benchmarks.bench_public_suffix --hosts 1000000
+"""
+import argparse
+import random
+import time
+from array import array
+
+import numpy as np
+
+from services.visit_store import VisitStore
+from utils.public_suffix import PUBLIC_SUFFIX_LIST_PATH, PublicSuffixTrie, get_trie, split_host, split_hosts
+
+
+def generate_hosts(count, seed=1):
+    """count distinct lowercase hosts under listed and common public suffixes"""
+    rng = random.Random(seed)
+    with open(PUBLIC_SUFFIX_LIST_PATH, encoding='utf-8') as f:
+        rules = sorted({
+            line.strip().lstrip('!*.') for line in f
+            if line.strip() and not line.startswith('//') and line.isascii()
+        })
+    common = ['com', 'net', 'org', 'co.uk', 'github.io']
+    letters = 'abcdefghijklmnopqrstuvwxyz0123456789'
+    hosts = set()
+    while len(hosts) < count:
+        labels = [''.join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(rng.randint(0, 3))]
+        labels.append(rng.choice(rules) if rng.random() < 0.5 else rng.choice(common))
+        hosts.add('.'.join(labels))
+    return sorted(hosts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hosts', type=int, default=1000000)
+    args = parser.parse_args()
+
+    hosts = generate_hosts(args.hosts)
+    print(f"{len(hosts)} unique hosts")
+
+    start = time.perf_counter()
+    trie = PublicSuffixTrie.from_file()
+    trie.node_table()
+    load_seconds = time.perf_counter() - start
+    get_trie().node_table()
+
+    start = time.perf_counter()
+    expected = [split_host(host) for host in hosts]
+    scalar_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    registrable, registrable_codes, suffixes, suffix_codes = split_hosts(hosts)
+    vector_seconds = time.perf_counter() - start
+
+    mismatches = sum(
+        (registrable[r], suffixes[s]) != pair
+        for r, s, pair in zip(registrable_codes.tolist(), suffix_codes.tolist(), expected)
+    )
+
+    store = VisitStore()
+    for host in hosts:
+        store._url_code(0, f"https://{host}/", '', 1, host)
+    store.url_codes = array('l', np.arange(len(hosts), dtype=np.dtype('l')).tobytes())
+    store.visit_micros = array('q', bytes(8 * len(hosts)))
+    start = time.perf_counter()
+    store.link_registrable_domains()
+    rollup = store.count_by_registrable_domain()
+    ingest_seconds = time.perf_counter() - start
+
+    print(f"{'step':<28}{'seconds':>9}{'hosts/s':>12}")
+    print(f"{'load list + node table':<28}{load_seconds:>9.2f}{'':>12}")
+    for name, seconds in (('trie walk per host', scalar_seconds), ('vectorized column', vector_seconds),
+                          ('ingest + roll-up', ingest_seconds)):
+        print(f"{name:<28}{seconds:>9.2f}{len(hosts) / seconds:>12,.0f}")
+    print(f"{len(registrable)} registrable domains, {len(suffixes)} public suffixes, "
+          f"{len(rollup)} rolled up, {mismatches} mismatches")
+
+
+if __name__ == '__main__':
+    main()
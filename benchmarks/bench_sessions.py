@@ -0,0 +1,76 @@
+"""
+Time navigation-graph linking and session segmentation at increasing sizes.
+
+Each visit links to the previous one with probability --link-rate and is
+preceded by an idle period with probability --idle-rate, as in the
+synthetic profiles. Linking and segmentation should scale near-linearly.
+
+Usage:
+    python -m benchmarks.bench_sessions --sizes 1000000,2000000,4000000
+"""
+import argparse
+import time
+from array import array
+
+import numpy as np
+
+from benchmarks.synthetic_profiles import BASE_UNIX_TIME
+from services.sessions import get_navigation_tree, get_sessions, session_bounds
+from services.visit_store import VisitStore
+
+
+def build_store(num_visits, link_rate, idle_rate, seed=1):
+    """Store of num_visits visits to one URL with from_visit chains and idle gaps, newest first"""
+    rng = np.random.default_rng(seed)
+    gaps = rng.integers(1, 600, num_visits) * 1000000
+    gaps[rng.random(num_visits) < idle_rate] += 6 * 3600 * 1000000
+    micros = BASE_UNIX_TIME * 1000000 + np.cumsum(gaps)
+
+    visit_ids = rng.permutation(num_visits) + 1
+    from_visits = np.zeros(num_visits, dtype=np.int64)
+    linked = rng.random(num_visits) < link_rate
+    linked[0] = False
+    from_visits[linked] = visit_ids[np.flatnonzero(linked) - 1]
+
+    store = VisitStore()
+    store._url_code(1, 'https://example.com/', 'Example', num_visits, 'example.com')
+    store.url_codes = array('l', bytes(np.dtype('l').itemsize * num_visits))
+    store.visit_micros = array('q', micros[::-1].tobytes())
+    store.visit_ids = array('q', visit_ids[::-1].astype(np.int64).tobytes())
+    store.from_visits = array('q', from_visits[::-1].tobytes())
+    store.transitions = array('q', bytes(8 * num_visits))
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000000,2000000,4000000')
+    parser.add_argument('--link-rate', type=float, default=0.6)
+    parser.add_argument('--idle-rate', type=float, default=0.02)
+    args = parser.parse_args()
+
+    print(f"{'visits':>10}{'link s':>9}{'segment s':>11}{'page ms':>9}{'tree ms':>9}{'sessions':>10}")
+    for size in [int(size) for size in args.sizes.split(',')]:
+        store = build_store(size, args.link_rate, args.idle_rate)
+
+        start = time.perf_counter()
+        store.link_parents()
+        link = time.perf_counter() - start
+
+        start = time.perf_counter()
+        starts, _ = session_bounds(store)
+        segment = time.perf_counter() - start
+
+        start = time.perf_counter()
+        get_sessions(store, 1, 50)
+        page = time.perf_counter() - start
+
+        start = time.perf_counter()
+        get_navigation_tree(store, 'chrome', 0, 1, 50)
+        tree = time.perf_counter() - start
+
+        print(f"{size:>10}{link:>9.2f}{segment:>11.3f}{page * 1000:>9.1f}{tree * 1000:>9.1f}{len(starts):>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Compare exact and HyperLogLog-based unique counts in timeline rollups.
+
+Builds several visit stores (profiles with overlapping URLs), then times an
+exact and an approximate rollup across all of them per interval. The first
+approximate query builds the day sketches; later ones only merge them. The
+relative error of the approximate unique URL counts is reported against the
+exact answer.
+
+Usage:
+    python -m benchmarks.bench_timeline_rollup --profiles 4 --visits 2000000 --urls 200000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.bench_url_analytics import build_store
+from config import Config
+from services.timeline_rollup import INTERVALS, timeline_rollup
+
+
+def _timed(func, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def _errors(approx, exact):
+    """Median and maximum relative error of the per-bucket unique URL counts"""
+    errors = [abs(a['unique_urls'] - e['unique_urls']) / e['unique_urls']
+              for a, e in zip(approx['timeline'], exact['timeline']) if e['unique_urls']]
+    return (float(np.median(errors)), max(errors)) if errors else (0.0, 0.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profiles', type=int, default=4)
+    parser.add_argument('--visits', type=int, default=2000000, help='visits per profile')
+    parser.add_argument('--urls', type=int, default=200000, help='URLs per profile')
+    parser.add_argument('--precision', type=int, default=Config.HLL_PRECISION)
+    args = parser.parse_args()
+    Config.HLL_PRECISION = args.precision
+
+    # Different seeds draw different visit mixes over the same URL set
+    stores, elapsed = _timed(lambda: [build_store(args.urls, args.visits, seed) for seed in range(1, args.profiles + 1)])
+    for store in stores:
+        store.build_partitions(Config.PARTITION_GRANULARITY)
+    print(f"{args.profiles} profiles of {args.visits} visits over {args.urls} urls built in {elapsed:.1f}s, "
+          f"{1 << args.precision} registers per sketch")
+
+    _, sketch_build = _timed(lambda: timeline_rollup(stores, mode='approx'))
+    print(f"day sketches built in {sketch_build:.2f}s")
+
+    print(f"{'interval':<10}{'buckets':>9}{'exact ms':>10}{'approx ms':>11}{'median err':>12}{'max err':>9}"
+          f"{'total err':>11}")
+    for interval in INTERVALS:
+        exact, exact_ms = _timed(lambda: timeline_rollup(stores, interval=interval, mode='exact'))
+        approx, approx_ms = _timed(lambda: timeline_rollup(stores, interval=interval, mode='approx'), 5)
+        median_error, max_error = _errors(approx, exact)
+        total_error = abs(approx['unique_urls'] - exact['unique_urls']) / max(exact['unique_urls'], 1)
+        print(f"{interval:<10}{len(exact['timeline']):>9}{exact_ms * 1000:>10.0f}{approx_ms * 1000:>11.1f}"
+              f"{median_error:>11.2%}{max_error:>9.2%}{total_error:>11.2%}")
+
+
+if __name__ == '__main__':
+    main()
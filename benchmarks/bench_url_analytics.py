@@ -0,0 +1,75 @@
+"""
+Compare exact and sketch-based top-N URL analytics.
+
+Builds a visit store directly (Zipf-distributed visits over synthetic URLs),
+then times the first query (which builds the dimension table or sketches)
+and repeated window queries, and reports the recall of the approximate
+top-N against the exact answer.
+
+Usage:
+    python -m benchmarks.bench_url_analytics --visits 5000000 --urls 200000
+"""
+import argparse
+import random
+import time
+from array import array
+
+import numpy as np
+
+from benchmarks.synthetic_profiles import BASE_UNIX_TIME, _random_url
+from services.url_analytics import DIMENSIONS, top_values
+from services.visit_store import VisitStore
+from utils.url_utils import extract_domain
+
+
+def build_store(num_urls, num_visits, seed=1):
+    """Visit store with num_visits Zipf-distributed visits over num_urls URLs, one per minute"""
+    rng = random.Random(seed)
+    store = VisitStore()
+    for index in range(num_urls):
+        url = _random_url(rng, index)
+        store._url_code(index, url, '', 0, extract_domain(url))
+
+    np_rng = np.random.default_rng(seed)
+    url_codes = (np_rng.zipf(1.2, num_visits) - 1) % num_urls
+    store.url_codes = array('l', url_codes.tolist())
+    store.visit_micros = array('q', ((BASE_UNIX_TIME + np.arange(num_visits)[::-1] * 60) * 1000000).tolist())
+    return store
+
+
+def _timed(func, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--visits', type=int, default=5000000)
+    parser.add_argument('--urls', type=int, default=200000)
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--window-days', type=int, default=30)
+    args = parser.parse_args()
+
+    store, elapsed = _timed(lambda: build_store(args.urls, args.visits))
+    print(f"{args.visits} visits over {args.urls} urls built in {elapsed:.1f}s")
+
+    start = BASE_UNIX_TIME + 86400 * 7
+    end = start + 86400 * args.window_days - 1
+    print(f"{'dimension':<12}{'exact build':>13}{'exact ms':>10}{'sketch build':>14}{'approx ms':>11}{'recall':>8}")
+    for dimension in DIMENSIONS:
+        _, exact_build = _timed(lambda: top_values(store, dimension, args.top, mode='exact'))
+        exact, exact_query = _timed(lambda: top_values(store, dimension, args.top, start, end, mode='exact'), 5)
+        _, sketch_build = _timed(lambda: top_values(store, dimension, args.top, mode='approx'))
+        approx, approx_query = _timed(lambda: top_values(store, dimension, args.top, start, end, mode='approx'), 5)
+
+        exact_values = {item['value'] for item in exact['items']}
+        approx_values = {item['value'] for item in approx['items']}
+        recall = len(exact_values & approx_values) / len(exact_values) if exact_values else 1.0
+        print(f"{dimension:<12}{exact_build:>12.2f}s{exact_query * 1000:>10.1f}"
+              f"{sketch_build:>13.2f}s{approx_query * 1000:>11.2f}{recall:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
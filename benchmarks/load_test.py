@@ -0,0 +1,177 @@
+"""
+Concurrent load test: fast polling clients alongside slow large downloads.
+
+Uploads a synthetic Chrome profile (unless --file-id is given), then runs
+--pollers clients hammering /get_page and /histogram while --downloaders
+clients fetch /api/export and read it at --download-kbps. Under the WSGI
+dev server slow downloads tie up request threads; under asgi.py they should
+not affect polling latency.
+
+Usage:
+    uvicorn asgi:app --port 5002 &
+    python -m benchmarks.load_test --url http://127.0.0.1:5002 --pollers 50 --downloaders 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+import uuid
+from urllib.parse import urlsplit
+
+from benchmarks.synthetic_profiles import create_chrome_history
+
+
+async def _request(host, port, method, path, body=b'', headers=None, read_rate=None):
+    """Send one HTTP/1.1 request; returns (status, body bytes). read_rate throttles reading in bytes/s."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {host}:{port}", "Connection: close",
+                 f"Content-Length: {len(body)}"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + body)
+        await writer.drain()
+
+        status = int((await reader.readline()).split()[1])
+        response_headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            response_headers[name.lower()] = value.strip()
+
+        chunks = []
+        chunk_size = 64 * 1024
+        while True:
+            chunk = await reader.read(chunk_size)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            if read_rate:
+                await asyncio.sleep(len(chunk) / read_rate)
+        data = b''.join(chunks)
+        if response_headers.get('transfer-encoding') == 'chunked':
+            data = _dechunk(data)
+        return status, data
+    finally:
+        writer.close()
+
+
+def _dechunk(data):
+    out = []
+    while data:
+        size_line, _, data = data.partition(b"\r\n")
+        size = int(size_line.split(b';')[0], 16)
+        if size == 0:
+            break
+        out.append(data[:size])
+        data = data[size + 2:]
+    return b''.join(out)
+
+
+async def upload_profile(host, port, db_path):
+    """Upload a History file as multipart/form-data and return its file_id"""
+    boundary = uuid.uuid4().hex
+    with open(db_path, 'rb') as f:
+        content = f.read()
+    body = (
+        f"--{boundary}\r\n"
+        f"Content-Disposition: form-data; name=\"file\"; filename=\"History\"\r\n"
+        f"Content-Type: application/octet-stream\r\n\r\n"
+    ).encode() + content + f"\r\n--{boundary}--\r\n".encode()
+    status, data = await _request(host, port, 'POST', '/upload', body,
+                                  {'Content-Type': f"multipart/form-data; boundary={boundary}"})
+    result = json.loads(data)
+    if status != 200 or 'error' in result:
+        raise RuntimeError(f"Upload failed ({status}): {result.get('error')}")
+    return result['file_id']
+
+
+async def poller(host, port, file_id, deadline, stats):
+    """Alternate page and histogram requests until the deadline"""
+    paths = [f"/get_page?file_id={file_id}&page={page}&page_size=100" for page in range(1, 6)]
+    paths.append(f"/histogram?file_id={file_id}&bucket=day")
+    i = 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            status, _ = await _request(host, port, 'GET', paths[i % len(paths)])
+            stats['poll_latency'].append(time.perf_counter() - start)
+            if status != 200:
+                stats['errors'] += 1
+        except OSError:
+            stats['errors'] += 1
+        i += 1
+
+
+async def downloader(host, port, file_id, export_format, read_rate, deadline, stats):
+    """Repeatedly export the history and read it at read_rate bytes/s"""
+    body = json.dumps({'file_id': file_id, 'format': export_format}).encode()
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            status, data = await _request(host, port, 'POST', '/api/export', body,
+                                          {'Content-Type': 'application/json'}, read_rate)
+            stats['download_seconds'].append(time.perf_counter() - start)
+            stats['download_bytes'] += len(data)
+            if status != 200:
+                stats['errors'] += 1
+        except OSError:
+            stats['errors'] += 1
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def run(args):
+    parts = urlsplit(args.url)
+    host, port = parts.hostname, parts.port or 80
+
+    file_id = args.file_id
+    if not file_id:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = create_chrome_history(os.path.join(tmp_dir, 'History'), args.urls, args.visits)
+            start = time.perf_counter()
+            file_id = await upload_profile(host, port, db_path)
+            print(f"Uploaded {args.visits} visits as {file_id} in {time.perf_counter() - start:.2f}s")
+
+    stats = {'poll_latency': [], 'download_seconds': [], 'download_bytes': 0, 'errors': 0}
+    deadline = time.perf_counter() + args.duration
+    tasks = [poller(host, port, file_id, deadline, stats) for _ in range(args.pollers)]
+    tasks += [downloader(host, port, file_id, args.format, args.download_kbps * 1024, deadline, stats)
+              for _ in range(args.downloaders)]
+    start = time.perf_counter()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    latency = stats['poll_latency']
+    print(f"{args.pollers} pollers, {args.downloaders} downloaders at {args.download_kbps} KB/s, {elapsed:.1f}s")
+    print(f"poll requests: {len(latency)} ({len(latency) / elapsed:,.0f} req/s), errors: {stats['errors']}")
+    print(f"poll latency ms: p50 {_percentile(latency, 50) * 1000:.1f}  "
+          f"p95 {_percentile(latency, 95) * 1000:.1f}  p99 {_percentile(latency, 99) * 1000:.1f}")
+    print(f"downloads completed: {len(stats['download_seconds'])}, "
+          f"{stats['download_bytes'] / (1024 * 1024):.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:5002')
+    parser.add_argument('--file-id', help='Use an already uploaded file instead of a synthetic profile')
+    parser.add_argument('--visits', type=int, default=100000)
+    parser.add_argument('--urls', type=int, default=10000)
+    parser.add_argument('--pollers', type=int, default=50)
+    parser.add_argument('--downloaders', type=int, default=10)
+    parser.add_argument('--download-kbps', type=int, default=256, help='Read rate of each downloader')
+    parser.add_argument('--format', default='csv')
+    parser.add_argument('--duration', type=float, default=20.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+"""
+Synthetic Chrome and Firefox history databases for benchmarks.
+"""
+import json
+import os
+import random
+import sqlite3
+
+# Seconds between 1601-01-01 and 1970-01-01
+CHROME_EPOCH_OFFSET = 11644473600
+
+# Start of the synthetic browsing window (2023-01-01 UTC)
+BASE_UNIX_TIME = 1672531200
+
+HOSTS = [
+    'www.google.com', 'mail.google.com', 'www.youtube.com', 'github.com',
+    'news.ycombinator.com', 'www.bbc.co.uk', 'a.cdn.example.co.uk',
+    'b.cdn.example.co.uk', 'docs.python.org', 'stackoverflow.com',
+    'en.wikipedia.org', 'www.reddit.com', 'downloads.example.org',
+]
+
+# Share of visits preceded by an idle period of hours
+IDLE_GAP_RATE = 0.02
+
+EXTENSIONS = ['.zip', '.exe', '.pdf', '.docx', '.png']
+
+
+def _random_url(rng, index):
+    """Build a plausible URL for synthetic url number index"""
+    host = rng.choice(HOSTS)
+    path = f"/section{index % 50}/page{index}"
+    if index % 7 == 0:
+        path += f"?q=term{index % 13}&lang=en"
+    return f"https://{host}{path}"
+
+
+def create_chrome_history(path, num_urls=2000, num_visits=20000, num_downloads=50, seed=1):
+    """Create a Chrome-style History database at path"""
+    rng = random.Random(seed)
+    if os.path.exists(path):
+        os.remove(path)
+
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+    CREATE TABLE meta(key LONGVARCHAR NOT NULL UNIQUE PRIMARY KEY, value LONGVARCHAR);
+    CREATE TABLE urls(id INTEGER PRIMARY KEY AUTOINCREMENT, url LONGVARCHAR, title LONGVARCHAR,
+        visit_count INTEGER DEFAULT 0 NOT NULL, typed_count INTEGER DEFAULT 0 NOT NULL,
+        last_visit_time INTEGER NOT NULL, hidden INTEGER DEFAULT 0 NOT NULL);
+    CREATE INDEX urls_url_index ON urls (url);
+    CREATE TABLE visits(id INTEGER PRIMARY KEY AUTOINCREMENT, url INTEGER NOT NULL,
+        visit_time INTEGER NOT NULL, from_visit INTEGER, transition INTEGER DEFAULT 0 NOT NULL,
+        segment_id INTEGER, visit_duration INTEGER DEFAULT 0 NOT NULL);
+    CREATE INDEX visits_url_index ON visits (url);
+    CREATE INDEX visits_time_index ON visits (visit_time);
+    CREATE TABLE visit_source(id INTEGER PRIMARY KEY, source INTEGER NOT NULL);
+    CREATE TABLE downloads (id INTEGER PRIMARY KEY, guid VARCHAR NOT NULL, current_path LONGVARCHAR NOT NULL,
+        target_path LONGVARCHAR NOT NULL, start_time INTEGER NOT NULL, received_bytes INTEGER NOT NULL,
+        total_bytes INTEGER NOT NULL, state INTEGER NOT NULL, danger_type INTEGER NOT NULL,
+        interrupt_reason INTEGER NOT NULL, hash BLOB NOT NULL, end_time INTEGER NOT NULL,
+        opened INTEGER NOT NULL, last_access_time INTEGER NOT NULL, transient INTEGER NOT NULL,
+        referrer VARCHAR NOT NULL, site_url VARCHAR NOT NULL, tab_url VARCHAR NOT NULL,
+        tab_referrer_url VARCHAR NOT NULL, http_method VARCHAR NOT NULL, by_ext_id VARCHAR NOT NULL,
+        by_ext_name VARCHAR NOT NULL, etag VARCHAR NOT NULL, last_modified VARCHAR NOT NULL,
+        mime_type VARCHAR(255) NOT NULL, original_mime_type VARCHAR(255) NOT NULL);
+    CREATE TABLE downloads_url_chains (id INTEGER NOT NULL, chain_index INTEGER NOT NULL,
+        url LONGVARCHAR NOT NULL, PRIMARY KEY (id, chain_index));
+    """)
+    conn.execute("INSERT INTO meta VALUES ('version', '56')")
+    conn.execute("INSERT INTO meta VALUES ('last_compatible_version', '16')")
+
+    urls = [(i, _random_url(rng, i), f"Page {i}") for i in range(1, num_urls + 1)]
+    conn.executemany(
+        "INSERT INTO urls (id, url, title, visit_count, last_visit_time) VALUES (?, ?, ?, 0, 0)",
+        urls
+    )
+
+    chrome_base = (BASE_UNIX_TIME + CHROME_EPOCH_OFFSET) * 1000000
+    visits = []
+    sources = []
+    visit_time = chrome_base
+    for visit_id in range(1, num_visits + 1):
+        visit_time += rng.randint(1, 600) * 1000000
+        # Occasional idle periods separate browsing sessions
+        if rng.random() < IDLE_GAP_RATE:
+            visit_time += rng.randint(1, 12) * 3600 * 1000000
+        from_visit = visit_id - 1 if visit_id > 1 and rng.random() < 0.6 else 0
+        transition = 0 if from_visit else 1
+        visits.append((visit_id, rng.randint(1, num_urls), visit_time, from_visit, transition))
+        if rng.random() < 0.1:
+            sources.append((visit_id, rng.choice([0, 1, 2])))
+    conn.executemany(
+        "INSERT INTO visits (id, url, visit_time, from_visit, transition) VALUES (?, ?, ?, ?, ?)",
+        visits
+    )
+    conn.executemany("INSERT INTO visit_source (id, source) VALUES (?, ?)", sources)
+    conn.execute("""
+    UPDATE urls SET
+        visit_count = (SELECT COUNT(*) FROM visits v WHERE v.url = urls.id),
+        last_visit_time = IFNULL((SELECT MAX(visit_time) FROM visits v WHERE v.url = urls.id), 0)
+    """)
+
+    for download_id in range(1, num_downloads + 1):
+        _, source_url_id, start_time, _, _ = rng.choice(visits)
+        source_url = urls[source_url_id - 1][1]
+        ext = rng.choice(EXTENSIONS)
+        file_name = f"file{download_id}{ext}"
+        file_url = f"https://downloads.example.org/files/{file_name}"
+        target_path = f"C:\\Users\\analyst\\Downloads\\{file_name}"
+        start_time += 5000000
+        conn.execute(
+            """INSERT INTO downloads VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0, 0, ?, ?, 0, 0, 0, ?, ?, ?, ?,
+            'GET', '', '', '', '', ?, ?)""",
+            (download_id, f"guid-{download_id}", target_path, target_path, start_time,
+             1024 * download_id, 1024 * download_id, rng.choice([1, 1, 1, 2, 3]),
+             os.urandom(32), start_time + 2000000, source_url, source_url, source_url, '',
+             'application/octet-stream', 'application/octet-stream')
+        )
+        conn.execute("INSERT INTO downloads_url_chains VALUES (?, 0, ?)", (download_id, source_url))
+        conn.execute("INSERT INTO downloads_url_chains VALUES (?, 1, ?)", (download_id, file_url))
+
+    conn.commit()
+    conn.close()
+    return path
+
+
+def create_firefox_places(path, num_places=2000, num_visits=20000, num_downloads=50, seed=1):
+    """Create a Firefox-style places.sqlite database at path"""
+    rng = random.Random(seed)
+    if os.path.exists(path):
+        os.remove(path)
+
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+    PRAGMA user_version = 70;
+    CREATE TABLE moz_places (id INTEGER PRIMARY KEY, url LONGVARCHAR, title LONGVARCHAR,
+        rev_host LONGVARCHAR, visit_count INTEGER DEFAULT 0, hidden INTEGER DEFAULT 0 NOT NULL,
+        typed INTEGER DEFAULT 0 NOT NULL, frecency INTEGER DEFAULT -1 NOT NULL,
+        last_visit_date INTEGER, guid TEXT, foreign_count INTEGER DEFAULT 0 NOT NULL,
+        url_hash INTEGER DEFAULT 0 NOT NULL);
+    CREATE TABLE moz_historyvisits (id INTEGER PRIMARY KEY, from_visit INTEGER, place_id INTEGER,
+        visit_date INTEGER, visit_type INTEGER, session INTEGER, source INTEGER DEFAULT 0 NOT NULL,
+        triggeringPlaceId INTEGER);
+    CREATE INDEX moz_historyvisits_placedateindex ON moz_historyvisits (place_id, visit_date);
+    CREATE INDEX moz_historyvisits_dateindex ON moz_historyvisits (visit_date);
+    CREATE TABLE moz_anno_attributes (id INTEGER PRIMARY KEY, name VARCHAR(32) UNIQUE NOT NULL);
+    CREATE TABLE moz_annos (id INTEGER PRIMARY KEY, place_id INTEGER NOT NULL,
+        anno_attribute_id INTEGER, content LONGVARCHAR, flags INTEGER DEFAULT 0,
+        expiration INTEGER DEFAULT 0, type INTEGER DEFAULT 0, dateAdded INTEGER DEFAULT 0,
+        lastModified INTEGER DEFAULT 0);
+    CREATE UNIQUE INDEX moz_annos_placeattributeindex ON moz_annos (place_id, anno_attribute_id);
+    """)
+
+    places = [(i, _random_url(rng, i), f"Page {i}") for i in range(1, num_places + 1)]
+    conn.executemany("INSERT INTO moz_places (id, url, title) VALUES (?, ?, ?)", places)
+
+    visits = []
+    visit_date = BASE_UNIX_TIME * 1000000
+    for visit_id in range(1, num_visits + 1):
+        visit_date += rng.randint(1, 600) * 1000000
+        # Occasional idle periods separate browsing sessions
+        if rng.random() < IDLE_GAP_RATE:
+            visit_date += rng.randint(1, 12) * 3600 * 1000000
+        from_visit = visit_id - 1 if visit_id > 1 and rng.random() < 0.6 else 0
+        visit_type = 1 if from_visit else 2
+        visits.append((visit_id, from_visit, rng.randint(1, num_places), visit_date, visit_type))
+    conn.executemany(
+        "INSERT INTO moz_historyvisits (id, from_visit, place_id, visit_date, visit_type) VALUES (?, ?, ?, ?, ?)",
+        visits
+    )
+    conn.execute("""
+    UPDATE moz_places SET
+        visit_count = (SELECT COUNT(*) FROM moz_historyvisits h WHERE h.place_id = moz_places.id),
+        last_visit_date = (SELECT MAX(visit_date) FROM moz_historyvisits h WHERE h.place_id = moz_places.id)
+    """)
+
+    # Unrelated annotations make the legacy catch-all download query expensive
+    conn.execute("INSERT INTO moz_anno_attributes (id, name) VALUES (1, 'downloads/destinationFileURI')")
+    conn.execute("INSERT INTO moz_anno_attributes (id, name) VALUES (2, 'downloads/metaData')")
+    conn.execute("INSERT INTO moz_anno_attributes (id, name) VALUES (3, 'bookmarkProperties/description')")
+    for place_id in range(1, num_places + 1, 3):
+        conn.execute(
+            "INSERT INTO moz_annos (place_id, anno_attribute_id, content, dateAdded) VALUES (?, 3, ?, ?)",
+            (place_id, f"Description {place_id}", BASE_UNIX_TIME * 1000000)
+        )
+
+    next_place_id = num_places + 1
+    for download_id in range(1, num_downloads + 1):
+        ext = rng.choice(EXTENSIONS)
+        file_name = f"file{download_id}{ext}"
+        place_id = next_place_id + download_id
+        added = rng.choice(visits)[3] + 5000000
+        conn.execute(
+            "INSERT INTO moz_places (id, url, title) VALUES (?, ?, ?)",
+            (place_id, f"https://downloads.example.org/files/{file_name}", file_name)
+        )
+        conn.execute(
+            "INSERT INTO moz_annos (place_id, anno_attribute_id, content, dateAdded) VALUES (?, 1, ?, ?)",
+            (place_id, f"file:///home/analyst/Downloads/{file_name}", added)
+        )
+        meta = {'state': rng.choice([1, 1, 1, 3]), 'deleted': False,
+                'endTime': added // 1000 + 2000, 'fileSize': 1024 * download_id}
+        conn.execute(
+            "INSERT INTO moz_annos (place_id, anno_attribute_id, content, dateAdded) VALUES (?, 2, ?, ?)",
+            (place_id, json.dumps(meta), added)
+        )
+
+    conn.commit()
+    conn.close()
+    return path
@@ -0,0 +1,44 @@
+"""
+Command-line batch processor: the history engine without the web server.
+
+    python cli.py /evidence/profiles -o /evidence/out --format parquet --workers 8
+
+Walks the input directory for Chrome and Firefox history databases
+(detected by content, not name), processes them in a process pool and
+writes per-profile columns and exports plus a merged history; see
+services/batch_processor.py for the output layout.
+"""
+import argparse
+import sys
+from config import Config
+from services.batch_processor import process_directory
+from services.exporters import EXPORT_FORMATS, ExportDependencyError
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input_dir', help='Directory tree of collected browser profiles')
+    parser.add_argument('-o', '--output', required=True, help='Output directory')
+    parser.add_argument('--format', default='parquet', choices=sorted(EXPORT_FORMATS),
+                        help='Export format of the per-profile and merged files (default: parquet)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes (default: PROCESSING_WORKERS, else the CPU count)')
+    parser.add_argument('--engine', default=Config.PROCESSING_ENGINE, choices=['pandas', 'streaming', 'parallel'],
+                        help='Processing engine (default: PROCESSING_ENGINE)')
+    parser.add_argument('--tz', default=None, help='IANA timezone for formatted times (default: DISPLAY_TIMEZONE)')
+    args = parser.parse_args(argv)
+
+    try:
+        manifest = process_directory(args.input_dir, args.output, args.format, args.workers, args.engine, args.tz)
+    except (ExportDependencyError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    print(f"{manifest['processed']} profiles processed, {manifest['failed']} failed, "
+          f"{manifest['total_visits']} visits in {manifest['seconds']:.2f}s "
+          f"({manifest['visits_per_second']:,.0f} visits/s)")
+    return 1 if manifest['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
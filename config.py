@@ -10,5 +10,84 @@ class Config:
     # Upload folder settings
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'temp_uploads')
     
+    # Per-upload workspaces: memory-mapped column caches and garbage collection
+    COLUMN_CACHE = os.environ.get('COLUMN_CACHE', 'true').lower() in ('1', 'true', 'yes')
+    WORKSPACE_QUOTA_MB = int(os.environ.get('WORKSPACE_QUOTA_MB', 2048))
+    EXPORT_TTL_SECONDS = int(os.environ.get('EXPORT_TTL_SECONDS', 3600))
+    
+    # Storage backend: 'memory' (single process) or 'sqlite' (shared by all worker processes)
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'memory')
+    STORAGE_DB_PATH = os.environ.get('STORAGE_DB_PATH', os.path.join(UPLOAD_FOLDER, 'storage.sqlite'))
+    
+    # Timezone used when formatting timestamps for display and export (IANA name)
+    DISPLAY_TIMEZONE = os.environ.get('DISPLAY_TIMEZONE', 'UTC')
+    
+    # JSON responses at least this many bytes are compressed (brotli if installed, else gzip)
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+    COMPRESSION_LEVEL_GZIP = int(os.environ.get('COMPRESSION_LEVEL_GZIP', 6))
+    COMPRESSION_LEVEL_BROTLI = int(os.environ.get('COMPRESSION_LEVEL_BROTLI', 5))
+    
     # Page size for pagination
-    DEFAULT_PAGE_SIZE = 1000
\ No newline at end of file
+    DEFAULT_PAGE_SIZE = 1000
+    
+    # History processing engine: 'pandas' (DataFrame based), 'streaming' (sqlite3 cursors) or
+    # 'parallel' (streaming, with visits read by rowid ranges in a process pool)
+    PROCESSING_ENGINE = os.environ.get('PROCESSING_ENGINE', 'pandas')
+    
+    # Rows fetched per cursor.fetchmany() call by the streaming engine
+    STREAMING_BATCH_SIZE = int(os.environ.get('STREAMING_BATCH_SIZE', 5000))
+    
+    # Rows per export chunk (Parquet row group / Feather batch) and encoder threads
+    EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 50000))
+    EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', min(4, os.cpu_count() or 1)))
+    
+    # 'parallel' engine: processes reading one database's visits, and visit rowids per range
+    INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', os.cpu_count() or 1))
+    INGEST_CHUNK_ROWS = int(os.environ.get('INGEST_CHUNK_ROWS', 250000))
+    
+    # Worker processes for history parsing (0 parses in the request thread)
+    PROCESSING_WORKERS = int(os.environ.get('PROCESSING_WORKERS', 0))
+    
+    # Threads running Flask views when served through asgi.py
+    ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 32))
+    
+    # /analytics/top answers from sketches (mode=auto) for stores with more visits than this
+    ANALYTICS_SKETCH_THRESHOLD = int(os.environ.get('ANALYTICS_SKETCH_THRESHOLD', 2000000))
+    
+    # Time buckets (at most) of each /analytics/top sketch; every bucket holds about 36 KB
+    # (a 4 x 2048 int32 Count-Min table and 256 summary counters), so 512 take ~18 MB per dimension and store
+    ANALYTICS_SKETCH_BUCKETS = int(os.environ.get('ANALYTICS_SKETCH_BUCKETS', 512))
+    
+    # Timeline rollups count unique URLs/domains with HyperLogLog sketches (mode=auto) above this many visits
+    TIMELINE_SKETCH_THRESHOLD = int(os.environ.get('TIMELINE_SKETCH_THRESHOLD', 500000))
+    
+    # HyperLogLog registers per day sketch = 2**HLL_PRECISION (12: 4096 registers, ~1.6% standard error)
+    HLL_PRECISION = min(max(int(os.environ.get('HLL_PRECISION', 12)), 4), 16)
+    
+    # Visits are indexed in time partitions of one UTC 'month' or 'day' with min/max visit times,
+    # so time-window queries only read the overlapping partitions
+    PARTITION_GRANULARITY = os.environ.get('PARTITION_GRANULARITY', 'month')
+    
+    # Registered IOC indicator lists kept per process (least recently used dropped first)
+    # and seconds an unused list is kept
+    IOC_MAX_LISTS = int(os.environ.get('IOC_MAX_LISTS', 32))
+    IOC_LIST_TTL_SECONDS = int(os.environ.get('IOC_LIST_TTL_SECONDS', 86400))
+    
+    # Idle gap that ends a browsing session
+    SESSION_GAP_MINUTES = int(os.environ.get('SESSION_GAP_MINUTES', 30))
+    
+    # Request profiling (?profile=sample|cprofile or X-Profile) for callers with this admin token;
+    # empty disables it. Profiles are kept in PROFILE_FOLDER, newest PROFILE_KEEP only
+    PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN', '')
+    PROFILE_FOLDER = os.environ.get('PROFILE_FOLDER', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'temp_profiles'))
+    PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 50))
+    PROFILE_SAMPLE_INTERVAL_MS = float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', 5))
+    
+    # Progressive uploads: minimum gap between aggregate events, domains per event
+    # and how long a finished ingest's events stay available to late subscribers
+    PROGRESS_INTERVAL_SECONDS = float(os.environ.get('PROGRESS_INTERVAL_SECONDS', 0.5))
+    PROGRESS_TOP_DOMAINS = int(os.environ.get('PROGRESS_TOP_DOMAINS', 20))
+    PROGRESS_TTL_SECONDS = int(os.environ.get('PROGRESS_TTL_SECONDS', 600))
+    
+    # Progressive ingests running at once; further uploads wait for a free thread
+    PROGRESSIVE_WORKERS = int(os.environ.get('PROGRESSIVE_WORKERS', 2))
@@ -0,0 +1,90 @@
+from flask import Blueprint, request, jsonify, send_file, g
+import os
+from config import Config
+from utils.profiling import (RequestProfile, PROFILE_MODES, PROFILE_EXTENSIONS, token_matches,
+                             list_profiles, load_profile)
+
+admin_bp = Blueprint('admin', __name__)
+
+def _admin_token():
+    """Admin token from the X-Profile-Token header; never from the URL, which ends up in logs"""
+    return request.headers.get('X-Profile-Token', '')
+
+def _admin_error():
+    """Error response unless the request carries the admin token"""
+    if not Config.PROFILING_TOKEN:
+        return jsonify({'error': 'Profiling is disabled'}), 404
+    if not token_matches(_admin_token()):
+        return jsonify({'error': 'A valid admin token is required'}), 403
+    return None
+
+@admin_bp.before_app_request
+def start_request_profile():
+    """Profile any request that asks for it with ?profile=<mode> or X-Profile: <mode> and the admin token"""
+    mode = request.headers.get('X-Profile') or request.args.get('profile')
+    # Without a configured or matching token the request is served unprofiled,
+    # as if profiling did not exist
+    if not mode or not Config.PROFILING_TOKEN or not token_matches(_admin_token()):
+        return None
+    if mode not in PROFILE_MODES:
+        return jsonify({'error': f"Unsupported profile mode: {mode}. Use one of {', '.join(PROFILE_MODES)}"}), 400
+    g.request_profile = RequestProfile(mode, request.method, request.path)
+    g.request_profile.start()
+    return None
+
+@admin_bp.after_app_request
+def finish_request_profile(response):
+    """Store the profile and point to it from the response headers"""
+    profile = g.pop('request_profile', None)
+    if profile is None:
+        return response
+    try:
+        profile.save(response.status_code)
+    except Exception as e:
+        print(f"Error saving request profile {profile.id}: {e}")
+        return response
+    response.headers['X-Profile-Id'] = profile.id
+    response.headers['Server-Timing'] = profile.server_timing()
+    return response
+
+@admin_bp.teardown_app_request
+def stop_request_profile(exc):
+    """Stop a profiler left running by a request that failed before its response"""
+    profile = g.pop('request_profile', None)
+    if profile is not None:
+        profile.stop()
+
+@admin_bp.route('/admin/profiles', methods=['GET'])
+def get_profiles():
+    """List stored request profiles, newest first"""
+    error = _admin_error()
+    if error is not None:
+        return error
+    return jsonify({'profiles': list_profiles()})
+
+@admin_bp.route('/admin/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """Get a stored profile's summary: phase timings and the functions with the most self time"""
+    error = _admin_error()
+    if error is not None:
+        return error
+    summary = load_profile(profile_id)
+    if summary is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return jsonify(summary)
+
+@admin_bp.route('/admin/profiles/<profile_id>/download', methods=['GET'])
+def download_profile(profile_id):
+    """Download a stored profile: folded stacks (sample) or a pstats file (cprofile)"""
+    error = _admin_error()
+    if error is not None:
+        return error
+    summary = load_profile(profile_id)
+    if summary is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    path = os.path.join(Config.PROFILE_FOLDER, os.path.basename(summary['profile_file']))
+    if not os.path.exists(path):
+        return jsonify({'error': 'Profile file not found'}), 404
+    mimetype = 'text/plain' if summary['mode'] == 'sample' else 'application/octet-stream'
+    return send_file(path, mimetype=mimetype, as_attachment=True,
+                     download_name=f"profile-{profile_id}.{PROFILE_EXTENSIONS[summary['mode']]}")
@@ -0,0 +1,37 @@
+from flask import Blueprint, request, jsonify
+from services.storage import file_exists, get_processed_data, get_data_version
+from services.url_analytics import top_values
+from utils.http_utils import make_etag, not_modified, json_response
+
+analytics_bp = Blueprint('analytics', __name__)
+
+@analytics_bp.route('/analytics/top', methods=['GET'])
+def get_top_values():
+    """Get the most visited domains, registrable domains, suffixes, paths, schemes or query keys in a time window"""
+    file_id = request.args.get('file_id')
+    dimension = request.args.get('dimension', 'domain')
+    n = request.args.get('n', 20, type=int)
+    start = request.args.get('start', type=int)
+    end = request.args.get('end', type=int)
+    domain = request.args.get('domain')
+    registrable_domain = request.args.get('registrable_domain')
+    mode = request.args.get('mode', 'auto')
+    
+    if not file_id or not file_exists(file_id):
+        return jsonify({'error': 'Invalid file ID'}), 400
+    
+    etag = make_etag(file_id, get_data_version(file_id), endpoint='analytics_top', dimension=dimension,
+                     n=n, start=start, end=end, domain=domain, mode=mode,
+                     registrable_domain=registrable_domain)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    
+    data = get_processed_data(file_id)
+    try:
+        result = top_values(data['entries'], dimension, n, start, end, domain, mode, registrable_domain)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    result['file_id'] = file_id
+    
+    return json_response(result, etag)
@@ -1,10 +1,17 @@
 from flask import Blueprint, request, jsonify, send_file, Response
 import os
 import csv
-from config import Config
+import uuid
 from services.storage import get_processed_data, file_exists
-from utils.file_utils import get_temp_file_path, get_csv_file_path, detect_browser_type
-from services.history_processor import process_history_file
+from utils.file_utils import get_csv_file_path, get_export_file_path
+from services.history_processor import ensure_processed
+from services.serializers import serialize_downloads, serialize_download_sources
+from services.exporters import (ARROW_FORMATS, EXPORT_FORMATS, ExportDependencyError, history_chunks, list_chunks,
+                                write_export)
+from services.timeline_rollup import timeline_rollup
+from services.visit_query import VISIT_FILTERS, DOWNLOAD_FILTERS, parse_filters, select_visits, filter_downloads
+from utils.time_utils import resolve_timezone
+from utils.http_utils import make_etag, not_modified, json_response
 
 download_bp = Blueprint('download', __name__)
 
@@ -16,15 +23,25 @@ def get_downloads():
     if not file_id or not file_exists(file_id):
         return jsonify({'error': 'Invalid file ID'}), 400
     
+    try:
+        tz = resolve_timezone(request.args.get('tz'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     # Get data
     data = get_processed_data(file_id)
     
-    return jsonify({
+    etag = make_etag(file_id, data.get('version'), endpoint='downloads', tz=tz)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    
+    return json_response({
         'file_id': file_id,
         'browser_type': data['browser_type'],
-        'downloads': data.get('downloads', []),
-        'download_sources': data.get('download_sources', [])
-    })
+        'downloads': serialize_downloads(data.get('downloads', []), tz),
+        'download_sources': serialize_download_sources(data.get('download_sources', []), tz)
+    }, etag)
 
 @download_bp.route('/export_downloads/<file_id>', methods=['GET'])
 def export_downloads_csv(file_id):
@@ -35,24 +52,18 @@ def export_downloads_csv(file_id):
     # Ensure the file_id is a string for comparison
     file_id_str = str(file_id)
     
-    # If the file is not in memory, try to check if the file exists in the upload folder
-    if not file_exists(file_id_str):
-        temp_path = get_temp_file_path(file_id_str)
-        
-        if not os.path.exists(temp_path):
+    try:
+        tz = resolve_timezone(request.args.get('tz'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Re-process the upload if its results are no longer stored; concurrent requests share one ingest
+    try:
+        if not ensure_processed(file_id_str):
             return jsonify({'error': f"Invalid file ID: {file_id}"}), 400
-        
-        # Try to re-process the file if it exists but not in memory
-        try:
-            print(f"File found on disk but not in memory, attempting to re-process: {temp_path}")
-            browser_type = detect_browser_type(temp_path)
-            process_history_file(temp_path, browser_type, file_id_str, 1, Config.DEFAULT_PAGE_SIZE)
-            
-            if not file_exists(file_id_str):
-                return jsonify({'error': 'Failed to re-process file'}), 500
-        except Exception as e:
-            print(f"Error re-processing file: {e}")
-            return jsonify({'error': f"Error re-processing file: {str(e)}"}), 500
+    except Exception as e:
+        print(f"Error re-processing file: {e}")
+        return jsonify({'error': f"Error re-processing file: {str(e)}"}), 500
     
     # Get data for export
     data = get_processed_data(file_id_str)
@@ -78,7 +89,7 @@ def export_downloads_csv(file_id):
             
             writer.writeheader()
             download_count = 0
-            for download in data['downloads']:
+            for download in serialize_downloads(data['downloads'], tz):
                 # Filter only needed fields
                 row = {
                     'filename': download.get('filename', ''),
@@ -164,30 +175,19 @@ def export_data():
         file_id = request_data.get('file_id')
         export_format = request_data.get('format', 'csv').lower()
         data_type = request_data.get('data_type', 'history').lower()
-        filters = request_data.get('filters', {})
+        filters = request_data.get('filters') or {}
         
         if not file_id:
             return jsonify({'error': 'File ID is required'}), 400
             
-        # Validate file exists
         file_id_str = str(file_id)
-        if not file_exists(file_id_str):
-            temp_path = get_temp_file_path(file_id_str)
-            
-            if not os.path.exists(temp_path):
+        # Re-process the upload if its results are no longer stored; concurrent requests share one ingest
+        try:
+            if not ensure_processed(file_id_str):
                 return jsonify({'error': f"Invalid file ID: {file_id}"}), 400
-            
-            # Try to re-process the file
-            try:
-                print(f"File found on disk but not in memory, attempting to re-process: {temp_path}")
-                browser_type = detect_browser_type(temp_path)
-                process_history_file(temp_path, browser_type, file_id_str, 1, Config.DEFAULT_PAGE_SIZE)
-                
-                if not file_exists(file_id_str):
-                    return jsonify({'error': 'Failed to re-process file'}), 500
-            except Exception as e:
-                print(f"Error re-processing file: {e}")
-                return jsonify({'error': f"Error re-processing file: {str(e)}"}), 500
+        except Exception as e:
+            print(f"Error re-processing file: {e}")
+            return jsonify({'error': f"Error re-processing file: {str(e)}"}), 500
         
         # Get data from storage
         processed_data = get_processed_data(file_id_str)
@@ -195,144 +195,98 @@ def export_data():
         if not processed_data:
             return jsonify({'error': 'No data available for export'}), 404
         
-        # Extract the specific data type requested
-        if data_type == 'history':
-            export_items = processed_data.get('history', [])
-            filename = f'browser_history_{file_id}'
-            fields = ['url', 'title', 'visit_time', 'visit_count', 'last_visit_time', 'domain']
-        elif data_type == 'domains':
-            export_items = processed_data.get('domains', [])
-            filename = f'browser_domains_{file_id}'
-            fields = ['domain', 'visit_count', 'last_visit_time', 'frequency']
-        elif data_type == 'downloads':
-            export_items = processed_data.get('downloads', [])
-            filename = f'browser_downloads_{file_id}'
-            fields = ['filename', 'url', 'referrer', 'download_time', 'file_size', 'mime_type', 'status']
-        elif data_type == 'timeline':
-            export_items = processed_data.get('timeline', [])
-            filename = f'browser_timeline_{file_id}'
-            fields = ['date', 'visit_count', 'unique_urls', 'unique_domains']
-        else:
-            return jsonify({'error': f'Unsupported data type: {data_type}'}), 400
-        
-        # Check if we have data to export
-        if not export_items:
-            return jsonify({'error': f'No {data_type} data available for export'}), 404
-        
-        # Export based on format
-        if export_format == 'csv':
-            return export_as_csv(export_items, filename, fields)
-        elif export_format == 'json':
-            return export_as_json(export_items, filename)
-        elif export_format == 'excel':
-            # Need to check if pandas is installed
-            try:
-                import pandas as pd
-                return export_as_excel(export_items, filename, fields)
-            except ImportError:
-                # Fallback to CSV if pandas not available
-                print("Warning: pandas not installed, falling back to CSV export")
-                return export_as_csv(export_items, filename, fields)
-        else:
+        if export_format not in EXPORT_FORMATS:
             return jsonify({'error': f'Unsupported export format: {export_format}'}), 400
-            
-    except Exception as e:
-        print(f"Error during export: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({'error': f"Export error: {str(e)}"}), 500
-    
-def export_as_csv(data, filename, fields=None):
-    """Export data as CSV file using StringIO"""
-    from io import StringIO
-    import csv
-    
-    try:
-        # Create CSV in memory
-        output = StringIO()
         
-        # Determine fields if not provided
-        if not fields and data:
-            if isinstance(data[0], dict):
-                fields = data[0].keys()
-            else:
-                # Try to get attributes if not a dict
-                fields = vars(data[0]).keys() if hasattr(data[0], '__dict__') else None
-        
-        if not fields:
-            return jsonify({'error': 'Could not determine fields for CSV export'}), 500
-        
-        writer = csv.DictWriter(output, fieldnames=fields, extrasaction='ignore')
-        writer.writeheader()
+        try:
+            tz = resolve_timezone(request_data.get('tz'))
+            if not isinstance(filters, dict):
+                raise ValueError('filters must be an object')
+            # Downloads also filter on status
+            allowed = {'history': VISIT_FILTERS, 'domains': VISIT_FILTERS, 'downloads': DOWNLOAD_FILTERS,
+                       'timeline': VISIT_FILTERS}
+            filters = parse_filters(filters, tz, allowed.get(data_type, ()))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Write data
-        for item in data:
-            if isinstance(item, dict):
-                # Filter to only include fields in fieldnames
-                row = {k: v for k, v in item.items() if k in fields}
-                writer.writerow(row)
+        # Extract the specific data type requested as a stream of row chunks;
+        # filters select the matching visits first, so only those are serialized
+        if data_type == 'history':
+            store = processed_data.get('entries')
+            fields = ['url', 'title', 'visit_time', 'visit_timestamp', 'visit_count', 'domain', 'registrable_domain']
+            positions = select_visits(store, filters) if filters and store is not None else None
+            row_count = (len(store) if positions is None else len(positions)) if store is not None else 0
+            # Parquet/Feather take column chunks straight from the store
+            chunks = history_chunks(store, fields, tz, positions=positions,
+                                    columnar=export_format in ARROW_FORMATS) if row_count else None
+        else:
+            if data_type == 'domains':
+                # Per host, or rolled up per registrable domain (eTLD+1)
+                store = processed_data.get('entries')
+                group_by = request_data.get('group_by', 'domain')
+                try:
+                    positions = select_visits(store, filters) if filters and store is not None else None
+                    export_items = store.domain_summaries(group_by, tz, positions) if store is not None else []
+                except ValueError as e:
+                    return jsonify({'error': str(e)}), 400
+                fields = ['domain', 'visit_count', 'last_visit_time', 'frequency']
+            elif data_type == 'downloads':
+                downloads = filter_downloads(processed_data.get('downloads', []), filters)
+                export_items = serialize_downloads(downloads, tz)
+                fields = ['filename', 'url', 'referrer', 'download_time', 'file_size', 'mime_type', 'status']
+            elif data_type == 'timeline':
+                # Per day (or week/month); unique counts come from sketches for large stores.
+                # start/end are the rollup window; other filters select the visits it counts (exactly)
+                store = processed_data.get('entries')
+                stores = [store] if store is not None else []
+                positions = None
+                if stores and set(filters) - {'start', 'end'}:
+                    positions = [select_visits(store, filters)]
+                try:
+                    rollup = timeline_rollup(stores, filters.get('start'), filters.get('end'),
+                                             request_data.get('interval', 'day'), request_data.get('mode', 'auto'),
+                                             positions)
+                except ValueError as e:
+                    return jsonify({'error': str(e)}), 400
+                export_items = rollup['timeline']
+                fields = ['date', 'visit_count', 'unique_urls', 'unique_domains']
             else:
-                # Convert object to dict
-                obj_dict = vars(item) if hasattr(item, '__dict__') else {}
-                row = {k: v for k, v in obj_dict.items() if k in fields}
-                writer.writerow(row)
+                return jsonify({'error': f'Unsupported data type: {data_type}'}), 400
+            row_count = len(export_items)
+            chunks = list_chunks(export_items, fields)
         
-        # Get the CSV content
-        csv_content = output.getvalue()
-        
-        # Create a response
-        response = Response(
-            csv_content,
-            mimetype='text/csv',
-            headers={
-                'Content-Disposition': f'attachment; filename={filename}.csv'
-            }
-        )
-        
-        return response
-    except Exception as e:
-        print(f"CSV export error: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        raise
-
-    """Export data as JSON file"""
-    try:
-        # Convert data to serializable format
-        serializable_data = []
-        
-        for item in data:
-            if isinstance(item, dict):
-                serializable_data.append(item)
-            else:
-                # Convert object to dict
-                obj_dict = vars(item) if hasattr(item, '__dict__') else {}
-                serializable_data.append(obj_dict)
+        # Check if we have data to export
+        if not row_count:
+            if filters:
+                return jsonify({'error': f'No {data_type} data matches the filters'}), 404
+            return jsonify({'error': f'No {data_type} data available for export'}), 404
         
-        # Create a custom encoder for dates
-        class DateTimeEncoder(json.JSONEncoder):
-            def default(self, obj):
-                from datetime import datetime, date
-                if isinstance(obj, (datetime, date)):
-                    return obj.isoformat()
-                return super().default(obj)
+        extension, mimetype = EXPORT_FORMATS[export_format]
+        filename = f'browser_{data_type}_{file_id}.{extension}'
+        export_path = os.path.abspath(get_export_file_path(file_id_str, data_type, extension))
         
-        # Convert to JSON
-        json_data = json.dumps(serializable_data, cls=DateTimeEncoder, indent=2)
+        # Write beside the target and swap it in, so a download of the previous
+        # export that is still streaming keeps reading its own copy
+        staging_path = f"{export_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            rows_written = write_export(export_format, chunks, fields, staging_path)
+            os.replace(staging_path, export_path)
+        except ExportDependencyError as e:
+            return jsonify({'error': str(e)}), 400
+        finally:
+            if os.path.exists(staging_path):
+                os.remove(staging_path)
+        print(f"Exported {rows_written} {data_type} rows as {export_format} to {export_path}")
         
-        # Create response
-        response = Response(
-            json_data,
-            mimetype='application/json',
-            headers={
-                'Content-Disposition': f'attachment; filename={filename}.json'
-            }
+        return send_file(
+            export_path,
+            as_attachment=True,
+            download_name=filename,
+            mimetype=mimetype
         )
-        
-        return response
+            
     except Exception as e:
-        print(f"JSON export error: {str(e)}")
+        print(f"Error during export: {str(e)}")
         import traceback
         traceback.print_exc()
-        raise
-
+        return jsonify({'error': f"Export error: {str(e)}"}), 500
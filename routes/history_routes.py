@@ -2,15 +2,22 @@ from flask import Blueprint, request, jsonify, send_file, Response
 import os
 import csv
 from config import Config
-from services.storage import get_paginated_entries, file_exists, get_processed_data
-from utils.file_utils import get_temp_file_path, get_csv_file_path, detect_browser_type
-from services.history_processor import process_history_file
+from services.storage import get_paginated_entries, file_exists, get_processed_data, get_data_version
+from utils.file_utils import get_csv_file_path
+from services.history_processor import ensure_processed
+from services.histogram import build_histogram, BUCKET_TYPES
+from services.visit_query import parse_filters
+from utils.time_utils import resolve_timezone
+from utils.http_utils import make_etag, not_modified, json_response
 
 history_bp = Blueprint('history', __name__)
 
+# Query parameters of /get_page passed to the filter layer
+FILTER_ARGS = ('domain', 'registrable_domain', 'start', 'end', 'start_date', 'end_date', 'search')
+
 @history_bp.route('/get_page', methods=['GET'])
 def get_page():
-    """Get a page of history entries"""
+    """Get a page of history entries, optionally only those matching domain/time/search filters"""
     file_id = request.args.get('file_id')
     page = request.args.get('page', 1, type=int)
     page_size = request.args.get('page_size', Config.DEFAULT_PAGE_SIZE, type=int)
@@ -18,11 +25,78 @@ def get_page():
     if not file_id or not file_exists(file_id):
         return jsonify({'error': 'Invalid file ID'}), 400
     
+    try:
+        tz = resolve_timezone(request.args.get('tz'))
+        filters = parse_filters({name: request.args.get(name) for name in FILTER_ARGS}, tz)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Answer repeat requests for an unchanged page without rebuilding it
+    etag = make_etag(file_id, get_data_version(file_id), endpoint='page', page=page, page_size=page_size, tz=tz,
+                     filters=sorted(filters.items()))
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    
     # Get paginated entries
-    result = get_paginated_entries(file_id, page, page_size)
+    result = get_paginated_entries(file_id, page, page_size, tz, filters)
+    result['filters'] = filters
+    
+    return json_response(result, etag)
+
+@history_bp.route('/histogram', methods=['GET'])
+def get_histogram():
+    """Get visit counts bucketed by minute/hour/day/weekday_hour"""
+    file_id = request.args.get('file_id')
+    bucket = request.args.get('bucket', 'hour')
+    domain = request.args.get('domain')
+    registrable_domain = request.args.get('registrable_domain')
+    start = request.args.get('start', type=int)
+    end = request.args.get('end', type=int)
+    
+    if not file_id or not file_exists(file_id):
+        return jsonify({'error': 'Invalid file ID'}), 400
+    
+    if bucket not in BUCKET_TYPES:
+        return jsonify({'error': f"Unsupported bucket: {bucket}. Use one of {', '.join(BUCKET_TYPES)}"}), 400
+    
+    data = get_processed_data(file_id)
+    result = build_histogram(data['entries'], bucket, domain, start, end, registrable_domain)
+    result['file_id'] = file_id
     
     return jsonify(result)
 
+@history_bp.route('/domains/<file_id>', methods=['GET'])
+def get_domain_stats(file_id):
+    """Get visit counts per domain, or per registrable domain with group_by=registrable_domain"""
+    group_by = request.args.get('group_by', 'domain')
+    
+    if not file_exists(file_id):
+        return jsonify({'error': 'Invalid file ID'}), 400
+    
+    try:
+        tz = resolve_timezone(request.args.get('tz'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    etag = make_etag(file_id, get_data_version(file_id), endpoint='domains', group_by=group_by, tz=tz)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    
+    data = get_processed_data(file_id)
+    try:
+        domains = data['entries'].domain_summaries(group_by, tz)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return json_response({
+        'file_id': file_id,
+        'group_by': group_by,
+        'total_domains': len(domains),
+        'domains': domains
+    }, etag)
+
 @history_bp.route('/export/<file_id>', methods=['GET'])
 def export_csv(file_id):
     """Export history data to CSV"""
@@ -32,24 +106,18 @@ def export_csv(file_id):
     # Ensure the file_id is a string for comparison
     file_id_str = str(file_id)
     
-    # If the file is not in memory, try to check if the file exists in the upload folder
-    if not file_exists(file_id_str):
-        temp_path = get_temp_file_path(file_id_str)
-        
-        if not os.path.exists(temp_path):
+    try:
+        tz = resolve_timezone(request.args.get('tz'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Re-process the upload if its results are no longer stored; concurrent requests share one ingest
+    try:
+        if not ensure_processed(file_id_str):
             return jsonify({'error': f"Invalid file ID: {file_id}"}), 400
-        
-        # Try to re-process the file if it exists but not in memory
-        try:
-            print(f"File found on disk but not in memory, attempting to re-process: {temp_path}")
-            browser_type = detect_browser_type(temp_path)
-            process_history_file(temp_path, browser_type, file_id_str, 1, Config.DEFAULT_PAGE_SIZE)
-            
-            if not file_exists(file_id_str):
-                return jsonify({'error': 'Failed to re-process file'}), 500
-        except Exception as e:
-            print(f"Error re-processing file: {e}")
-            return jsonify({'error': f"Error re-processing file: {str(e)}"}), 500
+    except Exception as e:
+        print(f"Error re-processing file: {e}")
+        return jsonify({'error': f"Error re-processing file: {str(e)}"}), 500
     
     # Get data for export
     data = get_processed_data(file_id_str)
@@ -72,18 +140,19 @@ def export_csv(file_id):
         # Write data to CSV
         print(f"Starting to write data to file: {abs_path}")
         with open(abs_path, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['title', 'url', 'visit_time', 'domain', 'visit_count']
+            fieldnames = ['title', 'url', 'visit_time', 'domain', 'registrable_domain', 'visit_count']
             writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
             
             writer.writeheader()
             entry_count = 0
-            for entry in data['entries']:
+            for entry in data['entries'].iter_records(tz):
                 # Filter only needed fields and ensure all values are present
                 row = {
                     'title': entry.get('title', ''),
                     'url': entry.get('url', ''),
                     'visit_time': entry.get('visit_time', ''),
                     'domain': entry.get('domain', ''),
+                    'registrable_domain': entry.get('registrable_domain', ''),
                     'visit_count': entry.get('visit_count', 0)
                 }
                 writer.writerow(row)
@@ -0,0 +1,110 @@
+from flask import Blueprint, request, jsonify
+from config import Config
+from services.storage import file_exists, get_processed_data
+from services.ioc_matcher import (IndicatorSet, register_indicator_list, get_indicator_list,
+                                  delete_indicator_list, list_indicator_lists, match_store, match_downloads)
+from services.serializers import serialize_downloads
+from utils.time_utils import resolve_timezone, format_epoch_micros
+from utils.http_utils import json_response
+
+ioc_bp = Blueprint('ioc', __name__)
+
+@ioc_bp.route('/ioc/lists', methods=['POST'])
+def upload_indicator_list():
+    """Upload an indicator list (one domain, URL or file hash per line) for matching"""
+    if 'file' in request.files:
+        file = request.files['file']
+        lines = file.read().decode('utf-8', errors='replace').splitlines()
+        name = request.form.get('name') or file.filename
+    else:
+        request_data = request.get_json(silent=True) or {}
+        lines = request_data.get('indicators')
+        name = request_data.get('name', '')
+        if not isinstance(lines, list):
+            return jsonify({'error': 'Provide a file or an "indicators" list'}), 400
+
+    list_id = register_indicator_list(lines, name)
+    indicator_set = get_indicator_list(list_id)
+    return jsonify({
+        'list_id': list_id,
+        'name': name,
+        'counts': indicator_set.counts(),
+        'skipped': indicator_set.skipped
+    })
+
+@ioc_bp.route('/ioc/lists', methods=['GET'])
+def get_indicator_lists():
+    """List the registered indicator lists"""
+    return jsonify({'lists': list_indicator_lists()})
+
+@ioc_bp.route('/ioc/lists/<list_id>', methods=['DELETE'])
+def remove_indicator_list(list_id):
+    """Delete a registered indicator list and its cached matches"""
+    if not delete_indicator_list(list_id):
+        return jsonify({'error': f"Invalid indicator list ID: {list_id}"}), 404
+    return jsonify({'list_id': list_id, 'deleted': True})
+
+@ioc_bp.route('/ioc/match', methods=['GET', 'POST'])
+def match_indicators():
+    """Match a file's visits and downloads against a registered or inline indicator list"""
+    params = (request.get_json(silent=True) or {}) if request.method == 'POST' else request.args
+    file_id = params.get('file_id')
+    list_id = params.get('list_id')
+
+    try:
+        page = int(params.get('page', 1))
+        page_size = int(params.get('page_size', Config.DEFAULT_PAGE_SIZE))
+        tz = resolve_timezone(params.get('tz'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if page < 1 or page_size < 1:
+        return jsonify({'error': 'Invalid page or page size'}), 400
+
+    if not file_id or not file_exists(file_id):
+        return jsonify({'error': 'Invalid file ID'}), 400
+
+    if list_id:
+        indicator_set = get_indicator_list(list_id)
+        if indicator_set is None:
+            return jsonify({'error': f"Invalid indicator list ID: {list_id}"}), 400
+    elif isinstance(params.get('indicators'), list):
+        # Ad hoc lists are compiled per request and not cached
+        indicator_set = IndicatorSet(params['indicators'])
+    else:
+        return jsonify({'error': 'Provide a list_id or an "indicators" list'}), 400
+
+    data = get_processed_data(file_id)
+    store = data['entries']
+    positions, url_matches, indicators = match_store(store, indicator_set, list_id or None)
+
+    visits = []
+    for index in positions[(page - 1) * page_size:page * page_size].tolist():
+        entry = store.record(index, tz)
+        entry['matches'] = [
+            {'type': kind, 'indicator': indicator}
+            for kind, indicator in url_matches[int(store.url_codes[index])]
+        ]
+        visits.append(entry)
+
+    # Summaries are cached per list; format copies of them
+    indicators = [
+        dict(item, first_seen=format_epoch_micros(item['first_seen_us'], tz),
+             last_seen=format_epoch_micros(item['last_seen_us'], tz))
+        for item in indicators
+    ]
+
+    downloads = serialize_downloads(match_downloads(data.get('downloads', []), indicator_set), tz)
+
+    return json_response({
+        'file_id': file_id,
+        'list_id': list_id,
+        'indicator_counts': indicator_set.counts(),
+        'matched_visits': len(positions),
+        'matched_downloads': len(downloads),
+        'page': page,
+        'page_size': page_size,
+        'total_pages': (len(positions) + page_size - 1) // page_size,
+        'indicators': indicators,
+        'visits': visits,
+        'downloads': downloads
+    })
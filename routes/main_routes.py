@@ -1,7 +1,12 @@
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, render_template, request, jsonify, url_for
 import os
 from utils.file_utils import generate_file_id, get_temp_file_path, detect_browser_type
 from services.history_processor import process_history_file
+from services.storage import get_paginated_entries, loaded_file_ids
+from services.progressive import start_progressive, active_file_ids
+from utils.workspace import collect_garbage
+from utils.time_utils import resolve_timezone
+from utils.profiling import phase
 from config import Config
 
 main_bp = Blueprint('main', __name__, template_folder='templates')
@@ -26,18 +31,24 @@ def upload_file():
     page = request.form.get('page', 1, type=int)
     page_size = request.form.get('page_size', Config.DEFAULT_PAGE_SIZE, type=int)
     
+    try:
+        tz = resolve_timezone(request.form.get('tz'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     # Create a unique file ID
     file_id = generate_file_id()
     
     # Create a temporary file
     temp_path = get_temp_file_path(file_id)
-    file.save(temp_path)
+    with phase('save_upload'):
+        file.save(temp_path)
     
     # Add debugging output
     print(f"File saved to: {temp_path}")
     
     try:
-        # Determine file type based on name or content
+        # Filename-based guess; process_history_file confirms it from the database schema
         browser_type = detect_browser_type(file.filename)
         print(f"Detected browser type: {browser_type}")
         
@@ -45,6 +56,14 @@ def upload_file():
         result = process_history_file(temp_path, browser_type, file_id, page, page_size)
         print(f"Processing complete, result: {result.keys() if isinstance(result, dict) else 'Error'}")
         
+        # Re-serialize the first page if a non-default timezone was requested
+        if request.form.get('tz') and 'error' not in result:
+            result = get_paginated_entries(file_id, page, page_size, tz)
+        
+        # Keep the upload folder within its quota
+        with phase('garbage_collection'):
+            collect_garbage(protected=loaded_file_ids() + active_file_ids() + [file_id])
+        
         # Return the response
         response = jsonify(result)
         response.set_cookie('last_file_id', file_id, max_age=3600)
@@ -53,4 +72,54 @@ def upload_file():
         print(f"Error in upload_file: {str(e)}")
         import traceback
         traceback.print_exc()
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+@main_bp.route('/upload/progressive', methods=['POST'])
+def upload_file_progressive():
+    """
+    Upload a browser history file and process it in the background.
+    Returns at once with the file ID; preview, estimate, aggregate and
+    completion events are streamed from /progress/<file_id>.
+    """
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file part'}), 400
+    
+    file = request.files['file']
+    
+    if file.filename == '':
+        return jsonify({'error': 'No selected file'}), 400
+    
+    page = request.form.get('page', 1, type=int)
+    page_size = request.form.get('page_size', Config.DEFAULT_PAGE_SIZE, type=int)
+    if page < 1 or page_size < 1:
+        return jsonify({'error': 'Invalid page or page size'}), 400
+    
+    try:
+        tz = resolve_timezone(request.form.get('tz'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    file_id = generate_file_id()
+    temp_path = get_temp_file_path(file_id)
+    file.save(temp_path)
+    print(f"File saved to: {temp_path}")
+    
+    try:
+        browser_type = detect_browser_type(file.filename)
+        start_progressive(temp_path, browser_type, file_id, page, page_size, tz)
+        
+        collect_garbage(protected=loaded_file_ids() + active_file_ids() + [file_id])
+        
+        response = jsonify({
+            'file_id': file_id,
+            'browser_type': browser_type,
+            'events_url': url_for('progress.stream_progress', file_id=file_id)
+        })
+        response.status_code = 202
+        response.set_cookie('last_file_id', file_id, max_age=3600)
+        return response
+    except Exception as e:
+        print(f"Error in upload_file_progressive: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,71 @@
+from flask import Blueprint, request, jsonify, Response
+import json
+import time
+from services.progressive import get_channel
+from services.storage import file_exists, get_processed_data
+
+progress_bp = Blueprint('progress', __name__)
+
+# Seconds between keep-alive comments while no event is ready
+HEARTBEAT_SECONDS = 15
+
+def _format_event(event_id, event, data):
+    """One Server-Sent Events message"""
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+def _replay(channel, after, block=True):
+    """
+    Yield the channel's events after index after, following it until the
+    ingest finishes. Unless block is set, an empty chunk is yielded instead
+    of waiting for the next event, for servers that wait on the channel's
+    subscribe() notifications themselves (asgi.py).
+    """
+    last_sent = time.monotonic()
+    while True:
+        events, closed = channel.wait(after, HEARTBEAT_SECONDS if block else 0)
+        for event, data in events:
+            yield _format_event(after, event, data)
+            after += 1
+        if closed:
+            return
+        if events:
+            last_sent = time.monotonic()
+        elif block or time.monotonic() - last_sent >= HEARTBEAT_SECONDS:
+            last_sent = time.monotonic()
+            yield ": keep-alive\n\n"
+        else:
+            yield ""
+
+@progress_bp.route('/progress/<file_id>', methods=['GET'])
+def stream_progress(file_id):
+    """Stream a progressive upload's events (preview, estimate, aggregates, complete/error) as SSE"""
+    channel = get_channel(file_id)
+    if channel is None and not file_exists(file_id):
+        return jsonify({'error': 'Invalid file ID'}), 400
+    
+    # A reconnecting EventSource resumes after the last event it received
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id', ''))
+    after = int(last_event_id) + 1 if last_event_id.isdigit() else 0
+    
+    if channel is None:
+        # Processed earlier, by a regular upload or before its events expired
+        data = get_processed_data(file_id)
+        body = _format_event(0, 'complete', {
+            'file_id': file_id,
+            'browser_type': data['browser_type'],
+            'total_entries': data['total_entries'],
+            'downloads': len(data.get('downloads', []))
+        })
+        stream = iter([body] if after == 0 else [])
+    elif request.environ.get('flask_asgi.async_streams'):
+        # The ASGI bridge waits for the channel's notifications instead of a thread blocking in wait()
+        request.environ['flask_asgi.stream_subscribe'] = channel.subscribe
+        stream = _replay(channel, after, block=False)
+    else:
+        stream = _replay(channel, after)
+    
+    response = Response(stream, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Keep reverse proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
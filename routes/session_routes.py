@@ -0,0 +1,71 @@
+from flask import Blueprint, request, jsonify
+from services.storage import file_exists, get_processed_data, get_data_version
+from services.sessions import get_sessions, get_navigation_tree
+from utils.time_utils import resolve_timezone
+from utils.http_utils import make_etag, not_modified, json_response
+
+session_bp = Blueprint('sessions', __name__)
+
+def _session_args():
+    """Parse the parameters shared by the session endpoints"""
+    page = request.args.get('page', 1, type=int)
+    page_size = request.args.get('page_size', 50, type=int)
+    gap_minutes = request.args.get('gap_minutes', type=int)
+    if page < 1 or page_size < 1 or (gap_minutes is not None and gap_minutes < 1):
+        raise ValueError('Invalid page, page size or gap')
+    return page, page_size, gap_minutes, resolve_timezone(request.args.get('tz'))
+
+@session_bp.route('/sessions', methods=['GET'])
+def list_sessions():
+    """Get a page of browsing sessions split by idle gaps, newest first"""
+    file_id = request.args.get('file_id')
+    if not file_id or not file_exists(file_id):
+        return jsonify({'error': 'Invalid file ID'}), 400
+    
+    try:
+        page, page_size, gap_minutes, tz = _session_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    etag = make_etag(file_id, get_data_version(file_id), endpoint='sessions', page=page,
+                     page_size=page_size, gap_minutes=gap_minutes, tz=tz)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    
+    data = get_processed_data(file_id)
+    result = get_sessions(data['entries'], page, page_size, gap_minutes, tz)
+    result['file_id'] = file_id
+    
+    return json_response(result, etag)
+
+@session_bp.route('/sessions/tree', methods=['GET'])
+def session_tree():
+    """Get the navigation trees (from_visit chains) of one session"""
+    file_id = request.args.get('file_id')
+    session_id = request.args.get('session_id', type=int)
+    if not file_id or not file_exists(file_id):
+        return jsonify({'error': 'Invalid file ID'}), 400
+    if session_id is None:
+        return jsonify({'error': 'Session ID is required'}), 400
+    
+    try:
+        page, page_size, gap_minutes, tz = _session_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    etag = make_etag(file_id, get_data_version(file_id), endpoint='session_tree', session_id=session_id,
+                     page=page, page_size=page_size, gap_minutes=gap_minutes, tz=tz)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    
+    data = get_processed_data(file_id)
+    try:
+        result = get_navigation_tree(data['entries'], data['browser_type'], session_id,
+                                     page, page_size, gap_minutes, tz)
+    except KeyError:
+        return jsonify({'error': f"Invalid session ID: {session_id}"}), 400
+    result['file_id'] = file_id
+    
+    return json_response(result, etag)
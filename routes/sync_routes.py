@@ -2,11 +2,14 @@ from flask import Blueprint, request, jsonify, send_file, Response
 import os
 import csv
 from config import Config
-from services.storage import get_processed_data, file_exists, update_sync_info
+from services.storage import get_processed_data, get_data_version, file_exists, update_sync_info
 from utils.file_utils import get_temp_file_path, get_csv_file_path, detect_browser_type
 from services.history_processor import process_history_file
 from services.chrome_processor import extract_chrome_sync_info
 from services.firefox_processor import extract_firefox_sync_info
+from services.serializers import serialize_sync_info
+from utils.time_utils import resolve_timezone
+from utils.http_utils import make_etag, not_modified, json_response
 
 sync_bp = Blueprint('sync', __name__)
 
@@ -18,11 +21,18 @@ def get_sync_info():
     if not file_id or not file_exists(file_id):
         return jsonify({'error': 'Invalid file ID'}), 400
     
+    try:
+        tz = resolve_timezone(request.args.get('tz'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     # Get data
     data = get_processed_data(file_id)
+    version = data.get('version')
+    sync_info = data.get('sync_info') or {}
     
     # If sync info not already processed, try to extract it now
-    if 'sync_info' not in data or not data['sync_info']:
+    if not sync_info:
         try:
             file_path = get_temp_file_path(file_id)
             browser_type = data['browser_type']
@@ -32,25 +42,27 @@ def get_sync_info():
                 sync_info = extract_chrome_sync_info(file_path)
             else:
                 sync_info = extract_firefox_sync_info(file_path)
-                
-            # Save to processed_files
-            update_sync_info(file_id, sync_info)
             
-            # Update local data copy
-            data['sync_info'] = sync_info
+            # Only a new result is saved: saving bumps the version, and with it every ETag of the file
+            if sync_info:
+                update_sync_info(file_id, sync_info)
+                version = get_data_version(file_id)
         except Exception as e:
             print(f"Error extracting sync info: {e}")
             import traceback
             traceback.print_exc()
             sync_info = {}
-    else:
-        sync_info = data['sync_info']
     
-    return jsonify({
+    etag = make_etag(file_id, version, endpoint='sync_info', tz=tz)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    
+    return json_response({
         'file_id': file_id,
         'browser_type': data['browser_type'],
-        'sync_info': sync_info
-    })
+        'sync_info': serialize_sync_info(sync_info, tz)
+    }, etag)
 
 @sync_bp.route('/export_sync_data/<file_id>', methods=['GET'])
 def export_sync_data(file_id):
@@ -63,6 +75,11 @@ def export_sync_data(file_id):
     if not file_exists(file_id_str):
         return jsonify({'error': f"Invalid file ID: {file_id}"}), 400
     
+    try:
+        tz = resolve_timezone(request.args.get('tz'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     # Get data
     data = get_processed_data(file_id_str)
     
@@ -75,7 +92,7 @@ def export_sync_data(file_id):
     
     try:
         # Get synced visits if available
-        synced_visits = data['sync_info'].get('synced_visits', [])
+        synced_visits = serialize_sync_info(data['sync_info'], tz).get('synced_visits', [])
         
         if not synced_visits:
             return jsonify({'error': 'No synchronized visits available for export'}), 404
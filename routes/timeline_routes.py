@@ -0,0 +1,65 @@
+from flask import Blueprint, request, jsonify
+from config import Config
+from services.storage import get_processed_data
+from services.timeline_merge import merge_timelines
+from services.timeline_rollup import timeline_rollup
+from utils.time_utils import resolve_timezone
+
+timeline_bp = Blueprint('timeline', __name__)
+
+def _requested_file_ids():
+    """File IDs from file_ids=a,b,c or repeated file_id parameters"""
+    file_ids = [f for f in request.args.get('file_ids', '').split(',') if f]
+    return file_ids + request.args.getlist('file_id')
+
+@timeline_bp.route('/timeline', methods=['GET'])
+def get_merged_timeline():
+    """Get a page of the time-ordered timeline merged across several files"""
+    file_ids = _requested_file_ids()
+    labels = request.args.get('labels').split(',') if request.args.get('labels') else None
+    page = request.args.get('page', 1, type=int)
+    page_size = request.args.get('page_size', Config.DEFAULT_PAGE_SIZE, type=int)
+
+    if not file_ids:
+        return jsonify({'error': 'At least one file ID is required'}), 400
+    if page < 1 or page_size < 1:
+        return jsonify({'error': 'Invalid page or page size'}), 400
+
+    try:
+        tz = resolve_timezone(request.args.get('tz'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        result = merge_timelines(file_ids, page, page_size, labels, tz)
+    except KeyError as e:
+        return jsonify({'error': f"Invalid file ID: {e.args[0]}"}), 400
+
+    return jsonify(result)
+
+@timeline_bp.route('/timeline/rollup', methods=['GET'])
+def get_timeline_rollup():
+    """Get visits, unique URLs and unique domains per day/week/month across several files"""
+    file_ids = _requested_file_ids()
+    start = request.args.get('start', type=int)
+    end = request.args.get('end', type=int)
+    interval = request.args.get('interval', 'day')
+    mode = request.args.get('mode', 'auto')
+
+    if not file_ids:
+        return jsonify({'error': 'At least one file ID is required'}), 400
+
+    stores = []
+    for file_id in file_ids:
+        data = get_processed_data(file_id)
+        if data is None:
+            return jsonify({'error': f"Invalid file ID: {file_id}"}), 400
+        stores.append(data['entries'])
+
+    try:
+        result = timeline_rollup(stores, start, end, interval, mode)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    result['file_ids'] = file_ids
+
+    return jsonify(result)
@@ -0,0 +1,236 @@
+"""
+Headless batch processing of collected browser profiles.
+
+find_history_databases() walks a directory tree and keeps every SQLite file
+whose schema is Chrome or Firefox history, whatever it is called. Each one
+is processed by the same code path as an upload (_process_locally) in a
+spawn process pool, and the worker writes the profile's outputs:
+
+    <output>/profiles/<profile>/
+        columns/          VisitStore columns (.npy + string blobs), memory-mappable
+        history.<ext>     visits in the requested export format
+        downloads.<ext>   downloads, when the profile has any
+
+Once every profile is done, the parent memory-maps their columns and
+writes one merged history, newest first across profiles, with each row
+tagged by its profile and browser. manifest.json records the per-file
+throughput and outputs.
+"""
+import json
+import multiprocessing
+import os
+import re
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from config import Config
+from services.exporters import ARROW_FORMATS, EXPORT_FORMATS, history_chunks, list_chunks, write_export
+from services.schema_detection import detect_browser_type_from_content
+from services.serializers import serialize_downloads
+from services.visit_store import VisitStore
+from utils.time_utils import resolve_timezone
+
+HISTORY_FIELDS = ['url', 'title', 'visit_time', 'visit_timestamp', 'visit_count', 'domain', 'registrable_domain']
+DOWNLOAD_FIELDS = ['filename', 'url', 'referrer', 'download_time', 'file_size', 'mime_type', 'status']
+MERGED_FIELDS = ['profile', 'browser_type'] + HISTORY_FIELDS
+
+_SQLITE_MAGIC = b'SQLite format 3\x00'
+
+# SQLite side files next to a database, never databases themselves
+_SIDE_FILE_SUFFIXES = ('-wal', '-shm', '-journal')
+
+
+def _is_sqlite(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(_SQLITE_MAGIC)) == _SQLITE_MAGIC
+    except OSError:
+        return False
+
+
+def find_history_databases(root):
+    """(path, browser_type) of every Chrome or Firefox history database under root, in path order"""
+    found = []
+    for directory, subdirectories, filenames in os.walk(root):
+        subdirectories.sort()
+        for filename in sorted(filenames):
+            path = os.path.join(directory, filename)
+            if filename.endswith(_SIDE_FILE_SUFFIXES) or not os.path.isfile(path) or not _is_sqlite(path):
+                continue
+            browser_type = detect_browser_type_from_content(path)
+            if browser_type in ('chrome', 'firefox'):
+                found.append((path, browser_type))
+    return found
+
+
+def profile_name(root, path):
+    """Filesystem-safe profile label from a database's path relative to root"""
+    relative = os.path.relpath(path, root)
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', relative.replace(os.sep, '__')).strip('_') or 'profile'
+
+
+def _init_worker():
+    # Results are written to the output directory, not to a storage backend or workspace
+    Config.STORAGE_BACKEND = 'memory'
+    Config.COLUMN_CACHE = False
+
+
+def _process_profile(path, browser_type, profile, output_dir, export_format, engine, tz_name):
+    """Pool entry point: process one database and write its outputs"""
+    from services.history_processor import _process_locally
+    from services.storage import processed_files
+
+    started = time.perf_counter()
+    file_id = str(uuid.uuid4())
+    summary = {
+        'path': path,
+        'profile': profile,
+        'browser_type': browser_type,
+        'size_bytes': os.path.getsize(path)
+    }
+    try:
+        result = _process_locally(path, browser_type, file_id, 1, 1, engine)
+        record = processed_files.pop(file_id, None)
+        if record is None or 'error' in result:
+            summary['error'] = result.get('error', 'Processing produced no data')
+            return summary
+
+        tz = resolve_timezone(tz_name)
+        extension = EXPORT_FORMATS[export_format][0]
+        profile_dir = os.path.join(output_dir, 'profiles', profile)
+        os.makedirs(profile_dir, exist_ok=True)
+
+        store = record['entries']
+        store.save(os.path.join(profile_dir, 'columns'))
+        outputs = {'columns': os.path.join(profile_dir, 'columns')}
+        outputs['history'] = os.path.join(profile_dir, f"history.{extension}")
+        chunks = history_chunks(store, HISTORY_FIELDS, tz, columnar=export_format in ARROW_FORMATS)
+        write_export(export_format, chunks, HISTORY_FIELDS, outputs['history'])
+
+        downloads = record.get('downloads') or []
+        if downloads:
+            outputs['downloads'] = os.path.join(profile_dir, f"downloads.{extension}")
+            write_export(export_format, list_chunks(serialize_downloads(downloads, tz), DOWNLOAD_FIELDS),
+                         DOWNLOAD_FIELDS, outputs['downloads'])
+
+        summary.update({
+            'browser_type': record['browser_type'],
+            'visits': len(store),
+            'downloads': len(downloads),
+            'outputs': outputs
+        })
+    except Exception as e:
+        summary['error'] = str(e)
+    finally:
+        summary['seconds'] = time.perf_counter() - started
+    return summary
+
+
+def _merged_chunks(profiles, tz, chunk_size=None):
+    """Rows of all profiles' memory-mapped columns, newest first, tagged with their profile"""
+    chunk_size = chunk_size or Config.EXPORT_CHUNK_SIZE
+    stores = [VisitStore.load(profile['outputs']['columns']) for profile in profiles]
+    micros = np.concatenate([store.micros_array() for store in stores] or [np.zeros(0, dtype=np.int64)])
+    streams = np.repeat(np.arange(len(stores)), [len(store) for store in stores])
+    positions = np.concatenate([np.arange(len(store)) for store in stores] or [np.zeros(0, dtype=np.int64)])
+    # Newest first; ties keep profile order, then each profile's own order
+    order = np.lexsort((positions, streams, -micros))
+
+    for start in range(0, len(order), chunk_size):
+        chunk = []
+        for index in order[start:start + chunk_size].tolist():
+            profile = profiles[streams[index]]
+            row = stores[streams[index]].record(int(positions[index]), tz)
+            row['profile'] = profile['profile']
+            row['browser_type'] = profile['browser_type']
+            chunk.append({field: row.get(field) for field in MERGED_FIELDS})
+        yield chunk
+
+
+def process_directory(input_dir, output_dir, export_format='parquet', workers=None, engine=None, tz_name=None,
+                      report=print):
+    """
+    Process every history database under input_dir into output_dir and
+    return the manifest. report is called with one progress line per file.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {export_format}")
+    tz = resolve_timezone(tz_name)
+    engine = engine or Config.PROCESSING_ENGINE
+    workers = workers or Config.PROCESSING_WORKERS or os.cpu_count() or 1
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Fail before processing anything if the format needs a missing optional package
+    probe = os.path.join(output_dir, f".probe-{uuid.uuid4().hex}")
+    try:
+        write_export(export_format, iter(()), HISTORY_FIELDS, probe)
+    finally:
+        if os.path.exists(probe):
+            os.remove(probe)
+
+    started = time.perf_counter()
+    databases = find_history_databases(input_dir)
+    report(f"Found {len(databases)} history databases under {input_dir}")
+
+    # Unique profile directory per database, in path order
+    names = {}
+    jobs = []
+    for path, browser_type in databases:
+        name = profile_name(input_dir, path)
+        names[name] = names.get(name, 0) + 1
+        jobs.append((path, browser_type, name if names[name] == 1 else f"{name}-{names[name]}"))
+
+    results = []
+    if jobs:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), initializer=_init_worker,
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = [
+                pool.submit(_process_profile, path, browser_type, name, output_dir, export_format, engine, tz_name)
+                for path, browser_type, name in jobs
+            ]
+            for done, future in enumerate(as_completed(futures), 1):
+                summary = future.result()
+                results.append(summary)
+                prefix = f"[{done}/{len(jobs)}] {summary['profile']}"
+                if 'error' in summary:
+                    error = (summary['error'].strip().splitlines() or [''])[0]
+                    report(f"{prefix}: failed after {summary['seconds']:.2f}s: {error}")
+                    continue
+                seconds = max(summary['seconds'], 1e-9)
+                report(f"{prefix}: {summary['browser_type']}, {summary['visits']} visits, "
+                       f"{summary['downloads']} downloads in {seconds:.2f}s "
+                       f"({summary['visits'] / seconds:,.0f} visits/s, "
+                       f"{summary['size_bytes'] / seconds / 1e6:.1f} MB/s)")
+
+    order = {name: index for index, (_, _, name) in enumerate(jobs)}
+    results.sort(key=lambda summary: order[summary['profile']])
+    processed = [summary for summary in results if 'error' not in summary]
+
+    merged = None
+    if processed:
+        merge_started = time.perf_counter()
+        merged_path = os.path.join(output_dir, f"merged_history.{EXPORT_FORMATS[export_format][0]}")
+        rows = write_export(export_format, _merged_chunks(processed, tz), MERGED_FIELDS, merged_path)
+        merged = {'path': merged_path, 'rows': rows, 'seconds': time.perf_counter() - merge_started}
+        report(f"Merged {rows} visits from {len(processed)} profiles into {merged_path} "
+               f"in {merged['seconds']:.2f}s")
+
+    total_seconds = time.perf_counter() - started
+    total_visits = sum(summary['visits'] for summary in processed)
+    manifest = {
+        'input_dir': os.path.abspath(input_dir),
+        'format': export_format,
+        'engine': engine,
+        'workers': workers,
+        'profiles': results,
+        'merged': merged,
+        'processed': len(processed),
+        'failed': len(results) - len(processed),
+        'total_visits': total_visits,
+        'seconds': total_seconds,
+        'visits_per_second': total_visits / total_seconds if total_seconds else 0
+    }
+    with open(os.path.join(output_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
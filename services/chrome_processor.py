@@ -2,18 +2,20 @@
 Chrome browser history processor module.
 """
 import sqlite3
-import os
-import json
 import pandas as pd
-from services.storage import store_processed_data
-from utils.url_utils import extract_domain
+from services.storage import store_processed_data, get_paginated_entries
 from utils.file_utils import extract_filename
-from utils.time_utils import convert_download_state, map_chrome_visit_source, chrome_time_to_datetime
-from services.common_utils import find_download_sources
+from utils.time_utils import convert_download_state, map_chrome_visit_source
+from services.common_utils import find_download_sources, read_visits_frame
+from services.sync_info import extract_chrome_sync_info
+from services.schema_detection import get_query_plan
+from utils.profiling import phase
+from services.download_correlation import correlate_chrome_downloads
 
-def process_chrome_history(file_path, file_id, page=1, page_size=1000):
+def process_chrome_history(file_path, file_id, page=1, page_size=1000, plan=None, on_batch=None):
     """Process Chrome/Edge history database"""
     try:
+        plan = plan or get_query_plan(file_path)
         conn = sqlite3.connect(file_path)
         
         # Calculate total entries
@@ -23,54 +25,34 @@ def process_chrome_history(file_path, file_id, page=1, page_size=1000):
         JOIN visits v ON u.id = v.url
         """
         
-        count_df = pd.read_sql_query(count_query, conn)
-        total_entries = int(count_df['total'].iloc[0])
+        with phase('count'):
+            count_df = pd.read_sql_query(count_query, conn)
+            total_entries = int(count_df['total'].iloc[0])
         
-        # Calculate start and end indices for pagination
-        offset = (page - 1) * page_size
-        
-        # Query with pagination
-        query = f"""
-        SELECT 
-            u.id, 
-            u.url, 
-            u.title, 
-            u.visit_count, 
-            datetime(v.visit_time/1000000-11644473600, 'unixepoch') as visit_time
-        FROM urls u
-        JOIN visits v ON u.id = v.url
-        ORDER BY v.visit_time DESC
-        LIMIT {page_size} OFFSET {offset}
-        """
-        
-        # Get all entries for memory storage (for export)
+        # Get all entries for memory storage (times stay as Unix epoch microseconds)
         full_query = """
         SELECT 
             u.id, 
             u.url, 
             u.title, 
             u.visit_count, 
-            datetime(v.visit_time/1000000-11644473600, 'unixepoch') as visit_time
+            v.visit_time - 11644473600000000 as visit_time_us,
+            v.id as visit_id,
+            IFNULL(v.from_visit, 0) as from_visit,
+            IFNULL(v.transition, 0) as transition
         FROM urls u
         JOIN visits v ON u.id = v.url
         ORDER BY v.visit_time DESC
         """
         
         # Execute queries
-        df = pd.read_sql_query(query, conn)
-        full_df = pd.read_sql_query(full_query, conn)
-        
-        # Process data
-        df['domain'] = df['url'].apply(extract_domain)
-        full_df['domain'] = full_df['url'].apply(extract_domain)
+        with phase('visits'):
+            full_df = read_visits_frame(conn, full_query, on_batch)
         
         # Check if visit_source table exists - this is important for sync information
         sync_visits = []
         
-        table_query = "SELECT name FROM sqlite_master WHERE type='table'"
-        tables_df = pd.read_sql_query(table_query, conn)
-        tables = tables_df['name'].tolist()
-        print(f"Found tables in Chrome history: {tables}")
+        tables = plan['tables']
         
         # If visit_source exists, we can get information about synced visits
         if 'visit_source' in tables:
@@ -80,7 +62,7 @@ def process_chrome_history(file_path, file_id, page=1, page_size=1000):
                 SELECT 
                     u.url,
                     u.title,
-                    datetime(v.visit_time/1000000-11644473600, 'unixepoch') as visit_time,
+                    v.visit_time - 11644473600000000 as visit_time_us,
                     vs.source
                 FROM urls u
                 JOIN visits v ON u.id = v.url
@@ -99,10 +81,12 @@ def process_chrome_history(file_path, file_id, page=1, page_size=1000):
                 print(f"Error getting synced visits: {e}")
         
         # Process downloads
-        downloads, download_sources = process_chrome_downloads(conn, tables, full_df)
+        with phase('downloads'):
+            downloads, download_sources = process_chrome_downloads(conn, plan, full_df)
         
         # Get sync information
-        sync_info = extract_chrome_sync_info(file_path)
+        with phase('sync_info'):
+            sync_info = extract_chrome_sync_info(file_path)
         
         # Add synced visits to sync info
         if sync_visits:
@@ -113,77 +97,40 @@ def process_chrome_history(file_path, file_id, page=1, page_size=1000):
         conn.close()
         
         # Convert to list of dictionaries
-        result = df.to_dict('records')
-        all_entries = full_df.to_dict('records')
+        with phase('to_records'):
+            all_entries = full_df.to_dict('records')
         
         # Store in memory for pagination and export
-        store_processed_data(
-            file_id, 
-            'chrome', 
-            all_entries, 
-            total_entries, 
-            downloads, 
-            download_sources,
-            sync_info
-        )
-        
-        return {
-            'file_id': file_id,
-            'browser_type': 'chrome',
-            'total_entries': total_entries,
-            'page': page,
-            'page_size': page_size,
-            'total_pages': (total_entries + page_size - 1) // page_size,
-            'entries': result,
-            'downloads': downloads,
-            'download_sources': download_sources,
-            'sync_info': sync_info
-        }
+        with phase('store'):
+            store_processed_data(
+                file_id, 
+                'chrome', 
+                all_entries, 
+                total_entries, 
+                downloads, 
+                download_sources,
+                sync_info
+            )
+        
+        with phase('first_page'):
+            return get_paginated_entries(file_id, page, page_size)
     except Exception as e:
         print(f"Error processing Chrome history: {e}")
         import traceback
         traceback.print_exc()
         return {'error': f"Error processing Chrome history: {str(e)}"}
 
-def process_chrome_downloads(conn, tables, full_df):
-    """Process Chrome downloads"""
+def process_chrome_downloads(conn, plan, full_df):
+    """Process Chrome downloads using the query plan for this schema"""
     downloads = []
     download_sources = []
     
-    if 'downloads' in tables:
+    if 'downloads' in plan['tables']:
         try:
-            # Check the schema of downloads table to find the correct column names
-            schema_query = "PRAGMA table_info(downloads);"
-            schema_df = pd.read_sql_query(schema_query, conn)
-            
-            # Print schema for debugging
-            print("Downloads table schema:", schema_df['name'].tolist())
+            # Built once per schema fingerprint from the downloads columns
+            download_query = plan['chrome_downloads_query']
             
-            # Check if specific columns exist
-            has_target_path = 'target_path' in schema_df['name'].values
-            has_current_path = 'current_path' in schema_df['name'].values
-            has_url_column = 'url' in schema_df['name'].values
-            has_tab_url = 'tab_url' in schema_df['name'].values
-            has_original_url = 'original_url' in schema_df['name'].values
-            
-            # Build a dynamic query based on the schema
-            filename_col = 'target_path' if has_target_path else ('current_path' if has_current_path else 'id')
-            url_col = 'url' if has_url_column else ('tab_url' if has_tab_url else ('original_url' if has_original_url else None))
-            
-            if url_col:
-                download_query = f"""
-                SELECT 
-                    d.{filename_col} as filename,
-                    d.{url_col} as url,
-                    IFNULL(d.referrer, '') as referrer,
-                    datetime(d.start_time/1000000-11644473600, 'unixepoch') as download_time,
-                    IFNULL(d.mime_type, '') as mime_type,
-                    IFNULL(d.received_bytes, 0) as file_size,
-                    IFNULL(d.state, 0) as status
-                FROM downloads d
-                ORDER BY d.start_time DESC
-                """
-                
+            if download_query:
                 downloads_df = pd.read_sql_query(download_query, conn)
                 
                 # Process downloads data
@@ -196,10 +143,11 @@ def process_chrome_downloads(conn, tables, full_df):
                     
                     downloads = downloads_df.to_dict('records')
                     
-                    # Find download sources by correlating with history
-                    download_sources = find_download_sources(full_df, downloads)
-            else:
-                print("Cannot find a suitable URL column in downloads table")
+                    # Resolve sources from recorded referrers/URL chains, by time window otherwise
+                    download_sources = correlate_chrome_downloads(
+                        conn, plan, downloads,
+                        lambda unresolved: find_download_sources(full_df, unresolved)
+                    )
         except Exception as e:
             print(f"Error processing Chrome downloads: {e}")
             import traceback
@@ -214,7 +162,7 @@ def process_chrome_downloads(conn, tables, full_df):
             SELECT 
                 u.url as url,
                 u.title as title,
-                datetime(u.last_visit_time/1000000-11644473600, 'unixepoch') as download_time
+                u.last_visit_time - 11644473600000000 as download_time_us
             FROM urls u
             WHERE u.url LIKE '%/download%' 
                OR u.url LIKE '%.exe' 
@@ -246,124 +194,3 @@ def process_chrome_downloads(conn, tables, full_df):
             print(f"Error with alternative download detection: {e}")
     
     return downloads, download_sources
-
-def extract_chrome_sync_info(history_file_path):
-    """
-    Extract Chrome sync information from the history file and/or Preferences file
-    """
-    try:
-        # For actual sync information, we need the Preferences file
-        # Check if we can locate it in the same directory
-        profile_dir = os.path.dirname(history_file_path)
-        preferences_path = os.path.join(profile_dir, 'Preferences')
-        
-        sync_info = {}
-        
-        # If we found a Preferences file, parse it for sync information
-        if os.path.exists(preferences_path):
-            print(f"Found Chrome Preferences file at: {preferences_path}")
-            
-            try:
-                with open(preferences_path, 'r', encoding='utf-8') as f:
-                    prefs_data = json.load(f)
-                
-                # Extract account info
-                account_info = {}
-                if 'account_info' in prefs_data:
-                    account_data = prefs_data['account_info']
-                    
-                    # Check if account_data is a list instead of a dictionary
-                    if isinstance(account_data, list):
-                        # Handle case where account_info is a list
-                        if account_data and len(account_data) > 0:
-                            # Use the first account in the list
-                            first_account = account_data[0]
-                            if isinstance(first_account, dict):
-                                account_info = {
-                                    'email': first_account.get('email', ''),
-                                    'name': first_account.get('full_name', ''),
-                                    'account_type': first_account.get('account_type', ''),
-                                }
-                            else:
-                                account_info = {
-                                    'email': '',
-                                    'name': '',
-                                    'account_type': '',
-                                    'note': 'Unable to parse account data'
-                                }
-                    elif isinstance(account_data, dict):
-                        # Original case - account_info is a dictionary
-                        account_info = {
-                            'email': account_data.get('email', ''),
-                            'name': account_data.get('full_name', ''),
-                            'account_type': account_data.get('account_type', ''),
-                        }
-                    else:
-                        # Unknown type
-                        account_info = {
-                            'email': '',
-                            'name': '',
-                            'account_type': '',
-                            'note': f'Unexpected account_info type: {type(account_data)}'
-                        }
-                
-                # Extract sync settings
-                sync_settings = {
-                    'enabled': False,
-                    'first_sync_time': '',
-                    'last_sync_time': '',
-                    'data_types': []
-                }
-                
-                if 'sync' in prefs_data:
-                    sync_data = prefs_data['sync']
-                    
-                    # Check if sync is enabled
-                    if 'encryption' in sync_data and 'enabled' in sync_data['encryption']:
-                        sync_settings['enabled'] = True
-                    
-                    # Get sync timestamps
-                    if 'first_setup_complete' in sync_data:
-                        sync_settings['first_sync_time'] = chrome_time_to_datetime(sync_data.get('first_setup_time', 0))
-                    
-                    if 'last_synced_time' in sync_data:
-                        sync_settings['last_sync_time'] = chrome_time_to_datetime(sync_data.get('last_synced_time', 0))
-                        account_info['last_sync_time'] = sync_settings['last_sync_time']
-                    
-                    # Extract sync data types
-                    data_types = []
-                    
-                    # Check which data types are being synced
-                    if 'preferred_data_types' in sync_data:
-                        types_data = sync_data['preferred_data_types']
-                        for data_type, value in types_data.items():
-                            data_types.append({
-                                'name': data_type,
-                                'enabled': value
-                            })
-                    
-                    sync_settings['data_types'] = data_types
-                
-                sync_info = {
-                    'account_info': account_info,
-                    'sync_settings': sync_settings
-                }
-                
-                print(f"Extracted Chrome sync info: {sync_info}")
-                return sync_info
-                
-            except Exception as e:
-                print(f"Error parsing Chrome Preferences file: {e}")
-                import traceback
-                traceback.print_exc()
-                return {'account_info': {}, 'sync_settings': {}}
-        else:
-            print(f"Chrome Preferences file not found at: {preferences_path}")
-            # We can still return what we have from the history database
-            return {}
-        
-    except Exception as e:
-        print(f"Error extracting Chrome sync info: {e}")
-        import traceback
-        traceback.print_exc()
-        return {}
\ No newline at end of file
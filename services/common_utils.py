@@ -5,52 +5,61 @@ Created to break circular import dependencies.
 
 import os
 import pandas as pd
+from config import Config
 from utils.url_utils import extract_domain
 
+def read_visits_frame(conn, query, on_batch=None):
+    """
+    Read the visits query into a DataFrame with a domain column. With
+    on_batch, rows are read in chunks of Config.STREAMING_BATCH_SIZE and
+    on_batch(micros, domains) is called as each chunk arrives.
+    """
+    if on_batch is None:
+        full_df = pd.read_sql_query(query, conn)
+        full_df['domain'] = full_df['url'].apply(extract_domain)
+        return full_df
+    
+    chunks = []
+    for chunk in pd.read_sql_query(query, conn, chunksize=Config.STREAMING_BATCH_SIZE):
+        chunk['domain'] = chunk['url'].apply(extract_domain)
+        on_batch(chunk['visit_time_us'].to_numpy(dtype='int64', na_value=0), chunk['domain'].tolist())
+        chunks.append(chunk)
+    if not chunks:
+        full_df = pd.read_sql_query(f"{query} LIMIT 0", conn)
+        full_df['domain'] = full_df['url'].apply(extract_domain)
+        return full_df
+    return pd.concat(chunks, ignore_index=True)
+
 def find_download_sources(history_df, downloads):
     """
     Find possible sources for downloads by looking at history entries
     before the download occurred
     """
     download_sources = []
+    one_hour_us = 3600 * 1000000
     
     for download in downloads:
         filename = download.get('filename', '')
         download_url = download.get('url', '')
-        download_time = download.get('download_time', '')
+        download_time_us = download.get('download_time_us') or 0
         
-        if not download_time or not download_url:
-            continue
-        
-        # Convert to datetime for comparison
-        try:
-            download_time = pd.to_datetime(download_time)
-        except Exception as e:
-            print(f"Error parsing download time '{download_time}': {e}")
+        if not download_time_us or not download_url:
             continue
         
         # Get domain of the download
         download_domain = extract_domain(download_url)
         
         try:
-            # Create a copy of the dataframe to avoid modifying the original
-            history_copy = history_df.copy()
-            
-            # Convert visit_time to datetime
-            history_copy['visit_time_dt'] = pd.to_datetime(history_copy['visit_time'], errors='coerce')
-            
-            # Filter to remove rows with invalid datetime (NaT)
-            history_copy = history_copy.dropna(subset=['visit_time_dt'])
-            
-            # Filter history to entries before the download but within 1 hour
-            one_hour_before = download_time - pd.Timedelta(hours=1)
-            potential_sources = history_copy[
-                (history_copy['visit_time_dt'] <= download_time) & 
-                (history_copy['visit_time_dt'] >= one_hour_before)
+            # Filter history to entries before the download but within 1 hour.
+            # Times are integer epoch microseconds, so no datetime parsing is needed.
+            visit_times = history_df['visit_time_us']
+            potential_sources = history_df[
+                (visit_times <= download_time_us) & 
+                (visit_times >= download_time_us - one_hour_us)
             ]
             
             # Sort by time (most recent first)
-            potential_sources = potential_sources.sort_values('visit_time_dt', ascending=False)
+            potential_sources = potential_sources.sort_values('visit_time_us', ascending=False)
             
             # Look for:
             # 1. Same domain as download
@@ -67,7 +76,7 @@ def find_download_sources(history_df, downloads):
                         sources.append({
                             'url': source['url'],
                             'title': source['title'],
-                            'time': source['visit_time'],
+                            'time_us': int(source['visit_time_us']),
                             'match_type': 'same_domain'
                         })
             
@@ -76,14 +85,14 @@ def find_download_sources(history_df, downloads):
             if file_ext:
                 # Use str accessor only on string columns
                 if 'url' in potential_sources.columns and potential_sources['url'].dtype == 'object':
-                    file_pattern_sources = potential_sources[potential_sources['url'].str.contains(file_ext, case=False, na=False)]
+                    file_pattern_sources = potential_sources[potential_sources['url'].str.contains(file_ext, case=False, na=False, regex=False)]
                     if not file_pattern_sources.empty:
                         for _, source in file_pattern_sources.head(2).iterrows():
                             if source['url'] not in [s['url'] for s in sources]:
                                 sources.append({
                                     'url': source['url'],
                                     'title': source['title'],
-                                    'time': source['visit_time'],
+                                    'time_us': int(source['visit_time_us']),
                                     'match_type': 'file_pattern'
                                 })
             
@@ -94,14 +103,14 @@ def find_download_sources(history_df, downloads):
                         sources.append({
                             'url': source['url'],
                             'title': source['title'],
-                            'time': source['visit_time'],
+                            'time_us': int(source['visit_time_us']),
                             'match_type': 'temporal'
                         })
             
             download_sources.append({
                 'filename': filename,
                 'download_url': download_url,
-                'download_time': download_time.isoformat(),
+                'download_time_us': int(download_time_us),
                 'sources': sources
             })
         except Exception as e:
@@ -110,8 +119,8 @@ def find_download_sources(history_df, downloads):
             download_sources.append({
                 'filename': filename,
                 'download_url': download_url,
-                'download_time': download_time.isoformat(),
+                'download_time_us': int(download_time_us),
                 'sources': []
             })
     
-    return download_sources
\ No newline at end of file
+    return download_sources
@@ -0,0 +1,248 @@
+"""
+Chunked export writers for CSV, JSON, NDJSON, Excel, Parquet and Feather.
+
+Rows are produced in chunks of Config.EXPORT_CHUNK_SIZE straight from the
+stored columns, so memory stays bounded by one chunk per worker. Parquet
+and Feather take history chunks as columns ({field: values}), gathered
+from the VisitStore columns without building a dictionary per row; their
+schema is declared from the exported fields (ARROW_FIELD_TYPES). Chunk
+encoding (Arrow tables, compressed NDJSON members) runs on a thread pool
+while the writer consumes the results in order.
+"""
+import csv
+import gzip
+import itertools
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from utils.time_utils import resolve_timezone
+
+# Excel allows 1,048,576 rows per sheet; one is used by the header
+EXCEL_MAX_ROWS = 1048575
+
+EXPORT_FORMATS = {
+    'csv': ('csv', 'text/csv'),
+    'json': ('json', 'application/json'),
+    'ndjson': ('ndjson', 'application/x-ndjson'),
+    'ndjson.gz': ('ndjson.gz', 'application/gzip'),
+    'ndjson.zst': ('ndjson.zst', 'application/zstd'),
+    'excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'feather': ('feather', 'application/vnd.apache.arrow.file'),
+}
+
+# Formats written through Arrow, which accept column chunks
+ARROW_FORMATS = ('parquet', 'feather')
+
+# Arrow type of the exported fields that are not strings
+ARROW_FIELD_TYPES = {
+    'id': 'int64',
+    'visit_timestamp': 'int64',
+    'visit_count': 'int64',
+    'file_size': 'int64',
+    'unique_urls': 'int64',
+    'unique_domains': 'int64',
+    'frequency': 'double',
+}
+
+
+class ExportDependencyError(Exception):
+    """Raised when an export format needs an optional package that is not installed"""
+
+
+def history_chunks(store, fields, tz=None, chunk_size=None, positions=None, columnar=False):
+    """
+    Yield lists of entry dictionaries from a VisitStore, chunk_size rows at a
+    time; with positions (e.g. from select_visits), only those visits. With
+    columnar, yield {field: values} column chunks instead (for ARROW_FORMATS)
+    """
+    tz = tz or resolve_timezone()
+    chunk_size = chunk_size or Config.EXPORT_CHUNK_SIZE
+    total = len(store) if positions is None else len(positions)
+    for start in range(0, total, chunk_size):
+        if columnar:
+            window = slice(start, start + chunk_size) if positions is None else positions[start:start + chunk_size]
+            yield store.columns(window, fields, tz)
+        elif positions is None:
+            rows = store.page(start, start + chunk_size, tz)
+            yield [{field: row.get(field) for field in fields} for row in rows]
+        else:
+            rows = store.take(positions[start:start + chunk_size], tz)
+            yield [{field: row.get(field) for field in fields} for row in rows]
+
+
+def list_chunks(items, fields, chunk_size=None):
+    """Yield lists of dictionaries from a list of records, chunk_size rows at a time"""
+    chunk_size = chunk_size or Config.EXPORT_CHUNK_SIZE
+    for start in range(0, len(items), chunk_size):
+        yield [_to_row(item, fields) for item in items[start:start + chunk_size]]
+
+
+def _to_row(item, fields):
+    """Restrict a record (dict or object) to fields"""
+    if not isinstance(item, dict):
+        item = vars(item) if hasattr(item, '__dict__') else {}
+    if not fields:
+        return dict(item)
+    return {field: item.get(field) for field in fields}
+
+
+def _ordered_parallel_map(func, iterable, workers=None):
+    """
+    Like executor.map, but keeps at most 2 * workers chunks in flight so a
+    large export never materializes all chunks at once
+    """
+    workers = workers or Config.EXPORT_WORKERS
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for item in iterable:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def write_export(export_format, chunks, fields, path):
+    """Write chunks to path in export_format and return the number of rows written"""
+    if export_format == 'csv':
+        return _write_csv(chunks, fields, path)
+    if export_format == 'json':
+        return _write_json(chunks, path)
+    if export_format in ('ndjson', 'ndjson.gz', 'ndjson.zst'):
+        return _write_ndjson(chunks, path, export_format.rpartition('.')[2] if '.' in export_format else None)
+    if export_format == 'excel':
+        return _write_excel(chunks, fields, path)
+    if export_format in ARROW_FORMATS:
+        return _write_arrow(chunks, fields, path, export_format)
+    raise ValueError(f"Unsupported export format: {export_format}")
+
+
+def _write_csv(chunks, fields, path):
+    rows_written = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = None
+        for chunk in chunks:
+            if writer is None:
+                writer = csv.DictWriter(f, fieldnames=fields or list(chunk[0].keys()), extrasaction='ignore')
+                writer.writeheader()
+            writer.writerows(chunk)
+            rows_written += len(chunk)
+    return rows_written
+
+
+def _write_json(chunks, path):
+    rows_written = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('[')
+        for chunk in chunks:
+            for row in chunk:
+                f.write(',\n' if rows_written else '\n')
+                f.write(json.dumps(row, default=str))
+                rows_written += 1
+        f.write('\n]\n')
+    return rows_written
+
+
+def _write_ndjson(chunks, path, compression=None):
+    if compression == 'zst':
+        try:
+            import zstandard
+        except ImportError:
+            raise ExportDependencyError("Export format 'ndjson.zst' requires the zstandard package")
+
+    def encode(chunk):
+        # Each chunk becomes an independent gzip member / zstd frame; concatenated
+        # members form a valid stream, so chunks can be compressed in parallel
+        data = ''.join(json.dumps(row, default=str) + '\n' for row in chunk).encode('utf-8')
+        if compression == 'gz':
+            data = gzip.compress(data, compresslevel=6)
+        elif compression == 'zst':
+            data = zstandard.ZstdCompressor(level=3).compress(data)
+        return len(chunk), data
+
+    rows_written = 0
+    with open(path, 'wb') as f:
+        for row_count, data in _ordered_parallel_map(encode, chunks):
+            f.write(data)
+            rows_written += row_count
+    return rows_written
+
+
+def _write_excel(chunks, fields, path):
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise ExportDependencyError("Export format 'excel' requires the openpyxl package")
+
+    workbook = Workbook(write_only=True)
+    sheet = None
+    sheet_rows = 0
+    rows_written = 0
+    for chunk in chunks:
+        fields = fields or list(chunk[0].keys())
+        for row in chunk:
+            # Split across sheets instead of exceeding Excel's row limit
+            if sheet is None or sheet_rows >= EXCEL_MAX_ROWS:
+                sheet = workbook.create_sheet(title=f"Sheet{len(workbook.worksheets) + 1}")
+                sheet.append(list(fields))
+                sheet_rows = 0
+            sheet.append([row.get(field) for field in fields])
+            sheet_rows += 1
+            rows_written += 1
+
+    if sheet is None:
+        workbook.create_sheet(title='Sheet1').append(list(fields or []))
+    workbook.save(path)
+    return rows_written
+
+
+def _write_arrow(chunks, fields, path, export_format):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        import pyarrow.ipc as ipc
+    except ImportError:
+        raise ExportDependencyError(f"Export format '{export_format}' requires the pyarrow package")
+
+    if not fields:
+        # Without a field list, the first chunk's columns are exported
+        chunks = iter(chunks)
+        first = next(chunks, None)
+        fields = [] if first is None else list(first if isinstance(first, dict) else first[0])
+        chunks = itertools.chain([] if first is None else [first], chunks)
+
+    # Declared up front, so a later chunk with an all-null column still matches
+    schema = pa.schema([(field, pa.type_for_alias(ARROW_FIELD_TYPES.get(field, 'string'))) for field in fields])
+
+    def to_table(chunk):
+        if isinstance(chunk, dict):
+            # Column chunk from history_chunks(columnar=True)
+            return pa.Table.from_pydict({field: chunk[field] for field in fields}, schema=schema)
+        return pa.Table.from_pydict({field: [row.get(field) for row in chunk] for field in fields}, schema=schema)
+
+    writer = None
+    rows_written = 0
+    try:
+        # One row group (Parquet) or record batch (Feather) per chunk
+        for table in _ordered_parallel_map(to_table, chunks):
+            if writer is None:
+                if export_format == 'parquet':
+                    writer = pq.ParquetWriter(path, schema, compression='zstd')
+                else:
+                    writer = ipc.new_file(path, schema, options=ipc.IpcWriteOptions(compression='zstd'))
+            writer.write_table(table)
+            rows_written += table.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if writer is None:
+        empty = schema.empty_table()
+        if export_format == 'parquet':
+            pq.write_table(empty, path)
+        else:
+            with ipc.new_file(path, schema) as empty_writer:
+                empty_writer.write_table(empty)
+    return rows_written
@@ -0,0 +1,127 @@
+"""
+Firefox download extraction from targeted moz_annos lookups.
+
+Firefox records each download as two annotations on the downloaded URL's
+place: downloads/destinationFileURI (the saved file) and downloads/metaData
+(JSON with state, endTime and fileSize). Both attribute ids are resolved
+once per database, then a single query pivots them into one row per download
+instead of scanning every annotation whose name mentions "download".
+Profiles from Firefox 25 and earlier keep a moz_downloads table instead.
+"""
+import json
+from utils.file_utils import extract_filename
+from utils.time_utils import convert_firefox_download_state
+
+DESTINATION_ATTRIBUTE = 'downloads/destinationFileURI'
+METADATA_ATTRIBUTE = 'downloads/metaData'
+
+# One row per download: the destination annotation pivoted together with the
+# metaData annotation of the same place via the unique (place_id, anno_attribute_id) index
+FIREFOX_DOWNLOADS_QUERY = """
+SELECT
+    p.url,
+    dest.content,
+    dest.dateAdded,
+    meta.content
+FROM moz_annos dest
+JOIN moz_places p ON p.id = dest.place_id
+LEFT JOIN moz_annos meta
+    ON meta.place_id = dest.place_id AND meta.anno_attribute_id = :metadata
+WHERE dest.anno_attribute_id = :destination
+ORDER BY dest.dateAdded DESC
+"""
+
+# Firefox 25 and earlier (times are already epoch microseconds)
+LEGACY_DOWNLOADS_QUERY = """
+SELECT
+    source,
+    target,
+    startTime,
+    endTime,
+    state,
+    IFNULL(referrer, ''),
+    IFNULL(maxBytes, 0),
+    IFNULL(mimeType, '')
+FROM moz_downloads
+ORDER BY startTime DESC
+"""
+
+
+def resolve_download_attributes(conn):
+    """Look up the moz_anno_attributes ids of the destination and metadata annotations"""
+    rows = conn.execute(
+        "SELECT name, id FROM moz_anno_attributes WHERE name IN (?, ?)",
+        (DESTINATION_ATTRIBUTE, METADATA_ATTRIBUTE)
+    ).fetchall()
+    return dict(rows)
+
+
+def read_firefox_downloads(conn, plan):
+    """Read Firefox downloads as a list of dictionaries"""
+    try:
+        if 'moz_anno_attributes' in plan['tables']:
+            attributes = resolve_download_attributes(conn)
+            if DESTINATION_ATTRIBUTE in attributes:
+                return _read_annotated_downloads(conn, attributes)
+        if 'moz_downloads' in plan['tables']:
+            return _read_legacy_downloads(conn)
+    except Exception as e:
+        print(f"Error processing Firefox downloads: {e}")
+    return []
+
+
+def _read_annotated_downloads(conn, attributes):
+    # -1 never matches, so a missing metaData attribute just yields NULL metadata
+    cursor = conn.execute(FIREFOX_DOWNLOADS_QUERY, {
+        'destination': attributes[DESTINATION_ATTRIBUTE],
+        'metadata': attributes.get(METADATA_ATTRIBUTE, -1)
+    })
+
+    downloads = []
+    for url, destination, date_added, metadata in cursor:
+        filename = extract_filename(destination)
+        if not filename:
+            continue
+        meta = _parse_metadata(metadata)
+        end_time_ms = meta.get('endTime') or 0
+        downloads.append({
+            'filename': filename,
+            'url': url,
+            'download_time_us': date_added,
+            'end_time_us': int(end_time_ms) * 1000,
+            'referrer': '',
+            'status': convert_firefox_download_state(meta.get('state', 1)),
+            'file_size': int(meta.get('fileSize') or 0),
+            'mime_type': ''
+        })
+    return downloads
+
+
+def _parse_metadata(metadata):
+    """Parse a downloads/metaData annotation, returning {} if absent or malformed"""
+    if not metadata:
+        return {}
+    try:
+        meta = json.loads(metadata)
+    except ValueError:
+        return {}
+    return meta if isinstance(meta, dict) else {}
+
+
+def _read_legacy_downloads(conn):
+    downloads = []
+    for source, target, start_time, end_time, state, referrer, max_bytes, mime_type in conn.execute(LEGACY_DOWNLOADS_QUERY):
+        filename = extract_filename(target)
+        if not filename:
+            continue
+        downloads.append({
+            'filename': filename,
+            'url': source,
+            'download_time_us': start_time,
+            'end_time_us': end_time or 0,
+            'referrer': referrer,
+            'status': convert_firefox_download_state(state),
+            'file_size': max(int(max_bytes), 0),
+            'mime_type': mime_type
+        })
+    return downloads
@@ -0,0 +1,78 @@
+"""
+Time-bucketed visit histograms computed with NumPy over epoch-second arrays.
+"""
+from datetime import datetime, timezone
+import numpy as np
+
+# Fixed-width bucket sizes in seconds
+BUCKET_WIDTHS = {
+    'minute': 60,
+    'hour': 3600,
+    'day': 86400
+}
+
+BUCKET_TYPES = tuple(BUCKET_WIDTHS) + ('weekday_hour',)
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+def build_histogram(store, bucket='hour', domain=None, start=None, end=None, registrable_domain=None):
+    """
+    Count visits per time bucket.
+
+    bucket is one of BUCKET_TYPES. domain optionally restricts the counts to
+    one domain and registrable_domain to all hosts under one registrable
+    domain (e.g. example.co.uk); start/end are optional inclusive UTC epoch-second bounds.
+    Fixed-width buckets are returned sparsely as parallel 'epochs'/'counts'
+    lists; 'weekday_hour' returns a 7x24 matrix with Monday first.
+    """
+    if bucket not in BUCKET_TYPES:
+        raise ValueError(f"Unsupported bucket: {bucket}")
+
+    # Only the time partitions overlapping the window are read
+    span = slice(*store.time_span(start, end))
+    epochs = store.epoch_array(span)
+    mask = epochs > 0
+    if domain:
+        mask &= store.domain_code_array(span) == store.domains.lookup(domain)
+    if registrable_domain:
+        mask &= store.registrable_code_array(span) == store.registrable_domains.lookup(registrable_domain)
+    if start is not None:
+        mask &= epochs >= start
+    if end is not None:
+        mask &= epochs <= end
+    epochs = epochs[mask]
+
+    result = {
+        'bucket': bucket,
+        'domain': domain or '',
+        'registrable_domain': registrable_domain or '',
+        'total_visits': int(epochs.size)
+    }
+
+    if bucket == 'weekday_hour':
+        # 1970-01-01 was a Thursday, i.e. weekday 3 with Monday as 0
+        weekdays = (epochs // 86400 + 3) % 7
+        hours = (epochs // 3600) % 24
+        counts = np.bincount(weekdays * 24 + hours, minlength=7 * 24).reshape(7, 24)
+        result['weekdays'] = WEEKDAYS
+        result['counts'] = counts.tolist()
+        return result
+
+    width = BUCKET_WIDTHS[bucket]
+    result['width'] = width
+    if epochs.size == 0:
+        result['epochs'] = []
+        result['counts'] = []
+        return result
+
+    # Bucket relative to the earliest bucket so bincount stays dense and small
+    buckets = epochs // width
+    first = int(buckets.min())
+    counts = np.bincount(buckets - first)
+    nonzero = np.flatnonzero(counts)
+
+    result['start'] = datetime.fromtimestamp(first * width, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    result['epochs'] = ((nonzero + first) * width).tolist()
+    result['counts'] = counts[nonzero].tolist()
+    return result
@@ -1,21 +1,144 @@
 """
 Main history processor module that coordinates browser-specific processors.
+
+With Config.PROCESSING_WORKERS > 0, parsing runs in a pool of worker
+processes so CPU-bound ingest does not hold the serving process's GIL.
+Workers persist their results through the storage layer (the shared
+SQLite backend, or the workspace column cache with the memory backend),
+from which the serving process loads them on first access.
+
+ensure_processed() re-processes an upload whose results are no longer
+stored. Concurrent callers for the same file_id share one ingest: threads
+of this process through a single-flight coordinator, other processes
+through a lock file in the upload's workspace.
 """
 import os
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from config import Config
 from utils.file_utils import detect_browser_type
+from utils.workspace import workspace_path, workspace_lock, SOURCE_NAME
+from utils.single_flight import SingleFlight
+from utils.profiling import phase, profiling_active
+from services.schema_detection import get_query_plan
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+# In-flight re-processing, keyed by file_id
+_reprocessing = SingleFlight()
 
-def process_history_file(file_path, browser_type, file_id, page=1, page_size=1000):
-    """Process history file based on browser type"""
+def _get_process_pool():
+    """Create the parsing process pool on first use"""
+    global _process_pool
+    # Concurrent first requests must not each start a pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            # spawn: forking a threaded server process is unsafe
+            _process_pool = ProcessPoolExecutor(
+                max_workers=Config.PROCESSING_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _process_pool
+
+def _can_process_in_pool(file_path, file_id):
+    """Results of a pool worker are only visible here if storage persists them"""
+    if Config.PROCESSING_WORKERS <= 0:
+        return False
+    if Config.STORAGE_BACKEND == 'sqlite':
+        return True
+    # The memory backend persists through the workspace cache, so the file must live there
     try:
+        in_workspace = os.path.abspath(file_path) == os.path.abspath(workspace_path(file_id, SOURCE_NAME, create=False))
+    except ValueError:
+        return False
+    return Config.COLUMN_CACHE and in_workspace
+
+def _process_in_worker(file_path, browser_type, file_id, page, page_size, engine):
+    """Pool entry point: process and persist a file, then drop the worker's own copy"""
+    result = _process_locally(file_path, browser_type, file_id, page, page_size, engine)
+    from services.storage import processed_files
+    processed_files.pop(file_id, None)
+    return result
+
+def process_history_file(file_path, browser_type, file_id, page=1, page_size=1000, engine=None, on_batch=None):
+    """
+    Process history file based on its detected schema, falling back to browser_type.
+    on_batch, if given, is called with the visit times and domains of every batch of visits read.
+    """
+    engine = engine or Config.PROCESSING_ENGINE
+    # A batch callback cannot cross into a worker process, and a profiled request is profiled here
+    if on_batch is None and not profiling_active() and _can_process_in_pool(file_path, file_id):
+        try:
+            future = _get_process_pool().submit(
+                _process_in_worker, file_path, browser_type, file_id, page, page_size, engine
+            )
+            return future.result()
+        except Exception as e:
+            print(f"Error processing {browser_type} history in worker pool: {e}")
+            import traceback
+            traceback.print_exc()
+            return {'error': f"Error processing {browser_type} history: {str(e)}"}
+    return _process_locally(file_path, browser_type, file_id, page, page_size, engine, on_batch)
+
+def _process_locally(file_path, browser_type, file_id, page, page_size, engine, on_batch=None):
+    """Process a history file in this process"""
+    try:
+        # The database contents decide the browser; the filename-based guess is only a fallback
+        with phase('schema'):
+            plan = get_query_plan(file_path)
+        if plan['browser_type'] and plan['browser_type'] != browser_type:
+            print(f"Schema {plan['fingerprint']} is {plan['browser_type']}, not {browser_type}")
+            browser_type = plan['browser_type']
+
         # Dynamic import to avoid circular dependencies
-        if browser_type == 'firefox':
+        if engine in ('streaming', 'parallel'):
+            from services.streaming_processor import process_chrome_history_streaming, process_firefox_history_streaming
+            parallel = engine == 'parallel'
+            if browser_type == 'firefox':
+                return process_firefox_history_streaming(file_path, file_id, page, page_size, plan, on_batch, parallel)
+            return process_chrome_history_streaming(file_path, file_id, page, page_size, plan, on_batch, parallel)
+        elif browser_type == 'firefox':
             from services.firefox_processor import process_firefox_history
-            return process_firefox_history(file_path, file_id, page, page_size)
+            return process_firefox_history(file_path, file_id, page, page_size, plan, on_batch)
         else:
             from services.chrome_processor import process_chrome_history
-            return process_chrome_history(file_path, file_id, page, page_size)
+            return process_chrome_history(file_path, file_id, page, page_size, plan, on_batch)
     except Exception as e:
         print(f"Error processing {browser_type} history: {e}")
         import traceback
         traceback.print_exc()
-        return {'error': f"Error processing {browser_type} history: {str(e)}"}
\ No newline at end of file
+        return {'error': f"Error processing {browser_type} history: {str(e)}"}
+
+def ensure_processed(file_id):
+    """
+    Make sure a file's processed data is available, re-processing its uploaded
+    database if it is no longer stored. Returns False if there is nothing to
+    process; raises if re-processing fails.
+    """
+    from services.storage import file_exists
+    if file_exists(file_id):
+        return True
+    try:
+        file_path = workspace_path(file_id, SOURCE_NAME, create=False)
+    except ValueError:
+        return False
+    if not os.path.exists(file_path):
+        return False
+    return _reprocessing.do(file_id, _reprocess, file_id, file_path)
+
+def _reprocess(file_id, file_path):
+    """Re-process a stored upload unless another thread or process already has"""
+    from services.storage import file_exists
+    with workspace_lock(file_id, 'processing'):
+        # A process holding the lock before us may have stored the results meanwhile
+        if file_exists(file_id):
+            return True
+        print(f"File found on disk but not in memory, attempting to re-process: {file_path}")
+        result = process_history_file(file_path, detect_browser_type(file_path), file_id, 1, Config.DEFAULT_PAGE_SIZE)
+        if 'error' in result:
+            raise RuntimeError(result['error'])
+        if not file_exists(file_id):
+            raise RuntimeError('Failed to re-process file')
+    return True
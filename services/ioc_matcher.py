@@ -0,0 +1,383 @@
+"""
+Indicator-of-compromise (IOC) matching over stored visits and downloads.
+
+An indicator list is parsed once into three structures:
+
+    domains   a reversed-label trie, flattened into one set keyed by label
+              path; a host matches every indicator among its label suffixes,
+              found by walking its labels from the TLD inward
+    hashes    a set of lowercase hex MD5/SHA-1/SHA-256 digests, checked
+              against Chrome's downloads.hash
+    URLs      an Aho-Corasick automaton over URL substrings (pyahocorasick if
+              installed, otherwise a pure-Python automaton)
+
+Visits are matched per distinct domain and per distinct URL, never per
+visit: the hits are folded into one flag per URL code and the matching
+visits are selected with a single NumPy gather over the visit column.
+"""
+import re
+import threading
+import time
+import uuid
+import weakref
+import numpy as np
+from config import Config
+from services.visit_store import _column_array
+from utils.url_utils import extract_domain
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+INDICATOR_TYPES = ('domain', 'url', 'hash')
+
+_HASH_PATTERN = re.compile(r'^(?:[0-9a-f]{32}|[0-9a-f]{40}|[0-9a-f]{64})$')
+_SCHEME_PATTERN = re.compile(r'^[a-z][a-z0-9+.-]*://')
+
+# Registered indicator lists by list_id with their last use time, and per-store match results for them
+_indicator_sets = {}
+_match_cache = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def refang(value):
+    """Undo common indicator defanging (hxxp://, [.], (.), [:])"""
+    value = value.replace('[.]', '.').replace('(.)', '.').replace('[:]', ':')
+    return re.sub(r'^hxxp', 'http', value)
+
+
+def classify_indicator(line):
+    """
+    Parse one indicator line into (type, normalized value), or None for blank
+    and comment lines. An explicit 'domain:', 'url:' or 'hash:' prefix wins;
+    otherwise hex digests are hashes, values with a '/' are URLs and
+    everything else is a domain.
+    """
+    value = line.strip()
+    if not value or value.startswith('#'):
+        return None
+    kind, separator, rest = value.partition(':')
+    if separator and kind.lower() in INDICATOR_TYPES and not rest.startswith('//'):
+        kind, value = kind.lower(), rest.strip()
+    else:
+        kind = None
+    value = refang(value.lower())
+
+    if kind == 'hash' or (kind is None and _HASH_PATTERN.match(value)):
+        return ('hash', value) if _HASH_PATTERN.match(value) else None
+    if kind == 'url' or (kind is None and '/' in value):
+        # Match the URL under any scheme
+        value = _SCHEME_PATTERN.sub('', value)
+        return ('url', value) if value else None
+
+    value = value.lstrip('*.').rstrip('.')
+    # Stored domains drop 'www.', so indicators must too
+    if value.startswith('www.'):
+        value = value[4:]
+    if not value or ' ' in value:
+        return None
+    return ('domain', value)
+
+
+class PythonAutomaton:
+    """Pure-Python Aho-Corasick automaton, used when pyahocorasick is not installed"""
+
+    # Edges are kept in one dict keyed by node * _ALPHABET + code point
+    _ALPHABET = 0x110000
+
+    def __init__(self, patterns):
+        goto = {}
+        outputs = [[]]
+        # Edge keys grouped by the depth of the node they lead to
+        levels = []
+        for index, pattern in enumerate(patterns):
+            node = 0
+            for depth, char in enumerate(pattern):
+                key = node * self._ALPHABET + ord(char)
+                child = goto.get(key)
+                if child is None:
+                    child = goto[key] = len(outputs)
+                    outputs.append([])
+                    if depth == len(levels):
+                        levels.append([])
+                    levels[depth].append(key)
+                node = child
+            outputs[node].append(index)
+
+        # Failure links in breadth-first order, plus a link to the nearest
+        # node along the failure chain that ends a pattern
+        fail = [0] * len(outputs)
+        output_link = [0] * len(outputs)
+        for key in (key for level in levels for key in level):
+            child = goto[key]
+            parent, code = divmod(key, self._ALPHABET)
+            target = 0
+            if parent:
+                state = fail[parent]
+                while True:
+                    target = goto.get(state * self._ALPHABET + code)
+                    if target is not None or state == 0:
+                        break
+                    state = fail[state]
+                target = target or 0
+            fail[child] = target
+            output_link[child] = target if outputs[target] else output_link[target]
+
+        self._goto = goto
+        self._fail = fail
+        self._outputs = outputs
+        self._output_link = output_link
+
+    def find(self, text):
+        """Indices of all patterns occurring in text"""
+        goto, fail, outputs, output_link = self._goto, self._fail, self._outputs, self._output_link
+        alphabet = self._ALPHABET
+        found = set()
+        node = 0
+        for char in text:
+            code = ord(char)
+            while True:
+                child = goto.get(node * alphabet + code)
+                if child is not None:
+                    node = child
+                    break
+                if node == 0:
+                    break
+                node = fail[node]
+            match = node if outputs[node] else output_link[node]
+            while match:
+                found.update(outputs[match])
+                match = output_link[match]
+        return found
+
+
+class CAutomaton:
+    """Aho-Corasick automaton backed by pyahocorasick"""
+
+    def __init__(self, patterns):
+        self._automaton = ahocorasick.Automaton()
+        for index, pattern in enumerate(patterns):
+            self._automaton.add_word(pattern, index)
+        self._automaton.make_automaton()
+
+    def find(self, text):
+        """Indices of all patterns occurring in text"""
+        return {index for _, index in self._automaton.iter(text)}
+
+
+class IndicatorSet:
+    """Compiled indicator list: domain trie, hash set and URL substring automaton"""
+
+    def __init__(self, lines, name=''):
+        self.name = name
+        self.domains = set()
+        self.hashes = set()
+        url_patterns = {}
+        self.skipped = 0
+        for line in lines:
+            # JSON lists may hold numbers, nulls or objects; those are not indicators
+            if not isinstance(line, str):
+                self.skipped += 1
+                continue
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parsed = classify_indicator(line)
+            if parsed is None:
+                self.skipped += 1
+                continue
+            kind, value = parsed
+            if kind == 'domain':
+                self.domains.add(value)
+            elif kind == 'hash':
+                self.hashes.add(value)
+            else:
+                url_patterns.setdefault(value, len(url_patterns))
+        self.url_patterns = list(url_patterns)
+        self.automaton = None
+        if self.url_patterns:
+            self.automaton = (CAutomaton if ahocorasick is not None else PythonAutomaton)(self.url_patterns)
+
+    def counts(self):
+        """Number of indicators of each type"""
+        return {'domain': len(self.domains), 'url': len(self.url_patterns), 'hash': len(self.hashes)}
+
+    def match_host(self, host):
+        """Domain indicators matching host or one of its parent domains, broadest first"""
+        if not host or not self.domains:
+            return []
+        host = host.lower().rsplit('@', 1)[-1]
+        if not host.startswith('['):
+            host = host.split(':', 1)[0]
+        labels = host.rstrip('.').split('.')
+        matches = []
+        for i in range(len(labels) - 1, -1, -1):
+            suffix = '.'.join(labels[i:])
+            if suffix in self.domains:
+                matches.append(suffix)
+        return matches
+
+    def match_url(self, url):
+        """URL indicators occurring in url"""
+        if not url or self.automaton is None:
+            return []
+        return [self.url_patterns[index] for index in sorted(self.automaton.find(url.lower()))]
+
+    def match_hash(self, value):
+        """Hash indicators equal to value"""
+        value = (value or '').lower()
+        return [value] if value in self.hashes else []
+
+
+def _expire_lists(now):
+    """Drop lists idle for longer than Config.IOC_LIST_TTL_SECONDS, then the least recently used over the cap"""
+    expired = [list_id for list_id, (_, used) in _indicator_sets.items()
+               if now - used > Config.IOC_LIST_TTL_SECONDS]
+    excess = len(_indicator_sets) - len(expired) - Config.IOC_MAX_LISTS
+    if excess > 0:
+        live = sorted((used, list_id) for list_id, (_, used) in _indicator_sets.items() if list_id not in expired)
+        expired += [list_id for _, list_id in live[:excess]]
+    for list_id in expired:
+        _drop_list(list_id)
+
+
+def _drop_list(list_id):
+    """Forget a list and its cached match results (caller holds _lock)"""
+    _indicator_sets.pop(list_id, None)
+    for results in _match_cache.values():
+        results.pop(list_id, None)
+
+
+def register_indicator_list(lines, name=''):
+    """Compile and register an indicator list, returning its list_id"""
+    indicator_set = IndicatorSet(lines, name)
+    list_id = str(uuid.uuid4())
+    with _lock:
+        now = time.time()
+        _indicator_sets[list_id] = (indicator_set, now)
+        _expire_lists(now)
+    print(f"Registered indicator list {list_id} ({name}): {indicator_set.counts()}, "
+          f"{indicator_set.skipped} skipped")
+    return list_id
+
+
+def get_indicator_list(list_id):
+    """Get a registered IndicatorSet, or None"""
+    with _lock:
+        now = time.time()
+        _expire_lists(now)
+        entry = _indicator_sets.get(list_id)
+        if entry is None:
+            return None
+        _indicator_sets[list_id] = (entry[0], now)
+        return entry[0]
+
+
+def delete_indicator_list(list_id):
+    """Delete a registered list; returns whether it existed"""
+    with _lock:
+        found = list_id in _indicator_sets
+        _drop_list(list_id)
+    return found
+
+
+def list_indicator_lists():
+    """Summaries of all registered indicator lists"""
+    with _lock:
+        _expire_lists(time.time())
+        entries = list(_indicator_sets.items())
+    return [
+        {'list_id': list_id, 'name': indicator_set.name, 'counts': indicator_set.counts()}
+        for list_id, (indicator_set, _) in entries
+    ]
+
+
+def _match_visits(store, indicator_set):
+    """
+    Match every distinct domain and URL once, then select the matching visits.
+    Returns (visit positions newest first, {url code: [(type, indicator)]}).
+    """
+    domain_hits = {}
+    for code, domain in enumerate(store.domains.values):
+        hits = indicator_set.match_host(domain)
+        if hits:
+            domain_hits[code] = hits
+
+    url_domain_codes = _column_array(store.url_domain_codes)
+    url_matches = {}
+    if domain_hits:
+        for code in np.flatnonzero(np.isin(url_domain_codes, list(domain_hits))).tolist():
+            url_matches[code] = [('domain', hit) for hit in domain_hits[int(url_domain_codes[code])]]
+    if indicator_set.automaton is not None:
+        for code, url in enumerate(store.url_values):
+            hits = indicator_set.match_url(url)
+            if hits:
+                url_matches.setdefault(code, []).extend(('url', hit) for hit in hits)
+
+    url_matched = np.zeros(len(store.url_values), dtype=bool)
+    url_matched[list(url_matches)] = True
+    positions = np.flatnonzero(url_matched[_column_array(store.url_codes)])
+    return positions, url_matches
+
+
+def _summarize_indicators(store, positions, url_matches):
+    """Visit count and first/last seen time of every indicator that matched"""
+    if not len(positions):
+        return []
+    url_codes = _column_array(store.url_codes)[positions]
+    micros = store.micros_array()[positions]
+    # Positions are newest first: a code's first occurrence is its latest visit
+    codes, newest_index, counts = np.unique(url_codes, return_index=True, return_counts=True)
+    _, oldest_index = np.unique(url_codes[::-1], return_index=True)
+    oldest_index = len(url_codes) - 1 - oldest_index
+
+    summary = {}
+    for code, newest, oldest, count in zip(codes.tolist(), newest_index, oldest_index, counts):
+        for kind, indicator in url_matches[code]:
+            item = summary.setdefault((kind, indicator), {
+                'indicator': indicator, 'type': kind, 'visit_count': 0,
+                'first_seen_us': int(micros[oldest]), 'last_seen_us': int(micros[newest])
+            })
+            item['visit_count'] += int(count)
+            item['first_seen_us'] = min(item['first_seen_us'], int(micros[oldest]))
+            item['last_seen_us'] = max(item['last_seen_us'], int(micros[newest]))
+    return sorted(summary.values(), key=lambda item: (-item['visit_count'], item['indicator']))
+
+
+def match_downloads(downloads, indicator_set):
+    """Downloads whose URL, referrer or file hash matches, each with its matches"""
+    matched = []
+    for download in downloads:
+        matches = []
+        for field in ('url', 'referrer'):
+            value = download.get(field) or ''
+            matches += [{'field': field, 'type': 'domain', 'indicator': hit}
+                        for hit in indicator_set.match_host(extract_domain(value))]
+            matches += [{'field': field, 'type': 'url', 'indicator': hit}
+                        for hit in indicator_set.match_url(value)]
+        matches += [{'field': 'hash', 'type': 'hash', 'indicator': hit}
+                    for hit in indicator_set.match_hash(download.get('hash'))]
+        if matches:
+            matched.append(dict(download, matches=matches))
+    return matched
+
+
+def match_store(store, indicator_set, list_id=None):
+    """
+    Match a visit store against an indicator set. Results for registered
+    lists (list_id given) are cached with the store.
+    """
+    if list_id is not None:
+        with _lock:
+            cached = _match_cache.get(store, {}).get(list_id)
+        if cached is not None:
+            return cached
+
+    positions, url_matches = _match_visits(store, indicator_set)
+    result = (positions, url_matches, _summarize_indicators(store, positions, url_matches))
+
+    if list_id is not None:
+        with _lock:
+            _match_cache.setdefault(store, {})[list_id] = result
+    return result
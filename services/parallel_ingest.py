@@ -0,0 +1,217 @@
+"""
+Parallel ingest of one history database by rowid ranges.
+
+Both the visits table and the URL table (Chrome visits/urls, Firefox
+moz_historyvisits/moz_places) are split into contiguous rowid ranges of
+Config.INGEST_CHUNK_ROWS, and every range is read on its own read-only
+connection in a spawn process pool of Config.INGEST_WORKERS processes:
+
+    visit ranges  integer columns only (URL id, visit time converted to
+                  Unix epoch microseconds in SQL, visit id, from-visit,
+                  transition), returned as NumPy arrays
+    URL ranges    URL, title and visit count of every URL row, with its
+                  domain extracted in the worker, so each URL is parsed
+                  exactly once
+
+merge_visits() joins the visits to their URLs (visits of a missing URL are
+dropped, as by the sequential JOIN), sorts them newest first (ties by visit
+id, newest first, as the visit-time index returns them) and dictionary-
+encodes URLs, titles and domains in first-seen order. The result is the
+VisitStore the streaming engine builds by reading the same rows
+sequentially.
+"""
+import multiprocessing
+import threading
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from config import Config
+from services.visit_store import VisitStore
+from utils.file_utils import connect_readonly
+from utils.url_utils import extract_domain
+
+# Per browser: visits table, URL table and the queries reading one rowid range of each
+_TABLES = {
+    'chrome': {
+        'visits': 'visits',
+        'urls': 'urls',
+        'visits_query': """
+            SELECT url, visit_time - 11644473600000000, id, IFNULL(from_visit, 0), IFNULL(transition, 0)
+            FROM visits
+            WHERE id BETWEEN ? AND ? AND url IS NOT NULL
+        """,
+        'urls_query': "SELECT id, url, title, visit_count FROM urls WHERE id BETWEEN ? AND ?"
+    },
+    'firefox': {
+        'visits': 'moz_historyvisits',
+        'urls': 'moz_places',
+        'visits_query': """
+            SELECT place_id, IFNULL(visit_date, 0), id, IFNULL(from_visit, 0), IFNULL(visit_type, 0)
+            FROM moz_historyvisits
+            WHERE id BETWEEN ? AND ? AND place_id IS NOT NULL
+        """,
+        'urls_query': "SELECT id, url, title, visit_count FROM moz_places WHERE id BETWEEN ? AND ?"
+    }
+}
+
+_ingest_pool = None
+_ingest_pool_lock = threading.Lock()
+
+
+def _get_ingest_pool():
+    """Create the range-reading process pool on first use"""
+    global _ingest_pool
+    # Concurrent first uploads must not each start a pool
+    with _ingest_pool_lock:
+        if _ingest_pool is None:
+            # spawn: forking a threaded server process is unsafe
+            _ingest_pool = ProcessPoolExecutor(
+                max_workers=Config.INGEST_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _ingest_pool
+
+
+def rowid_ranges(file_path, table, chunk_rows=None):
+    """Inclusive (lo, hi) rowid ranges covering table, in chunks of chunk_rows rowids"""
+    chunk_rows = max(1, chunk_rows or Config.INGEST_CHUNK_ROWS)
+    conn = connect_readonly(file_path)
+    try:
+        # MIN/MAX of the integer primary key are two B-tree seeks, not scans
+        lo, hi = conn.execute(f"SELECT MIN(id), MAX(id) FROM {table}").fetchone()
+    finally:
+        conn.close()
+    if lo is None:
+        return []
+    return [(start, min(start + chunk_rows - 1, hi)) for start in range(lo, hi + 1, chunk_rows)]
+
+
+def read_visit_range(file_path, browser_type, lo, hi):
+    """Pool entry point: (url_ids, micros, visit_ids, from_visits, transitions) of the visits with rowids lo..hi"""
+    conn = connect_readonly(file_path)
+    try:
+        cursor = conn.execute(_TABLES[browser_type]['visits_query'], (lo, hi))
+        batches = []
+        while True:
+            rows = cursor.fetchmany(Config.STREAMING_BATCH_SIZE)
+            if not rows:
+                break
+            batches.append(np.array(rows, dtype=np.int64))
+    finally:
+        conn.close()
+    columns = np.concatenate(batches) if batches else np.zeros((0, 5), dtype=np.int64)
+    return tuple(np.ascontiguousarray(columns[:, index]) for index in range(5))
+
+
+def read_url_range(file_path, browser_type, lo, hi):
+    """Pool entry point: ids, URLs, titles, visit counts and domains of the URL rows with rowids lo..hi"""
+    conn = connect_readonly(file_path)
+    try:
+        rows = conn.execute(_TABLES[browser_type]['urls_query'], (lo, hi)).fetchall()
+    finally:
+        conn.close()
+    return {
+        'ids': np.array([row[0] for row in rows], dtype=np.int64),
+        'urls': [row[1] for row in rows],
+        'titles': [row[2] for row in rows],
+        'visit_counts': [row[3] for row in rows],
+        'domains': [extract_domain(row[1]) for row in rows]
+    }
+
+
+class _UrlIndex:
+    """Concatenated URL range results, searchable by URL id"""
+
+    def __init__(self, parts):
+        self.ids = np.concatenate([part['ids'] for part in parts] or [np.zeros(0, dtype=np.int64)])
+        self.order = np.argsort(self.ids, kind='stable')
+        self.sorted_ids = self.ids[self.order]
+        self.urls = [url for part in parts for url in part['urls']]
+        self.titles = [title for part in parts for title in part['titles']]
+        self.visit_counts = [count for part in parts for count in part['visit_counts']]
+        self.domains = [domain for part in parts for domain in part['domains']]
+
+    def rows(self, url_ids):
+        """Row of every URL id in the concatenated tables, or -1 for ids with no URL row"""
+        if not len(self.sorted_ids):
+            return np.full(len(url_ids), -1, dtype=np.int64)
+        found = np.minimum(np.searchsorted(self.sorted_ids, url_ids), len(self.sorted_ids) - 1)
+        return np.where(self.sorted_ids[found] == url_ids, self.order[found], -1)
+
+
+def _to_array(typecode, values):
+    column = array(typecode)
+    column.frombytes(np.ascontiguousarray(values, dtype=np.dtype(typecode)).tobytes())
+    return column
+
+
+def merge_visits(visit_parts, url_index):
+    """Join visit range results to their URLs and build one VisitStore ordered newest first"""
+    url_ids, micros, visit_ids, from_visits, transitions = [
+        np.concatenate([part[index] for part in visit_parts] or [np.zeros(0, dtype=np.int64)])
+        for index in range(5)
+    ]
+    rows = url_index.rows(url_ids)
+    # Newest first; visits without a URL row are dropped, as by the sequential JOIN
+    order = np.lexsort((-visit_ids, -micros))
+    order = order[rows[order] >= 0]
+    rows = rows[order]
+
+    # Encode URLs in the order their first visit appears, as a sequential read would
+    store = VisitStore()
+    present, first = np.unique(rows, return_index=True)
+    codes = np.zeros(len(url_index.urls), dtype=np.int64)
+    for row in present[np.argsort(first, kind='stable')].tolist():
+        codes[row] = store._url_code(int(url_index.ids[row]), url_index.urls[row], url_index.titles[row],
+                                     url_index.visit_counts[row], url_index.domains[row])
+
+    store.url_codes = _to_array('l', codes[rows])
+    store.visit_micros = _to_array('q', micros[order])
+    store.visit_ids = _to_array('q', visit_ids[order])
+    store.from_visits = _to_array('q', from_visits[order])
+    store.transitions = _to_array('q', transitions[order])
+    return store
+
+
+def read_visits_parallel(file_path, browser_type, on_batch=None):
+    """
+    Read the visits of a history database into a VisitStore, reading rowid
+    ranges concurrently. on_batch(micros, domains) is called for every visit
+    range once the URL ranges are read, in completion order.
+    """
+    browser_type = browser_type if browser_type in _TABLES else 'chrome'
+    tables = _TABLES[browser_type]
+    tasks = [(read_url_range, lo, hi) for lo, hi in rowid_ranges(file_path, tables['urls'])]
+    url_total = len(tasks)
+    tasks += [(read_visit_range, lo, hi) for lo, hi in rowid_ranges(file_path, tables['visits'])]
+
+    url_parts = []
+    visit_parts = []
+    url_index = None
+    reported = 0
+
+    def collect(func, result):
+        nonlocal url_index, reported
+        (url_parts if func is read_url_range else visit_parts).append(result)
+        if on_batch is None or len(url_parts) < url_total:
+            return
+        # A visit range's domains are known once every URL range is in
+        if url_index is None:
+            url_index = _UrlIndex(url_parts)
+        for url_ids, micros, _, _, _ in visit_parts[reported:]:
+            rows = url_index.rows(url_ids)
+            linked = rows >= 0
+            on_batch(micros[linked], [url_index.domains[row] for row in rows[linked].tolist()])
+        reported = len(visit_parts)
+
+    if Config.INGEST_WORKERS <= 1 or len(tasks) <= 2:
+        for func, lo, hi in tasks:
+            collect(func, func(file_path, browser_type, lo, hi))
+    else:
+        # URL ranges are submitted first, so progress reporting can start early
+        pool = _get_ingest_pool()
+        futures = {pool.submit(func, file_path, browser_type, lo, hi): func for func, lo, hi in tasks}
+        for future in as_completed(futures):
+            collect(futures[future], future.result())
+
+    return merge_visits(visit_parts, url_index or _UrlIndex(url_parts))
@@ -0,0 +1,316 @@
+"""
+Progressive ingest: publish partial results while a history file is processed.
+
+A progressive upload runs the normal ingest on a pool of
+Config.PROGRESSIVE_WORKERS threads (later uploads wait for a free one) and
+publishes events to a per-file channel as they become available:
+
+    preview      the newest page of visits, read through the visit-time
+                 index with a LIMIT query before the full ingest starts
+    estimate     approximate row counts from sqlite_stat1, else max(rowid)
+    aggregates   visits read so far, top domains and a per-day timeline,
+                 republished (at most every PROGRESS_INTERVAL_SECONDS) as
+                 batches of visits are read
+    complete     totals of the stored result, once it can be paged
+    error        processing failed
+
+Channels keep every event, so a subscriber that connects (or reconnects
+with Last-Event-ID) late still receives the whole sequence. Every event is
+also appended to progress.jsonl in the upload's workspace, so any worker
+process can replay and follow it. The process that accepted the upload keeps
+the channel in memory until PROGRESS_TTL_SECONDS after the ingest finishes
+and wakes its subscribers as soon as an event is published; other workers
+poll the file.
+"""
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from config import Config
+from services.storage import get_processed_data
+from services.visit_store import VisitStore
+from utils.file_utils import connect_readonly
+from utils.url_utils import extract_domain
+from utils.workspace import workspace_path
+
+PROGRESS_LOG_NAME = 'progress.jsonl'
+
+# Seconds between reads of another worker's progress log while waiting
+LOG_POLL_SECONDS = 0.5
+
+_DAY_MICROS = 86400 * 1000000
+
+# Tables holding visits, URLs and downloads per browser
+_TABLES = {
+    'chrome': {'visits': 'visits', 'urls': 'urls', 'downloads': 'downloads'},
+    'firefox': {'visits': 'moz_historyvisits', 'urls': 'moz_places'}
+}
+
+_channels = {}
+_channels_lock = threading.Lock()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _log_path(file_id, create=True):
+    return workspace_path(file_id, PROGRESS_LOG_NAME, create=create)
+
+
+class ProgressChannel:
+    """Ordered, replayable event log of one progressive ingest, mirrored to its workspace"""
+
+    def __init__(self, file_id):
+        self.events = []
+        self.finished_at = None
+        self.path = _log_path(file_id)
+        self._condition = threading.Condition()
+        self._listeners = set()
+        # Start a fresh log
+        open(self.path, 'w').close()
+
+    def publish(self, event, data, final=False):
+        line = json.dumps([event, data, final], separators=(',', ':')) + '\n'
+        with self._condition:
+            # One write per line; readers ignore a line until its newline is there
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+            self.events.append((event, data))
+            if final:
+                self.finished_at = time.monotonic()
+            self._condition.notify_all()
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener()
+
+    def wait(self, after, timeout):
+        """Events after index after (waiting up to timeout for one), and whether the log is closed"""
+        with self._condition:
+            if len(self.events) <= after and self.finished_at is None and timeout > 0:
+                self._condition.wait(timeout)
+            return self.events[after:], self.finished_at is not None
+
+    def subscribe(self, callback):
+        """Call callback (from the publishing thread) after every event; returns an unsubscribe function"""
+        with self._condition:
+            self._listeners.add(callback)
+        return lambda: self._listeners.discard(callback)
+
+
+class ProgressLog:
+    """Read-only view of a progress log written by another process (or an expired channel)"""
+
+    def __init__(self, file_id):
+        self.events = []
+        self.closed = False
+        self.path = _log_path(file_id, create=False)
+        self._offset = 0
+        self._lock = threading.Lock()
+
+    def _read(self):
+        with self._lock:
+            with open(self.path, 'rb') as f:
+                f.seek(self._offset)
+                data = f.read()
+            # Only complete lines; a line being written is read next time
+            end = data.rfind(b'\n') + 1
+            self._offset += end
+            for line in data[:end].splitlines():
+                event, payload, final = json.loads(line)
+                self.events.append((event, payload))
+                self.closed = self.closed or final
+
+    def wait(self, after, timeout):
+        """Events after index after (polling up to timeout for one), and whether the log is closed"""
+        deadline = time.monotonic() + timeout
+        while True:
+            self._read()
+            remaining = deadline - time.monotonic()
+            if len(self.events) > after or self.closed or remaining <= 0:
+                return self.events[after:], self.closed
+            time.sleep(min(LOG_POLL_SECONDS, remaining))
+
+    def subscribe(self, callback):
+        """Writers in other processes cannot notify, so subscribers poll; returns a no-op unsubscribe"""
+        return lambda: None
+
+
+def _prune_channels():
+    now = time.monotonic()
+    for file_id, channel in list(_channels.items()):
+        if channel.finished_at is not None and now - channel.finished_at > Config.PROGRESS_TTL_SECONDS:
+            del _channels[file_id]
+
+
+def _get_executor():
+    """Create the progressive ingest thread pool on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, Config.PROGRESSIVE_WORKERS),
+                                           thread_name_prefix='progressive')
+        return _executor
+
+
+def get_channel(file_id):
+    """The progress channel of a file, its progress log if another process ran it, or None"""
+    with _channels_lock:
+        channel = _channels.get(file_id)
+    if channel is not None:
+        return channel
+    try:
+        if os.path.exists(_log_path(file_id, create=False)):
+            return ProgressLog(file_id)
+    except ValueError:
+        pass
+    return None
+
+
+def active_file_ids():
+    """File IDs whose progressive ingest is still running"""
+    with _channels_lock:
+        return [file_id for file_id, channel in _channels.items() if channel.finished_at is None]
+
+
+def read_preview(file_path, browser_type, page_size, tz):
+    """The newest page_size visits, serialized like a page of the full result"""
+    from services.streaming_processor import CHROME_VISITS_QUERY, FIREFOX_VISITS_QUERY
+    query = FIREFOX_VISITS_QUERY if browser_type == 'firefox' else CHROME_VISITS_QUERY
+    conn = connect_readonly(file_path)
+    try:
+        # ORDER BY visit time DESC LIMIT n walks the visit-time index backwards and stops after n rows
+        rows = conn.execute(f"{query} LIMIT ?", (page_size,)).fetchall()
+    finally:
+        conn.close()
+    store = VisitStore()
+    store.append_visits(rows, extract_domain)
+    store.link_registrable_domains()
+    return store.page(0, len(store), tz)
+
+
+def _table_estimate(conn, table, has_stats):
+    """(row count estimate, source) for a table, without scanning it"""
+    if has_stats:
+        # The first number of every stat row is the row count of the table or index
+        counts = [int(stat.split()[0]) for stat, in
+                  conn.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = ?", (table,))
+                  if stat and stat.split()[0].isdigit()]
+        if counts:
+            return max(counts), 'sqlite_stat1'
+    # Rowids are assigned increasingly, so the largest is an upper bound; deleted rows make it an overestimate
+    row = conn.execute(f'SELECT MAX(rowid) FROM "{table}"').fetchone()
+    return int(row[0] or 0), 'max_rowid'
+
+
+def estimate_totals(file_path, browser_type):
+    """Approximate row counts of the visit, URL and download tables"""
+    conn = connect_readonly(file_path)
+    try:
+        tables = {name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        has_stats = 'sqlite_stat1' in tables
+        estimates = {}
+        for name, table in _TABLES.get(browser_type, _TABLES['chrome']).items():
+            if table in tables:
+                count, source = _table_estimate(conn, table, has_stats)
+                estimates[name] = {'estimate': count, 'source': source}
+        return estimates
+    finally:
+        conn.close()
+
+
+class RunningAggregates:
+    """Visit counts per domain and per UTC day, accumulated batch by batch"""
+
+    def __init__(self, estimated_visits=0):
+        self.estimated_visits = estimated_visits
+        self.visits = 0
+        self.domains = Counter()
+        self.days = Counter()
+
+    def add(self, micros, domains):
+        """Count a batch given its visit times (epoch microseconds) and domains"""
+        micros = np.asarray(micros, dtype=np.int64)
+        self.visits += len(micros)
+        self.domains.update(domains)
+        days, counts = np.unique(micros[micros > 0] // _DAY_MICROS, return_counts=True)
+        self.days.update(dict(zip(days.tolist(), counts.tolist())))
+
+    def snapshot(self, final=False):
+        days = sorted(self.days)
+        snapshot = {
+            'visits_processed': self.visits,
+            'top_domains': [[domain, count] for domain, count in self.domains.most_common(Config.PROGRESS_TOP_DOMAINS)],
+            'distinct_domains': len(self.domains),
+            'timeline': {
+                'bucket': 'day',
+                'epochs': [day * 86400 for day in days],
+                'counts': [self.days[day] for day in days]
+            },
+            'final': final
+        }
+        if not final and self.estimated_visits:
+            snapshot['estimated_progress'] = round(min(1.0, self.visits / self.estimated_visits), 4)
+        return snapshot
+
+
+def _run(channel, file_path, browser_type, file_id, page, page_size, engine, tz):
+    from services.history_processor import process_history_file
+    from services.schema_detection import get_query_plan
+    try:
+        # The schema decides the browser, as in the full ingest
+        plan = get_query_plan(file_path)
+        browser_type = plan['browser_type'] or browser_type
+
+        channel.publish('preview', {
+            'file_id': file_id,
+            'browser_type': browser_type,
+            'page_size': page_size,
+            'entries': read_preview(file_path, browser_type, page_size, tz)
+        })
+
+        estimates = estimate_totals(file_path, browser_type)
+        channel.publish('estimate', {'file_id': file_id, 'tables': estimates})
+
+        aggregates = RunningAggregates(estimates.get('visits', {}).get('estimate', 0))
+        published = [time.monotonic()]
+
+        def on_batch(micros, domains):
+            aggregates.add(micros, domains)
+            now = time.monotonic()
+            if now - published[0] >= Config.PROGRESS_INTERVAL_SECONDS:
+                published[0] = now
+                channel.publish('aggregates', aggregates.snapshot())
+
+        result = process_history_file(file_path, browser_type, file_id, page, page_size, engine, on_batch=on_batch)
+        if 'error' in result:
+            channel.publish('error', {'file_id': file_id, 'error': result['error']}, final=True)
+            return
+        channel.publish('aggregates', aggregates.snapshot(final=True))
+
+        data = get_processed_data(file_id)
+        channel.publish('complete', {
+            'file_id': file_id,
+            'browser_type': data['browser_type'],
+            'total_entries': data['total_entries'],
+            'page_size': page_size,
+            'total_pages': (data['total_entries'] + page_size - 1) // page_size,
+            'downloads': len(data.get('downloads', []))
+        }, final=True)
+    except Exception as e:
+        print(f"Error in progressive ingest of {file_id}: {e}")
+        import traceback
+        traceback.print_exc()
+        channel.publish('error', {'file_id': file_id, 'error': str(e)}, final=True)
+
+
+def start_progressive(file_path, browser_type, file_id, page, page_size, tz, engine=None):
+    """Queue a file's ingest on the progressive thread pool and return its progress channel"""
+    channel = ProgressChannel(file_id)
+    with _channels_lock:
+        _prune_channels()
+        _channels[file_id] = channel
+    _get_executor().submit(_run, channel, file_path, browser_type, file_id, page, page_size, engine, tz)
+    return channel
@@ -0,0 +1,193 @@
+"""
+Content-based browser detection with a per-schema query plan cache.
+
+An uploaded database is identified by reading sqlite_master once: its
+tables tell Chrome/Edge from Firefox, and a hash of the table definitions
+fingerprints the schema version. Everything derived from the schema (the
+tables present, the downloads query for the columns available) is built
+once per fingerprint and cached, so further uploads from the same browser
+version skip introspection entirely. Supporting a new schema version only
+means teaching the plan builder about it.
+"""
+import hashlib
+import sqlite3
+import threading
+from utils.file_utils import connect_readonly
+
+# Query plans keyed by schema fingerprint
+_plan_cache = {}
+_plan_lock = threading.Lock()
+
+
+def read_schema(conn):
+    """Read (name, sql) for every table in sqlite_master, plus PRAGMA user_version"""
+    rows = conn.execute(
+        "SELECT name, IFNULL(sql, '') FROM sqlite_master WHERE type='table' ORDER BY name"
+    ).fetchall()
+    user_version = conn.execute("PRAGMA user_version").fetchone()[0]
+    return rows, user_version
+
+
+def schema_fingerprint(rows, user_version):
+    """Hash table definitions (whitespace-normalized) and user_version into a fingerprint"""
+    digest = hashlib.sha1(str(user_version).encode('utf-8'))
+    for name, sql in rows:
+        digest.update(name.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(' '.join(sql.split()).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()[:16]
+
+
+def detect_browser_from_tables(tables):
+    """Return 'firefox', 'chrome', or None if the tables match neither history schema"""
+    if 'moz_places' in tables and 'moz_historyvisits' in tables:
+        return 'firefox'
+    if 'urls' in tables and 'visits' in tables:
+        return 'chrome'
+    return None
+
+
+def get_query_plan(file_path):
+    """
+    Sniff a history database and return the cached query plan for its schema.
+    Raises sqlite3.DatabaseError if the file is not a SQLite database.
+    """
+    conn = connect_readonly(file_path)
+    try:
+        rows, user_version = read_schema(conn)
+        fingerprint = schema_fingerprint(rows, user_version)
+
+        plan = _plan_cache.get(fingerprint)
+        if plan is not None:
+            return plan
+
+        with _plan_lock:
+            plan = _plan_cache.get(fingerprint)
+            if plan is None:
+                plan = _build_plan(conn, [name for name, _ in rows], fingerprint, user_version)
+                _plan_cache[fingerprint] = plan
+                print(f"Built query plan for {plan['browser_type']} schema {fingerprint} "
+                      f"(version {plan['schema_version']})")
+        return plan
+    finally:
+        conn.close()
+
+
+def detect_browser_type_from_content(file_path):
+    """Detect the browser from the database contents, or None if it cannot be determined"""
+    try:
+        return get_query_plan(file_path)['browser_type']
+    except sqlite3.DatabaseError as e:
+        print(f"Could not read schema of {file_path}: {e}")
+        return None
+
+
+def _build_plan(conn, tables, fingerprint, user_version):
+    """Introspect a schema once and precompute the queries used to process it"""
+    tables = frozenset(tables)
+    browser_type = detect_browser_from_tables(tables)
+
+    plan = {
+        'fingerprint': fingerprint,
+        'browser_type': browser_type,
+        'schema_version': user_version,
+        'tables': tables,
+        'chrome_downloads_query': None,
+        'chrome_download_links_query': None
+    }
+
+    if browser_type == 'chrome':
+        if 'meta' in tables:
+            row = conn.execute("SELECT value FROM meta WHERE key='version'").fetchone()
+            if row is not None:
+                plan['schema_version'] = int(row[0])
+        if 'downloads' in tables:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(downloads)")}
+            plan['chrome_downloads_query'] = chrome_downloads_query(columns, tables)
+            plan['chrome_download_links_query'] = chrome_download_links_query(columns, tables)
+
+    return plan
+
+
+def chrome_downloads_query(columns, tables=()):
+    """Build the Chrome downloads query for the available downloads columns, or None"""
+    filename_col = 'target_path' if 'target_path' in columns else ('current_path' if 'current_path' in columns else 'id')
+    url_col = next((c for c in ('url', 'tab_url', 'original_url') if c in columns), None)
+    has_chains = 'downloads_url_chains' in tables
+    if not url_col and not has_chains:
+        print("Cannot find a suitable URL column in downloads table")
+        return None
+
+    # The last entry of the URL chain is the URL the file was actually fetched from
+    url_expr = f"d.{url_col}" if url_col else "''"
+    if has_chains:
+        url_expr = f"""IFNULL((
+            SELECT c.url FROM downloads_url_chains c
+            WHERE c.id = d.id ORDER BY c.chain_index DESC LIMIT 1
+        ), {url_expr})"""
+
+    # SHA-256 of the downloaded file, when Chrome computed one
+    hash_expr = "lower(hex(d.hash))" if 'hash' in columns else "''"
+
+    return f"""
+    SELECT
+        d.id as id,
+        d.{filename_col} as filename,
+        {url_expr} as url,
+        IFNULL(d.referrer, '') as referrer,
+        d.start_time - 11644473600000000 as download_time_us,
+        IFNULL(d.mime_type, '') as mime_type,
+        IFNULL(d.received_bytes, 0) as file_size,
+        IFNULL(d.state, 0) as status,
+        {hash_expr} as hash
+    FROM downloads d
+    ORDER BY d.start_time DESC
+    """
+
+
+# Columns of the downloads table naming a page that led to the download, best evidence first
+CHROME_DOWNLOAD_LINK_COLUMNS = (
+    ('referrer', 'referrer'),
+    ('tab_url', 'tab_url'),
+    ('tab_referrer_url', 'tab_referrer')
+)
+
+
+def chrome_download_links_query(columns, tables):
+    """
+    Build a query resolving each download's recorded source pages (referrer,
+    tab URLs and redirect chain) against urls/visits, or None if the schema
+    records none of them. Rows are (download_id, match_type, url, title,
+    time_us of the latest visit to url at or before the download).
+    """
+    links = [
+        f"SELECT id, {priority}, '{match_type}', {column}, start_time FROM downloads WHERE {column} != ''"
+        for priority, (column, match_type) in enumerate(CHROME_DOWNLOAD_LINK_COLUMNS)
+        if column in columns
+    ]
+    if 'downloads_url_chains' in tables:
+        # Every chain entry except the last (the file itself) is a page redirected through
+        links.append(f"""SELECT c.id, {len(CHROME_DOWNLOAD_LINK_COLUMNS)}, 'url_chain', c.url, d.start_time
+        FROM downloads_url_chains c JOIN downloads d ON d.id = c.id
+        WHERE c.chain_index < (SELECT MAX(m.chain_index) FROM downloads_url_chains m WHERE m.id = c.id)""")
+    if not links:
+        return None
+
+    # urls.url and visits.url are indexed, so each link is two index lookups
+    union = "\n        UNION ALL\n        ".join(links)
+    return f"""
+    WITH links(download_id, priority, match_type, url, start_time) AS (
+        {union}
+    )
+    SELECT
+        l.download_id,
+        l.match_type,
+        l.url,
+        IFNULL(u.title, ''),
+        (SELECT MAX(v.visit_time) FROM visits v
+         WHERE v.url = u.id AND v.visit_time <= l.start_time) - 11644473600000000
+    FROM links l
+    LEFT JOIN urls u ON u.url = l.url
+    ORDER BY l.download_id, l.priority
+    """
@@ -0,0 +1,61 @@
+"""
+Serialization of stored records for API responses and exports.
+
+Storage keeps every timestamp as Unix epoch microseconds (fields ending in
+_us). These helpers add the matching display strings in the requested
+timezone without modifying the stored records.
+"""
+from utils.time_utils import format_epoch_micros, resolve_timezone
+
+
+def serialize_downloads(downloads, tz=None):
+    """Add 'download_time' (and 'end_time' where recorded) strings to stored downloads"""
+    tz = tz or resolve_timezone()
+    serialized = []
+    for download in downloads:
+        download = dict(download, download_time=format_epoch_micros(download.get('download_time_us'), tz))
+        if 'end_time_us' in download:
+            download['end_time'] = format_epoch_micros(download['end_time_us'], tz)
+        serialized.append(download)
+    return serialized
+
+
+def serialize_download_sources(download_sources, tz=None):
+    """Add 'download_time' and source 'time' strings to stored download source groups"""
+    tz = tz or resolve_timezone()
+    return [
+        dict(
+            group,
+            download_time=format_epoch_micros(group.get('download_time_us'), tz),
+            sources=[
+                dict(source, time=format_epoch_micros(source.get('time_us'), tz))
+                for source in group.get('sources', [])
+            ]
+        )
+        for group in download_sources
+    ]
+
+
+def serialize_sync_info(sync_info, tz=None):
+    """
+    Add display strings to stored sync info: 'visit_time' to the synced
+    visits and a string for every *_time_us field of the account info and
+    sync settings (e.g. 'last_sync_time' for 'last_sync_time_us')
+    """
+    if not sync_info:
+        return {}
+    tz = tz or resolve_timezone()
+    serialized = dict(sync_info)
+    for section in ('account_info', 'sync_settings'):
+        fields = sync_info.get(section)
+        if isinstance(fields, dict):
+            serialized[section] = dict(fields, **{
+                name[:-3]: format_epoch_micros(value, tz)
+                for name, value in fields.items() if name.endswith('_time_us')
+            })
+    if 'synced_visits' in sync_info:
+        serialized['synced_visits'] = [
+            dict(visit, visit_time=format_epoch_micros(visit.get('visit_time_us'), tz))
+            for visit in sync_info['synced_visits']
+        ]
+    return serialized
@@ -0,0 +1,165 @@
+"""
+Browsing sessions and navigation trees reconstructed from stored visits.
+
+A session is a run of visits in which no two consecutive visits are further
+apart than the idle gap. Visits are stored newest first, so every session
+is a contiguous range of store positions and segmentation is one vectorized
+pass over the time differences; sessions are numbered from 0, newest first.
+
+Navigation trees follow the parent positions VisitStore.link_parents()
+resolves from from_visit at ingest (Chrome visits.from_visit, Firefox
+moz_historyvisits.from_visit). Within a session, a visit whose parent is
+missing or lies in another session is a root.
+"""
+import threading
+import weakref
+import numpy as np
+from config import Config
+from services.visit_store import _column_array
+from utils.time_utils import format_epoch_micros, resolve_timezone, map_chrome_transition, map_firefox_visit_type
+
+# Session boundaries per store at the default idle gap (gap, bounds), dropped with the store
+_cache = weakref.WeakKeyDictionary()
+_cache_lock = threading.Lock()
+
+
+def _split_sessions(store, gap_minutes):
+    micros = store.micros_array()
+    if not len(micros):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    breaks = np.flatnonzero(micros[:-1] - micros[1:] > gap_minutes * 60 * 1000000) + 1
+    return np.concatenate(([0], breaks)), np.append(breaks, len(micros))
+
+
+def session_bounds(store, gap_minutes=None):
+    """
+    Start and end (exclusive) store positions of every session, newest session
+    first. Only the default gap is cached; other gaps are split on every call,
+    so user-supplied gaps cannot grow the cache.
+    """
+    default = Config.SESSION_GAP_MINUTES
+    gap_minutes = default if gap_minutes is None else gap_minutes
+    if gap_minutes != default:
+        return _split_sessions(store, gap_minutes)
+    with _cache_lock:
+        cached = _cache.get(store)
+    if cached is not None and cached[0] == gap_minutes:
+        return cached[1]
+    bounds = _split_sessions(store, gap_minutes)
+    with _cache_lock:
+        cached = _cache.get(store)
+        if cached is None or cached[0] != gap_minutes:
+            cached = _cache[store] = (gap_minutes, bounds)
+        return cached[1]
+
+
+def _parents(store):
+    """Parent position of every visit, or -1 for all if the store predates link_parents()"""
+    parents = _column_array(store.parent_positions)
+    return parents if len(parents) == len(store) else np.full(len(store), -1, dtype=np.int64)
+
+
+def _transition_label(store, browser_type, index):
+    transitions = store.transitions
+    if len(transitions) != len(store):
+        return 'unknown'
+    if browser_type == 'firefox':
+        return map_firefox_visit_type(transitions[index])
+    return map_chrome_transition(transitions[index])
+
+
+def _summarize(store, session_id, start, end, parents, tz):
+    """Summary of the session covering positions start..end"""
+    newest = int(store.visit_micros[start])
+    oldest = int(store.visit_micros[end - 1])
+    domain_codes = _column_array(store.url_domain_codes)[_column_array(store.url_codes)[start:end]]
+    counts = np.bincount(domain_codes)
+    top = np.argsort(-counts, kind='stable')[:3]
+    session_parents = parents[start:end]
+    roots = np.count_nonzero((session_parents < start) | (session_parents >= end))
+    return {
+        'session_id': session_id,
+        'start_time': format_epoch_micros(oldest, tz),
+        'end_time': format_epoch_micros(newest, tz),
+        'start_timestamp': oldest,
+        'end_timestamp': newest,
+        'duration_seconds': (newest - oldest) // 1000000,
+        'visit_count': end - start,
+        'distinct_domains': int(np.count_nonzero(counts)),
+        'top_domains': [
+            {'domain': store.domains.values[code], 'visits': int(counts[code])}
+            for code in top if counts[code]
+        ],
+        'entry_url': store.url_at(end - 1),
+        'root_count': int(roots)
+    }
+
+
+def get_sessions(store, page=1, page_size=50, gap_minutes=None, tz=None):
+    """Get a page of session summaries, newest first"""
+    tz = tz or resolve_timezone()
+    starts, ends = session_bounds(store, gap_minutes)
+    parents = _parents(store)
+    first = (page - 1) * page_size
+    selected = range(first, min(first + page_size, len(starts)))
+    return {
+        'gap_minutes': Config.SESSION_GAP_MINUTES if gap_minutes is None else gap_minutes,
+        'total_sessions': len(starts),
+        'page': page,
+        'page_size': page_size,
+        'total_pages': (len(starts) + page_size - 1) // page_size,
+        'sessions': [_summarize(store, k, int(starts[k]), int(ends[k]), parents, tz) for k in selected]
+    }
+
+
+def get_navigation_tree(store, browser_type, session_id, page=1, page_size=50, gap_minutes=None, tz=None):
+    """
+    Get the navigation trees of one session. Roots are paginated oldest
+    first; each node is an entry with its transition and nested children.
+    Raises KeyError for an unknown session_id.
+    """
+    tz = tz or resolve_timezone()
+    starts, ends = session_bounds(store, gap_minutes)
+    if not 0 <= session_id < len(starts):
+        raise KeyError(session_id)
+    start, end = int(starts[session_id]), int(ends[session_id])
+
+    parents = _parents(store)[start:end]
+    in_session = (parents >= start) & (parents < end)
+    # Oldest first: positions descend as time ascends
+    positions = np.arange(end - 1, start - 1, -1)
+    linked = in_session[positions - start]
+    roots = positions[~linked]
+
+    children = {}
+    for child in positions[linked].tolist():
+        children.setdefault(int(parents[child - start]), []).append(child)
+
+    def node(index):
+        entry = store.record(index, tz)
+        entry['transition'] = _transition_label(store, browser_type, index)
+        entry['children'] = []
+        return entry
+
+    trees = []
+    for root in roots[(page - 1) * page_size:page * page_size].tolist():
+        tree = node(root)
+        # Iterative depth-first build: chains can be far deeper than the recursion limit
+        stack = [(root, tree)]
+        while stack:
+            index, entry = stack.pop()
+            for child in children.get(index, ()):
+                child_entry = node(child)
+                entry['children'].append(child_entry)
+                stack.append((child, child_entry))
+        trees.append(tree)
+
+    return {
+        'session_id': session_id,
+        'total_visits': end - start,
+        'total_roots': len(roots),
+        'page': page,
+        'page_size': page_size,
+        'total_pages': (len(roots) + page_size - 1) // page_size,
+        'trees': trees
+    }
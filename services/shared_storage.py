@@ -0,0 +1,114 @@
+"""
+SQLite-backed storage shared by every worker process.
+
+Each processed file is written once as a pickled record keyed by file_id,
+together with a version counter. Sync info, which is refreshed after the
+ingest, lives in its own column, so updating it neither re-pickles nor
+rewrites the visits. Workers keep their own in-memory copy and reload it
+only when the version in the shared database changes, and reload the
+record itself only when its payload_version did.
+"""
+import os
+import pickle
+import sqlite3
+from contextlib import closing
+
+# Record fields stored in their own columns rather than in the pickled payload
+_SMALL_FIELDS = ('sync_info', 'version', 'payload_version')
+
+
+class SQLiteSharedStore:
+    """Process-safe key/value store for processed file records"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS processed_files (
+                file_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                payload_version INTEGER NOT NULL,
+                payload BLOB NOT NULL,
+                sync_info BLOB
+            )
+            """)
+
+    def _connect(self):
+        # Short-lived connections keep this safe across threads and processes; callers close them
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def put(self, file_id, record):
+        """Write a record and return its new version"""
+        payload = pickle.dumps({key: value for key, value in record.items() if key not in _SMALL_FIELDS},
+                               protocol=pickle.HIGHEST_PROTOCOL)
+        sync_info = pickle.dumps(record.get('sync_info') or {}, protocol=pickle.HIGHEST_PROTOCOL)
+        with closing(self._connect()) as conn, conn:
+            # Take the write lock first, so concurrent writers from several processes never reuse a version
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                """
+                INSERT INTO processed_files (file_id, version, payload_version, payload, sync_info)
+                VALUES (?, 1, 1, ?, ?)
+                ON CONFLICT(file_id) DO UPDATE SET version = version + 1, payload_version = version + 1,
+                    payload = excluded.payload, sync_info = excluded.sync_info
+                """,
+                (file_id, sqlite3.Binary(payload), sqlite3.Binary(sync_info))
+            )
+            # No RETURNING (SQLite 3.35+); the version is read back in the same transaction
+            row = conn.execute(
+                "SELECT version FROM processed_files WHERE file_id = ?", (file_id,)
+            ).fetchone()
+        return row[0]
+
+    def put_sync_info(self, file_id, sync_info):
+        """Replace a record's sync info alone; returns the new version, or None if the file_id is unknown"""
+        with closing(self._connect()) as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "UPDATE processed_files SET version = version + 1, sync_info = ? WHERE file_id = ?",
+                (sqlite3.Binary(pickle.dumps(sync_info or {}, protocol=pickle.HIGHEST_PROTOCOL)), file_id)
+            )
+            row = conn.execute(
+                "SELECT version FROM processed_files WHERE file_id = ?", (file_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def get(self, file_id, payload_version=None):
+        """
+        Return (version, record) or None if the file_id is unknown. When the
+        stored payload is still at payload_version, the record holds only the
+        small fields (sync_info, version, payload_version) for the caller to
+        merge into its copy.
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                """
+                SELECT version, payload_version, sync_info,
+                       CASE WHEN payload_version = ? THEN NULL ELSE payload END
+                FROM processed_files WHERE file_id = ?
+                """,
+                (payload_version, file_id)
+            ).fetchone()
+        if row is None:
+            return None
+        version, stored_payload_version, sync_info, payload = row
+        record = pickle.loads(payload) if payload is not None else {}
+        record['sync_info'] = pickle.loads(sync_info) if sync_info else {}
+        record['version'] = version
+        record['payload_version'] = stored_payload_version
+        return version, record
+
+    def version(self, file_id):
+        """Return the current version of a record, or None"""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT version FROM processed_files WHERE file_id = ?", (file_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def list_ids(self):
+        """List all stored file IDs"""
+        with closing(self._connect()) as conn:
+            return [row[0] for row in conn.execute("SELECT file_id FROM processed_files")]
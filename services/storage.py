@@ -1,59 +1,259 @@
-# In-memory storage for processed files
+import os
+import pickle
+import threading
+import time
+from itertools import count
+from config import Config
+from services.visit_store import VisitStore
+from utils.workspace import columns_dir, touch_workspace
+from services.serializers import serialize_downloads, serialize_download_sources, serialize_sync_info
+from utils.time_utils import resolve_timezone
+from utils.profiling import phase
+
+# In-memory storage for processed files (per-process cache when a shared backend is used)
 processed_files = {}
 
+# Per-file locks, so threads never load or save the same record concurrently
+_file_locks = {}
+_file_locks_lock = threading.Lock()
+
+# Version counter for the memory backend; the shared backend keeps its own.
+# Seeded from the clock so versions (and the ETags built from them) never repeat across restarts
+_local_versions = count(time.time_ns() // 1000)
+_shared_store = None
+
+def _get_shared_store():
+    """Return the cross-process store, or None for the memory backend"""
+    global _shared_store
+    if Config.STORAGE_BACKEND != 'sqlite':
+        return None
+    with _file_locks_lock:
+        if _shared_store is None:
+            from services.shared_storage import SQLiteSharedStore
+            _shared_store = SQLiteSharedStore(Config.STORAGE_DB_PATH)
+    return _shared_store
+
+def _file_lock(file_id):
+    """The lock serializing loads and saves of one file's record"""
+    with _file_locks_lock:
+        lock = _file_locks.get(file_id)
+        if lock is None:
+            # Reentrant: update_sync_info loads while holding it
+            lock = _file_locks[file_id] = threading.RLock()
+        return lock
+
+def _cache_paths(file_id):
+    """Column cache directory and metadata path in a file's workspace, or (None, None) for invalid ids"""
+    try:
+        directory = columns_dir(file_id)
+    except ValueError:
+        return None, None
+    return directory, os.path.join(os.path.dirname(directory), 'record.pkl')
+
+def _write_cache(file_id, record, columns=True):
+    """Persist a record to its workspace: memory-mappable columns (unless columns is False) plus pickled metadata"""
+    directory, meta_path = _cache_paths(file_id)
+    if directory is None or not os.path.isdir(os.path.dirname(directory)):
+        return
+    try:
+        if columns:
+            record['entries'].save(directory)
+        meta = {key: value for key, value in record.items() if key != 'entries'}
+        with open(f"{meta_path}.tmp", 'wb') as f:
+            pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f"{meta_path}.tmp", meta_path)
+    except Exception as e:
+        print(f"Error writing column cache for {file_id}: {e}")
+
+def _read_cache(file_id):
+    """Load a record from its workspace cache with memory-mapped columns, or None"""
+    directory, meta_path = _cache_paths(file_id)
+    if directory is None or not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, 'rb') as f:
+            record = pickle.load(f)
+        record['entries'] = VisitStore.load(directory)
+        # Caches written before registrable domains or partitions existed get them on load
+        record['entries'].ensure_registrable_domains()
+        record['entries'].ensure_partitions(Config.PARTITION_GRANULARITY)
+    except Exception as e:
+        print(f"Error reading column cache for {file_id}: {e}")
+        return None
+    print(f"Loaded {file_id} from column cache ({len(record['entries'])} entries, memory-mapped)")
+    return record
+
+def _is_current(record, version):
+    """Whether a locally held record is at least the given shared version"""
+    return record is not None and (version is None or record.get('version', 0) >= version)
+
+def _load(file_id):
+    """Get the current record for a file, refreshing from the shared backend or workspace cache if needed"""
+    shared = _get_shared_store()
+    local = processed_files.get(file_id)
+    if shared is None and (local is not None or not Config.COLUMN_CACHE):
+        if local is not None:
+            touch_workspace(file_id)
+        return local
+    version = shared.version(file_id) if shared is not None else None
+    if shared is not None and (version is None or _is_current(local, version)):
+        if local is not None:
+            touch_workspace(file_id)
+        return local
+    
+    # Only one thread pages a record in; the others wait for it and reuse its copy
+    with _file_lock(file_id):
+        local = processed_files.get(file_id)
+        if shared is None:
+            if local is None:
+                # Processed earlier (e.g. before a restart); page the cached columns back in
+                local = _read_cache(file_id)
+                if local is not None:
+                    processed_files[file_id] = local
+        elif not _is_current(local, version):
+            # Another worker stored or updated this file; pull the latest copy
+            loaded = shared.get(file_id, local.get('payload_version') if local is not None else None)
+            if loaded is not None:
+                version, fields = loaded
+                if local is not None and fields['payload_version'] == local.get('payload_version'):
+                    # Only the small fields (e.g. sync info) changed; keep the loaded visits
+                    local = dict(local, **fields)
+                else:
+                    local = fields
+                processed_files[file_id] = local
+    if local is not None:
+        touch_workspace(file_id)
+    return local
+
+def _save(file_id, record):
+    """Write a record to the local cache and the shared backend"""
+    shared = _get_shared_store()
+    with _file_lock(file_id):
+        if shared is not None:
+            record['version'] = record['payload_version'] = shared.put(file_id, record)
+        else:
+            record['version'] = next(_local_versions)
+            # The shared backend persists records itself; the memory backend keeps a workspace cache
+            if Config.COLUMN_CACHE:
+                _write_cache(file_id, record)
+        processed_files[file_id] = record
+
 def store_processed_data(file_id, browser_type, entries, total_entries, downloads=None, download_sources=None, sync_info=None):
     """Store processed data in memory"""
-    processed_files[file_id] = {
-        'browser_type': browser_type,
-        'total_entries': total_entries,
-        'entries': entries,
-        'downloads': downloads or [],
-        'download_sources': download_sources or [],
-        'sync_info': sync_info or {}
-    }
+    # Entries are kept column-oriented; list-of-dict input is converted once here
+    if not isinstance(entries, VisitStore):
+        with phase('build_store'):
+            entries = VisitStore.from_records(entries)
+    # Resolve the navigation graph once here rather than on every session query
+    with phase('link_parents'):
+        entries.link_parents()
+    # Registrable domains (eTLD+1) of the distinct domains, for roll-ups by organization
+    with phase('registrable_domains'):
+        entries.link_registrable_domains()
+    # Time partitions with min/max visit times, so range queries skip non-overlapping visits
+    with phase('partitions'):
+        entries.build_partitions(Config.PARTITION_GRANULARITY)
+    
+    with phase('persist'):
+        _save(file_id, {
+            'browser_type': browser_type,
+            'total_entries': total_entries,
+            'entries': entries,
+            'downloads': downloads or [],
+            'download_sources': download_sources or [],
+            'sync_info': sync_info or {}
+        })
     
     # Print processed files after update for debugging
     print(f"After storing, processed_files has keys: {list(processed_files.keys())}")
 
 def get_processed_data(file_id):
-    """Get processed data from memory"""
-    return processed_files.get(file_id)
+    """Get processed data from storage"""
+    return _load(file_id)
+
+def get_data_version(file_id):
+    """Get the version of a file's stored data, which changes on every store/update"""
+    data = _load(file_id)
+    return data.get('version') if data is not None else None
 
 def update_sync_info(file_id, sync_info):
-    """Update sync info for a file"""
-    if file_id in processed_files:
-        processed_files[file_id]['sync_info'] = sync_info
+    """Update sync info for a file, without rewriting its visits"""
+    shared = _get_shared_store()
+    with _file_lock(file_id):
+        data = _load(file_id)
+        if data is None:
+            return
+        if shared is not None:
+            version = shared.put_sync_info(file_id, sync_info)
+            if version is None:
+                return
+        else:
+            version = next(_local_versions)
+        data = dict(data, sync_info=sync_info, version=version)
+        if shared is None and Config.COLUMN_CACHE:
+            _write_cache(file_id, data, columns=False)
+        processed_files[file_id] = data
 
 def file_exists(file_id):
-    """Check if a file exists in memory"""
-    return file_id in processed_files
+    """Check if a file exists in storage"""
+    if file_id in processed_files:
+        return True
+    shared = _get_shared_store()
+    if shared is not None:
+        return shared.version(file_id) is not None
+    return Config.COLUMN_CACHE and _load(file_id) is not None
+
+def loaded_file_ids():
+    """File IDs currently held by this process, which garbage collection must keep"""
+    return list(processed_files.keys())
 
-def get_paginated_entries(file_id, page, page_size):
-    """Get paginated entries for a file"""
-    if file_id not in processed_files:
+def get_paginated_entries(file_id, page, page_size, tz=None, filters=None):
+    """
+    Get paginated entries for a file, with timestamps formatted in tz.
+    filters (see services.visit_query.parse_filters) pages through the matching visits only.
+    """
+    with phase('load'):
+        data = _load(file_id)
+    if data is None:
         return None
+    tz = tz or resolve_timezone()
     
     # Calculate start and end indices
     start_idx = (page - 1) * page_size
     end_idx = start_idx + page_size
     
     # Get entries for the requested page
-    data = processed_files[file_id]
-    entries = data['entries'][start_idx:end_idx]
+    total_entries = data['total_entries']
+    positions = None
+    if filters:
+        from services.visit_query import select_visits
+        with phase('select'):
+            positions = select_visits(data['entries'], filters)
+        total_entries = len(positions)
     
-    return {
-        'file_id': file_id,
-        'browser_type': data['browser_type'],
-        'total_entries': data['total_entries'],
-        'page': page,
-        'page_size': page_size,
-        'total_pages': (data['total_entries'] + page_size - 1) // page_size,
-        'entries': entries,
-        'downloads': data.get('downloads', []),
-        'download_sources': data.get('download_sources', []),
-        'sync_info': data.get('sync_info', {})
-    }
+    with phase('serialize'):
+        if positions is not None:
+            entries = data['entries'].take(positions[start_idx:end_idx], tz)
+        else:
+            entries = data['entries'].page(start_idx, end_idx, tz)
+        
+        return {
+            'file_id': file_id,
+            'browser_type': data['browser_type'],
+            'total_entries': total_entries,
+            'page': page,
+            'page_size': page_size,
+            'total_pages': (total_entries + page_size - 1) // page_size,
+            'entries': entries,
+            'downloads': serialize_downloads(data.get('downloads', []), tz),
+            'download_sources': serialize_download_sources(data.get('download_sources', []), tz),
+            'sync_info': serialize_sync_info(data.get('sync_info', {}), tz)
+        }
 
 def list_file_ids():
     """List all file IDs in storage"""
-    return list(processed_files.keys())
\ No newline at end of file
+    file_ids = list(processed_files.keys())
+    shared = _get_shared_store()
+    if shared is not None:
+        file_ids += [file_id for file_id in shared.list_ids() if file_id not in processed_files]
+    return file_ids
\ No newline at end of file
@@ -0,0 +1,288 @@
+"""
+Streaming history processor that reads SQLite cursors directly, without pandas.
+
+Rows are pulled with fetchmany() in batches of Config.STREAMING_BATCH_SIZE,
+timestamps are converted to Unix epoch microseconds in SQL and each batch is
+appended straight into the column-oriented VisitStore used by the storage layer.
+
+With parallel=True (the 'parallel' engine) the visits are read by rowid
+ranges in a process pool instead (see services.parallel_ingest); downloads,
+sync info and storage are the same.
+"""
+import os
+import sqlite3
+import numpy as np
+from config import Config
+from services.storage import store_processed_data, get_paginated_entries
+from services.visit_store import VisitStore
+from services.sync_info import extract_chrome_sync_info, extract_firefox_sync_info
+from services.schema_detection import get_query_plan
+from services.download_correlation import correlate_chrome_downloads
+from services.firefox_downloads import read_firefox_downloads
+from services.parallel_ingest import read_visits_parallel
+from utils.url_utils import extract_domain
+from utils.profiling import phase
+from utils.file_utils import extract_filename
+from utils.time_utils import convert_download_state, map_chrome_visit_source
+
+CHROME_VISITS_QUERY = """
+SELECT
+    u.id,
+    u.url,
+    u.title,
+    u.visit_count,
+    v.visit_time - 11644473600000000 as visit_time_us,
+    v.id as visit_id,
+    IFNULL(v.from_visit, 0) as from_visit,
+    IFNULL(v.transition, 0) as transition
+FROM urls u
+JOIN visits v ON u.id = v.url
+ORDER BY v.visit_time DESC
+"""
+
+FIREFOX_VISITS_QUERY = """
+SELECT
+    p.id,
+    p.url,
+    p.title,
+    p.visit_count,
+    h.visit_date as visit_time_us,
+    h.id as visit_id,
+    IFNULL(h.from_visit, 0) as from_visit,
+    IFNULL(h.visit_type, 0) as transition
+FROM moz_places p
+JOIN moz_historyvisits h ON p.id = h.place_id
+ORDER BY h.visit_date DESC
+"""
+
+def process_chrome_history_streaming(file_path, file_id, page=1, page_size=1000, plan=None, on_batch=None,
+                                     parallel=False):
+    """Process Chrome/Edge history database with the streaming engine"""
+    try:
+        plan = plan or get_query_plan(file_path)
+        conn = sqlite3.connect(file_path)
+        cursor = conn.cursor()
+
+        with phase('visits'):
+            if parallel:
+                store = read_visits_parallel(file_path, 'chrome', on_batch)
+            else:
+                store = read_visits(cursor, CHROME_VISITS_QUERY, on_batch)
+        tables = plan['tables']
+
+        sync_visits = []
+        if 'visit_source' in tables:
+            try:
+                cursor.execute("""
+                SELECT
+                    u.url,
+                    u.title,
+                    v.visit_time - 11644473600000000 as visit_time_us,
+                    vs.source
+                FROM urls u
+                JOIN visits v ON u.id = v.url
+                JOIN visit_source vs ON v.id = vs.id
+                ORDER BY v.visit_time DESC
+                LIMIT 1000
+                """)
+                sync_visits = [
+                    {
+                        'url': url,
+                        'title': title,
+                        'visit_time_us': visit_time_us,
+                        'source': source,
+                        'source_desc': map_chrome_visit_source(source)
+                    }
+                    for url, title, visit_time_us, source in cursor.fetchall()
+                ]
+            except Exception as e:
+                print(f"Error getting synced visits: {e}")
+
+        with phase('downloads'):
+            downloads = read_chrome_downloads(cursor, plan)
+            download_sources = correlate_chrome_downloads(
+                conn, plan, downloads,
+                lambda unresolved: find_download_sources_in_store(store, unresolved)
+            )
+
+        with phase('sync_info'):
+            sync_info = extract_chrome_sync_info(file_path)
+        if sync_visits:
+            if not sync_info:
+                sync_info = {}
+            sync_info['synced_visits'] = sync_visits
+
+        conn.close()
+
+        return _store_and_build_result(file_id, 'chrome', store, downloads, download_sources,
+                                       sync_info, page, page_size)
+    except Exception as e:
+        print(f"Error processing Chrome history: {e}")
+        import traceback
+        traceback.print_exc()
+        return {'error': f"Error processing Chrome history: {str(e)}"}
+
+def process_firefox_history_streaming(file_path, file_id, page=1, page_size=1000, plan=None, on_batch=None,
+                                      parallel=False):
+    """Process Firefox history database with the streaming engine"""
+    try:
+        plan = plan or get_query_plan(file_path)
+        conn = sqlite3.connect(file_path)
+        cursor = conn.cursor()
+
+        with phase('visits'):
+            if parallel:
+                store = read_visits_parallel(file_path, 'firefox', on_batch)
+            else:
+                store = read_visits(cursor, FIREFOX_VISITS_QUERY, on_batch)
+        with phase('downloads'):
+            downloads = read_firefox_downloads(conn, plan)
+            download_sources = find_download_sources_in_store(store, downloads)
+
+        try:
+            with phase('sync_info'):
+                sync_info = extract_firefox_sync_info(file_path)
+        except Exception as e:
+            print(f"Error extracting Firefox sync info: {e}")
+            sync_info = {}
+
+        conn.close()
+
+        return _store_and_build_result(file_id, 'firefox', store, downloads, download_sources,
+                                       sync_info, page, page_size)
+    except Exception as e:
+        print(f"Error processing Firefox history: {e}")
+        import traceback
+        traceback.print_exc()
+        return {'error': f"Error processing Firefox history: {str(e)}"}
+
+def read_visits(cursor, query, on_batch=None):
+    """
+    Stream (id, url, title, visit_count, visit_time_us, visit_id, from_visit, transition) rows
+    into a VisitStore, calling on_batch(micros, domains) with every batch appended
+    """
+    store = VisitStore()
+    batch_size = Config.STREAMING_BATCH_SIZE
+
+    cursor.execute(query)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        start = len(store)
+        # Domains are extracted once per distinct URL, not once per visit
+        store.append_visits(rows, extract_domain)
+        if on_batch is not None:
+            domain_codes = store.url_domain_codes
+            on_batch(np.array(store.visit_micros[start:], dtype=np.int64),
+                     [store.domains.values[domain_codes[code]] for code in store.url_codes[start:]])
+
+    return store
+
+def read_chrome_downloads(cursor, plan):
+    """Read Chrome downloads as a list of dictionaries using the plan's downloads query"""
+    if not plan['chrome_downloads_query']:
+        return []
+
+    try:
+        cursor.execute(plan['chrome_downloads_query'])
+
+        return [
+            {
+                'id': download_id,
+                'filename': extract_filename(filename),
+                'url': url,
+                'referrer': referrer,
+                'download_time_us': download_time_us,
+                'mime_type': mime_type,
+                'file_size': file_size,
+                'status': convert_download_state(status),
+                'hash': file_hash
+            }
+            for download_id, filename, url, referrer, download_time_us, mime_type, file_size, status, file_hash
+            in cursor.fetchall()
+        ]
+    except Exception as e:
+        print(f"Error processing Chrome downloads: {e}")
+        return []
+
+def find_download_sources_in_store(store, downloads):
+    """
+    Find possible sources for downloads using binary search over the
+    store's time-ordered visits instead of filtering a DataFrame per download
+    """
+    download_sources = []
+    if not downloads:
+        return download_sources
+
+    # Visits are newest first; negate once so searchsorted sees ascending values
+    negated_micros = -store.micros_array()
+    one_hour = 3600 * 1000000
+
+    for download in downloads:
+        filename = download.get('filename', '')
+        download_url = download.get('url', '')
+        download_time_us = download.get('download_time_us') or 0
+
+        if not download_time_us or not download_url:
+            continue
+
+        # Candidate store indices in [download - 1h, download], most recent first
+        lo = int(np.searchsorted(negated_micros, -download_time_us, side='left'))
+        hi = int(np.searchsorted(negated_micros, -(download_time_us - one_hour), side='right'))
+        candidates = range(lo, hi)
+
+        # Compare interned domain codes rather than domain strings
+        download_domain = extract_domain(download_url)
+        domain_code = store.domains.lookup(download_domain) if download_domain else -1
+        file_ext = os.path.splitext(filename)[1].lower()
+        sources = []
+        seen_urls = set()
+
+        def add_source(index, match_type):
+            url = store.url_at(index)
+            if url in seen_urls:
+                return
+            seen_urls.add(url)
+            sources.append({
+                'url': url,
+                'title': store.title_at(index),
+                'time_us': store.visit_micros[index],
+                'match_type': match_type
+            })
+
+        if domain_code >= 0:
+            for index in [i for i in candidates if store.domain_code_at(i) == domain_code][:3]:
+                add_source(index, 'same_domain')
+
+        if file_ext:
+            for index in [i for i in candidates if file_ext in store.url_at(i).lower()][:2]:
+                add_source(index, 'file_pattern')
+
+        if len(sources) < 5:
+            for index in candidates[:5 - len(sources)]:
+                add_source(index, 'temporal')
+
+        download_sources.append({
+            'filename': filename,
+            'download_url': download_url,
+            'download_time_us': download_time_us,
+            'sources': sources
+        })
+
+    return download_sources
+
+def _store_and_build_result(file_id, browser_type, store, downloads, download_sources, sync_info, page, page_size):
+    """Store the processed data and build the first-page response"""
+    with phase('store'):
+        store_processed_data(
+            file_id,
+            browser_type,
+            store,
+            len(store),
+            downloads,
+            download_sources,
+            sync_info
+        )
+    with phase('first_page'):
+        return get_paginated_entries(file_id, page, page_size)
@@ -0,0 +1,231 @@
+"""
+Browser sync information extractors shared by the processing engines.
+"""
+import os
+import re
+import json
+from utils.time_utils import chrome_time_to_unix_micros
+
+def extract_chrome_sync_info(history_file_path):
+    """
+    Extract Chrome sync information from the history file and/or Preferences file
+    """
+    try:
+        # For actual sync information, we need the Preferences file
+        # Check if we can locate it in the same directory
+        profile_dir = os.path.dirname(history_file_path)
+        preferences_path = os.path.join(profile_dir, 'Preferences')
+        
+        sync_info = {}
+        
+        # If we found a Preferences file, parse it for sync information
+        if os.path.exists(preferences_path):
+            print(f"Found Chrome Preferences file at: {preferences_path}")
+            
+            try:
+                with open(preferences_path, 'r', encoding='utf-8') as f:
+                    prefs_data = json.load(f)
+                
+                # Extract account info
+                account_info = {}
+                if 'account_info' in prefs_data:
+                    account_data = prefs_data['account_info']
+                    
+                    # Check if account_data is a list instead of a dictionary
+                    if isinstance(account_data, list):
+                        # Handle case where account_info is a list
+                        if account_data and len(account_data) > 0:
+                            # Use the first account in the list
+                            first_account = account_data[0]
+                            if isinstance(first_account, dict):
+                                account_info = {
+                                    'email': first_account.get('email', ''),
+                                    'name': first_account.get('full_name', ''),
+                                    'account_type': first_account.get('account_type', ''),
+                                }
+                            else:
+                                account_info = {
+                                    'email': '',
+                                    'name': '',
+                                    'account_type': '',
+                                    'note': 'Unable to parse account data'
+                                }
+                    elif isinstance(account_data, dict):
+                        # Original case - account_info is a dictionary
+                        account_info = {
+                            'email': account_data.get('email', ''),
+                            'name': account_data.get('full_name', ''),
+                            'account_type': account_data.get('account_type', ''),
+                        }
+                    else:
+                        # Unknown type
+                        account_info = {
+                            'email': '',
+                            'name': '',
+                            'account_type': '',
+                            'note': f'Unexpected account_info type: {type(account_data)}'
+                        }
+                
+                # Extract sync settings
+                # Times are stored as Unix epoch microseconds and formatted by serialize_sync_info()
+                sync_settings = {
+                    'enabled': False,
+                    'first_sync_time_us': 0,
+                    'last_sync_time_us': 0,
+                    'data_types': []
+                }
+                
+                if 'sync' in prefs_data:
+                    sync_data = prefs_data['sync']
+                    
+                    # Check if sync is enabled
+                    if 'encryption' in sync_data and 'enabled' in sync_data['encryption']:
+                        sync_settings['enabled'] = True
+                    
+                    # Get sync timestamps
+                    if 'first_setup_complete' in sync_data:
+                        sync_settings['first_sync_time_us'] = chrome_time_to_unix_micros(sync_data.get('first_setup_time', 0))
+                    
+                    if 'last_synced_time' in sync_data:
+                        sync_settings['last_sync_time_us'] = chrome_time_to_unix_micros(sync_data.get('last_synced_time', 0))
+                        account_info['last_sync_time_us'] = sync_settings['last_sync_time_us']
+                    
+                    # Extract sync data types
+                    data_types = []
+                    
+                    # Check which data types are being synced
+                    if 'preferred_data_types' in sync_data:
+                        types_data = sync_data['preferred_data_types']
+                        for data_type, value in types_data.items():
+                            data_types.append({
+                                'name': data_type,
+                                'enabled': value
+                            })
+                    
+                    sync_settings['data_types'] = data_types
+                
+                sync_info = {
+                    'account_info': account_info,
+                    'sync_settings': sync_settings
+                }
+                
+                print(f"Extracted Chrome sync info: {sync_info}")
+                return sync_info
+                
+            except Exception as e:
+                print(f"Error parsing Chrome Preferences file: {e}")
+                import traceback
+                traceback.print_exc()
+                return {'account_info': {}, 'sync_settings': {}}
+        else:
+            print(f"Chrome Preferences file not found at: {preferences_path}")
+            # We can still return what we have from the history database
+            return {}
+        
+    except Exception as e:
+        print(f"Error extracting Chrome sync info: {e}")
+        import traceback
+        traceback.print_exc()
+        return {}
+
+def extract_firefox_sync_info(places_file_path):
+    """
+    Extract Firefox sync information from the places.sqlite file and/or prefs.js file
+    """
+    try:
+        # For Firefox, we need to check for prefs.js file in the same directory
+        profile_dir = os.path.dirname(places_file_path)
+        prefs_path = os.path.join(profile_dir, 'prefs.js')
+        
+        sync_info = {}
+        
+        # If we found a prefs.js file, parse it for sync information
+        if os.path.exists(prefs_path):
+            print(f"Found Firefox prefs.js file at: {prefs_path}")
+            
+            # prefs.js is not JSON, so we need to parse it line by line
+            try:
+                account_info = {}
+                sync_settings = {
+                    'enabled': False,
+                    'last_sync_time': '',
+                    'first_sync_time': '',
+                    'data_types': []
+                }
+                
+                with open(prefs_path, 'r', encoding='utf-8', errors='ignore') as f:
+                    lines = f.readlines()
+                
+                # Look for sync-related preferences
+                for line in lines:
+                    line = line.strip()
+                    
+                    # Check for sync account information
+                    if 'services.sync.username' in line:
+                        # Extract the email/username
+                        match = re.search(r'user_pref\("services\.sync\.username", "([^"]+)"\);', line)
+                        if match:
+                            account_info['email'] = match.group(1)
+                    
+                    # Check if sync is enabled
+                    if 'services.sync.enabled' in line:
+                        match = re.search(r'user_pref\("services\.sync\.enabled", (true|false)\);', line)
+                        if match:
+                            sync_settings['enabled'] = (match.group(1) == 'true')
+                    
+                    # Last sync time
+                    if 'services.sync.lastSync' in line:
+                        match = re.search(r'user_pref\("services\.sync\.lastSync", "([^"]+)"\);', line)
+                        if match:
+                            sync_settings['last_sync_time'] = match.group(1)
+                    
+                    # Firefox sync engine states for different data types
+                    if 'services.sync.engine' in line:
+                        # Check if the data type is enabled
+                        match = re.search(r'user_pref\("services\.sync\.engine\.([^"]+)", (true|false)\);', line)
+                        if match:
+                            data_type = match.group(1)
+                            enabled = (match.group(2) == 'true')
+                            
+                            # Add to data types list if not already present
+                            data_type_exists = False
+                            for dt in sync_settings['data_types']:
+                                if dt['name'] == data_type:
+                                    dt['enabled'] = enabled
+                                    data_type_exists = True
+                                    break
+                            
+                            if not data_type_exists:
+                                sync_settings['data_types'].append({
+                                    'name': data_type,
+                                    'enabled': enabled
+                                })
+                
+                # If an account email was found, assume the account is valid
+                if account_info.get('email'):
+                    account_info['name'] = account_info.get('email').split('@')[0]  # Use part before @ as name
+                    account_info['account_type'] = 'Firefox Account'
+                    account_info['last_sync_time'] = sync_settings.get('last_sync_time', '')
+                
+                sync_info = {
+                    'account_info': account_info,
+                    'sync_settings': sync_settings
+                }
+                
+                print(f"Extracted Firefox sync info: {sync_info}")
+                return sync_info
+                
+            except Exception as e:
+                print(f"Error parsing Firefox prefs.js file: {e}")
+                import traceback
+                traceback.print_exc()
+                return {'account_info': {}, 'sync_settings': {}}
+        else:
+            print(f"Firefox prefs.js file not found at: {prefs_path}")
+            return {}
+        
+    except Exception as e:
+        print(f"Error extracting Firefox sync info: {e}")
+        import traceback
+        traceback.print_exc()
+        return {}
\ No newline at end of file
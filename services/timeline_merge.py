@@ -0,0 +1,111 @@
+"""
+Merged, time-ordered timeline across several processed profiles.
+
+Every profile's visits are already stored newest first, so a page of the
+merged timeline is produced by seeking each stream to its start position
+with binary searches and then k-way merging only page_size items with a
+heap. Nothing is concatenated or re-sorted.
+"""
+import heapq
+from itertools import islice
+from services.storage import get_processed_data
+from utils.time_utils import resolve_timezone
+
+
+def _count_newer(times, value, inclusive):
+    """Count leading entries of a newest-first list that are newer than value"""
+    lo, hi = 0, len(times)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if times[mid] > value or (inclusive and times[mid] == value):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def _seek(streams, offset):
+    """
+    Find how many items of each stream precede position offset in the merged
+    order (time descending, then stream order, then position in the stream)
+    """
+    positions = []
+    for s, times in enumerate(streams):
+        def rank(i):
+            # Number of merged items ordered before item i of stream s
+            value = times[i]
+            total = i
+            for r, other in enumerate(streams):
+                if r != s:
+                    total += _count_newer(other, value, inclusive=r < s)
+            return total
+
+        lo, hi = 0, len(times)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if rank(mid) < offset:
+                lo = mid + 1
+            else:
+                hi = mid
+        positions.append(lo)
+    return positions
+
+
+def _stream(times, stream_index, start):
+    """Yield (visit_time_us, -stream_index, position) from start onwards"""
+    for position in range(start, len(times)):
+        yield times[position], -stream_index, position
+
+
+def merge_timelines(file_ids, page=1, page_size=1000, labels=None, tz=None):
+    """
+    Get one page of the merged timeline for file_ids, with times formatted in tz.
+    Raises KeyError for a file_id that is not in storage.
+    """
+    tz = tz or resolve_timezone()
+    profiles = []
+    for index, file_id in enumerate(file_ids):
+        data = get_processed_data(file_id)
+        if data is None:
+            raise KeyError(file_id)
+        profiles.append({
+            'file_id': file_id,
+            'browser_type': data['browser_type'],
+            'profile': labels[index] if labels and index < len(labels) else file_id,
+            'total_entries': len(data['entries']),
+            'entries': data['entries']
+        })
+
+    # Integer epoch-microsecond columns, newest first
+    streams = [profile['entries'].visit_micros for profile in profiles]
+    total_entries = sum(len(times) for times in streams)
+    offset = (page - 1) * page_size
+
+    starts = _seek(streams, offset)
+    merged = heapq.merge(
+        *[_stream(times, s, starts[s]) for s, times in enumerate(streams)],
+        key=lambda item: (item[0], item[1]),
+        reverse=True
+    )
+
+    entries = []
+    for _, neg_stream, position in islice(merged, page_size):
+        profile = profiles[-neg_stream]
+        entry = profile['entries'].record(position, tz)
+        entry['file_id'] = profile['file_id']
+        entry['browser_type'] = profile['browser_type']
+        entry['profile'] = profile['profile']
+        entries.append(entry)
+
+    return {
+        'file_ids': list(file_ids),
+        'profiles': [
+            {key: profile[key] for key in ('file_id', 'browser_type', 'profile', 'total_entries')}
+            for profile in profiles
+        ],
+        'total_entries': total_entries,
+        'page': page,
+        'page_size': page_size,
+        'total_pages': (total_entries + page_size - 1) // page_size,
+        'entries': entries
+    }
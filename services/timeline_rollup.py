@@ -0,0 +1,296 @@
+"""
+Timeline rollups: visits, unique URLs and unique domains per day, week or
+month, over one or several stored profiles.
+
+Exact mode counts distinct (bucket, value) pairs. URLs and domains are
+identified by their strings, so a URL visited in two profiles counts once.
+
+Approximate mode keeps two HyperLogLog sketches for every UTC day of a
+store, one of its URLs and one of its domains. Each sketch holds
+2**Config.HLL_PRECISION one-byte registers, is built once per store and is
+cached with it. The unique counts of any bucket come from merging day
+sketches with an element-wise maximum. A bucket can be a day, a week, a
+month or the whole window, over any set of profiles. Its cost therefore
+depends on the number of days, not visits. Windows are widened to whole
+UTC days, and the relative standard error is about 1.04 / sqrt(registers).
+"""
+import hashlib
+import threading
+import weakref
+import numpy as np
+from config import Config
+from services.visit_store import _column_array
+
+INTERVALS = ('day', 'week', 'month')
+MODES = ('auto', 'exact', 'approx')
+
+_DAY_MICROS = 86400 * 1000000
+
+# Per-store day sketches, dropped with the store
+_cache = weakref.WeakKeyDictionary()
+_cache_lock = threading.Lock()
+
+
+def _value_hashes(values):
+    """64-bit hash of every string, the same in every store and process"""
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b((value or '').encode('utf-8', 'surrogatepass'), digest_size=8).digest(),
+                        'little') for value in values),
+        dtype=np.uint64, count=len(values)
+    )
+
+
+def _bit_length(values):
+    """Number of significant bits of every uint64"""
+    lengths = np.zeros(len(values), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        wide = values >> np.uint64(shift) > 0
+        lengths[wide] += shift
+        values = np.where(wide, values >> np.uint64(shift), values)
+    return lengths + (values > 0)
+
+
+def _register_updates(hashes, precision):
+    """HyperLogLog register index and rank (position of the first set bit) of every hash"""
+    rest_bits = 64 - precision
+    index = (hashes >> np.uint64(rest_bits)).astype(np.int64)
+    rest = hashes & np.uint64((1 << rest_bits) - 1)
+    return index, (rest_bits - _bit_length(rest) + 1).astype(np.uint8)
+
+
+def _day_registers(day_index, day_count, codes, index, rank, precision):
+    """Registers per day of the values visited on it (codes index into index/rank)"""
+    registers = np.zeros(day_count << precision, dtype=np.uint8)
+    if len(codes):
+        # Each (day, value) pair updates its register once
+        width = int(codes.max()) + 1
+        days, codes = np.divmod(np.unique(day_index * width + codes), width)
+        np.maximum.at(registers, (days << precision) + index[codes], rank[codes])
+    return registers.reshape(day_count, 1 << precision)
+
+
+def _sigma(x):
+    y = np.ones_like(x)
+    z = x.copy()
+    for _ in range(64):
+        x = x * x
+        z += x * y
+        y += y
+    return z
+
+
+def _tau(x):
+    y = np.ones_like(x)
+    z = 1 - x
+    for _ in range(64):
+        x = np.sqrt(x)
+        y *= 0.5
+        z -= (1 - x) ** 2 * y
+    return z / 3
+
+
+def estimate(histograms):
+    """
+    Cardinality estimate of every sketch from its register histogram (number
+    of registers holding each rank, one row per sketch), using Ertl's
+    improved estimator. Unlike the classic estimator with linear counting,
+    it has no bias bump where one switches to the other.
+    """
+    counts = np.asarray(histograms, dtype=np.float64).reshape(-1, np.shape(histograms)[-1])
+    m = counts.sum(axis=1)
+    q = counts.shape[1] - 2
+    z = m * _tau(1 - counts[:, q + 1] / m)
+    for rank in range(q, 0, -1):
+        z = 0.5 * (z + counts[:, rank])
+    empty = counts[:, 0] / m
+    # An empty sketch estimates 0; sigma diverges there
+    filled = empty < 1
+    z += m * _sigma(np.where(filled, empty, 0))
+    return np.where(filled, np.rint(m * m / (2 * np.log(2)) / np.where(filled, z, 1)), 0).astype(np.int64)
+
+
+def _merged_histograms(registers, groups, precision):
+    """Register histogram of the union of every group of sketches (register rows)"""
+    size = 66 - precision
+    merged = [registers[group].max(axis=0, initial=0) for group in groups]
+    return np.array([np.bincount(row, minlength=size) for row in merged], dtype=np.int64).reshape(len(merged), size)
+
+
+class DaySketches:
+    """Visit counts and URL/domain HyperLogLog registers per UTC day of one store"""
+
+    def __init__(self, store, precision):
+        self.precision = precision
+        micros = store.micros_array()
+        timed = micros > 0
+        url_codes = _column_array(store.url_codes)[timed].astype(np.int64)
+        self.days, day_index = np.unique(micros[timed] // _DAY_MICROS, return_inverse=True)
+        self.visits = np.bincount(day_index, minlength=len(self.days))
+
+        url_index, url_rank = _register_updates(_value_hashes(store.url_values), precision)
+        self.url_registers = _day_registers(day_index, len(self.days), url_codes, url_index, url_rank, precision)
+        domain_index, domain_rank = _register_updates(_value_hashes(store.domains.values), precision)
+        domain_codes = _column_array(store.url_domain_codes).astype(np.int64)[url_codes]
+        self.domain_registers = _day_registers(day_index, len(self.days), domain_codes, domain_index,
+                                               domain_rank, precision)
+
+    def day_range(self, start, end):
+        """Days overlapping the inclusive epoch-second window, as a slice"""
+        lo = 0 if start is None else np.searchsorted(self.days, start // 86400)
+        hi = len(self.days) if end is None else np.searchsorted(self.days, end // 86400, side='right')
+        return slice(int(lo), int(hi))
+
+
+def _sketches(store):
+    """Get or build the day sketches of a store (built outside the lock)"""
+    precision = Config.HLL_PRECISION
+    with _cache_lock:
+        sketches = _cache.get(store)
+    if sketches is not None and sketches.precision == precision:
+        return sketches
+    built = DaySketches(store, precision)
+    with _cache_lock:
+        sketches = _cache.get(store)
+        # Keep a concurrent build at the same precision; replace one at another precision
+        if sketches is None or sketches.precision != precision:
+            sketches = _cache[store] = built
+        return sketches
+
+
+def _bucket_keys(days, interval):
+    """Bucket of every day number; weeks start on Monday"""
+    if interval == 'week':
+        # 1970-01-01 was a Thursday
+        return (days + 3) // 7
+    if interval == 'month':
+        return days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    return days
+
+
+def _bucket_labels(keys, interval):
+    if interval == 'week':
+        return np.datetime_as_string((keys * 7 - 3).astype('datetime64[D]')).tolist()
+    if interval == 'month':
+        return np.datetime_as_string(keys.astype('datetime64[M]')).tolist()
+    return np.datetime_as_string(keys.astype('datetime64[D]')).tolist()
+
+
+def _exact_rollup(stores, start, end, interval, positions=None):
+    url_ids = {}
+    domain_ids = {}
+    days, urls, domains = [], [], []
+    for index, store in enumerate(stores):
+        # Only the selected visits, or the time partitions overlapping the window, are read
+        span = positions[index] if positions is not None else slice(*store.time_span(start, end))
+        epochs = store.epoch_array(span)
+        mask = epochs > 0
+        if start is not None:
+            mask &= epochs >= start
+        if end is not None:
+            mask &= epochs <= end
+        # Store codes -> ids shared by all stores, by string
+        global_urls = np.array([url_ids.setdefault(url, len(url_ids)) for url in store.url_values], dtype=np.int64)
+        global_domains = np.array([domain_ids.setdefault(domain, len(domain_ids))
+                                   for domain in store.domains.values], dtype=np.int64)
+        url_codes = _column_array(store.url_codes)[span][mask]
+        days.append(epochs[mask] // 86400)
+        urls.append(global_urls[url_codes])
+        domains.append(global_domains[_column_array(store.url_domain_codes)[url_codes]])
+
+    days, urls, domains = (np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+                           for parts in (days, urls, domains))
+    keys, bucket = np.unique(_bucket_keys(days, interval), return_inverse=True)
+
+    def unique_per_bucket(values, total):
+        pairs = np.unique(bucket * max(total, 1) + values)
+        return np.bincount(pairs // max(total, 1), minlength=len(keys))
+
+    rows = zip(_bucket_labels(keys, interval), np.bincount(bucket, minlength=len(keys)).tolist(),
+               unique_per_bucket(urls, len(url_ids)).tolist(), unique_per_bucket(domains, len(domain_ids)).tolist())
+    return {
+        'mode': 'exact',
+        'start': start,
+        'end': end,
+        'total_visits': int(len(days)),
+        'unique_urls': int(len(np.unique(urls))),
+        'unique_domains': int(len(np.unique(domains))),
+        'timeline': [
+            {'date': date, 'visit_count': visits, 'unique_urls': unique_urls, 'unique_domains': unique_domains}
+            for date, visits, unique_urls, unique_domains in rows
+        ]
+    }
+
+
+def _approx_rollup(stores, start, end, interval):
+    days, visits, url_registers, domain_registers = [], [], [], []
+    for store in stores:
+        sketches = _sketches(store)
+        window = sketches.day_range(start, end)
+        days.append(sketches.days[window])
+        visits.append(sketches.visits[window])
+        url_registers.append(sketches.url_registers[window])
+        domain_registers.append(sketches.domain_registers[window])
+
+    precision = Config.HLL_PRECISION
+    m = 1 << precision
+    days = np.concatenate(days + [np.zeros(0, dtype=np.int64)])
+    visits = np.concatenate(visits + [np.zeros(0, dtype=np.int64)])
+    url_registers = np.concatenate(url_registers + [np.zeros((0, m), dtype=np.uint8)])
+    domain_registers = np.concatenate(domain_registers + [np.zeros((0, m), dtype=np.uint8)])
+
+    # Merge the day sketches of all stores bucket by bucket: a register-wise maximum
+    keys = _bucket_keys(days, interval)
+    order = np.argsort(keys, kind='stable')
+    bounds = np.flatnonzero(np.diff(keys[order])) + 1
+    groups = np.split(order, bounds) if len(order) else []
+    everything = [np.arange(len(days))]
+
+    rows = zip(_bucket_labels(np.array([keys[group[0]] for group in groups], dtype=np.int64), interval),
+               [int(visits[group].sum()) for group in groups],
+               estimate(_merged_histograms(url_registers, groups, precision)).tolist(),
+               estimate(_merged_histograms(domain_registers, groups, precision)).tolist())
+    return {
+        'mode': 'approx',
+        # The window actually covered, widened to whole UTC days
+        'start': None if start is None else start // 86400 * 86400,
+        'end': None if end is None else end // 86400 * 86400 + 86399,
+        'total_visits': int(visits.sum()),
+        'unique_urls': int(estimate(_merged_histograms(url_registers, everything, precision))[0]),
+        'unique_domains': int(estimate(_merged_histograms(domain_registers, everything, precision))[0]),
+        'relative_error': round(1.04 / m ** 0.5, 4),
+        'timeline': [
+            {'date': date, 'visit_count': visits, 'unique_urls': unique_urls, 'unique_domains': unique_domains}
+            for date, visits, unique_urls, unique_domains in rows
+        ]
+    }
+
+
+def timeline_rollup(stores, start=None, end=None, interval='day', mode='auto', positions=None):
+    """
+    Visits, unique URLs and unique domains per UTC day, week (starting
+    Monday) or month across stores, plus the unique counts of the whole window.
+
+    start/end are optional inclusive UTC epoch-second bounds. positions
+    optionally restricts each store to the visits at those positions (one
+    array per store, e.g. from services.visit_query.select_visits); such
+    rollups are always exact. mode 'auto' uses the sketches when the stores
+    hold more than Config.TIMELINE_SKETCH_THRESHOLD visits together and
+    exact counts otherwise.
+    """
+    if interval not in INTERVALS:
+        raise ValueError(f"Unsupported interval: {interval}. Use one of {', '.join(INTERVALS)}")
+    if mode not in MODES:
+        raise ValueError(f"Unsupported mode: {mode}. Use one of {', '.join(MODES)}")
+    if mode == 'approx' and positions is not None:
+        raise ValueError("Approximate mode does not support a visit selection")
+
+    if mode == 'auto':
+        large = sum(len(store) for store in stores) > Config.TIMELINE_SKETCH_THRESHOLD
+        mode = 'approx' if large and positions is None else 'exact'
+
+    if mode == 'approx':
+        result = _approx_rollup(stores, start, end, interval)
+    else:
+        result = _exact_rollup(stores, start, end, interval, positions)
+    result['interval'] = interval
+    return result
@@ -0,0 +1,318 @@
+"""
+Top-N URL analytics (domains, registrable domains, public suffixes, paths,
+schemes, query keys) over stored visits.
+
+Exact answers count visits per URL code with one bincount over the window,
+then fold those counts onto the requested dimension through a per-URL code
+table, so no URL string is touched at query time. The code tables for
+path, scheme and query_key are parsed once per distinct URL and cached
+with the store; domain, registrable_domain and public_suffix reuse the
+store's own domain codes and the per-domain codes resolved at ingest.
+
+For large stores, each dimension also gets per-time-bucket sketches: a
+Space-Saving style summary of the heaviest values in every bucket and a
+Count-Min table. An approximate query merges the buckets overlapping its
+window, so its cost depends on the number of buckets, not visits. The
+window is widened to whole buckets and counts are Count-Min upper bounds;
+any value missing from the answer has at most 'error_bound' visits.
+"""
+import math
+import threading
+import weakref
+from urllib.parse import urlsplit, parse_qsl
+import numpy as np
+from config import Config
+from services.visit_store import _column_array
+
+DIMENSIONS = ('domain', 'registrable_domain', 'public_suffix', 'path', 'scheme', 'query_key')
+MODES = ('auto', 'exact', 'approx')
+
+# Count-Min table shape and Space-Saving counters kept per bucket
+SKETCH_DEPTH = 4
+SKETCH_WIDTH = 2048
+SKETCH_CAPACITY = 256
+
+# Auto mode counts windows spanning fewer buckets than this exactly, rather
+# than widening them to whole buckets
+MIN_SKETCH_BUCKETS = 8
+_DAY_MICROS = 86400 * 1000000
+
+# Pairwise-independent hashes (a * x + b) mod p for the Count-Min rows
+_HASH_PRIME = (1 << 31) - 1
+_HASH_A = np.array([1103515245, 1664525, 22695477, 134775813], dtype=np.int64)[:SKETCH_DEPTH]
+_HASH_B = np.array([12345, 1013904223, 1, 2531011], dtype=np.int64)[:SKETCH_DEPTH]
+
+# Per-store dimension tables and sketches, dropped with the store
+_cache = weakref.WeakKeyDictionary()
+_cache_lock = threading.Lock()
+
+
+class DimensionTable:
+    """Maps every URL code to zero or more dimension value codes (CSR layout)"""
+
+    def __init__(self, values, offsets, codes):
+        self.values = values
+        self.offsets = offsets
+        self.codes = codes
+        self.single_valued = len(codes) == len(offsets) - 1
+
+    def count(self, url_counts):
+        """Fold per-URL visit counts into per-value visit counts"""
+        weights = url_counts if self.single_valued else np.repeat(url_counts, np.diff(self.offsets))
+        return np.bincount(self.codes, weights=weights, minlength=len(self.values)).astype(np.int64)
+
+    def expand(self, url_codes):
+        """Value codes of the given URL codes, with the index of the URL each came from"""
+        if self.single_valued:
+            return self.codes[url_codes], np.arange(len(url_codes))
+        starts = self.offsets[url_codes]
+        lengths = self.offsets[url_codes + 1] - starts
+        source = np.repeat(np.arange(len(url_codes)), lengths)
+        first = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        positions = np.repeat(starts, lengths) + np.arange(len(source)) - first
+        return self.codes[positions], source
+
+
+def _split_url(url):
+    try:
+        return urlsplit(url)
+    except ValueError:
+        return None
+
+
+def _url_parts(dimension, url):
+    """Values of one dimension for a URL"""
+    parts = _split_url(url)
+    if parts is None:
+        return [] if dimension == 'query_key' else ['']
+    if dimension == 'path':
+        return [parts.path or '/']
+    if dimension == 'scheme':
+        return [parts.scheme]
+    # Each key counts once per URL, however often it repeats in the query
+    return list(dict.fromkeys(key for key, _ in parse_qsl(parts.query, keep_blank_values=True)))
+
+
+def _build_dimension(store, dimension):
+    """Build the URL -> value code table of a dimension"""
+    url_count = len(store.url_values)
+    if dimension == 'domain':
+        return DimensionTable(store.domains.values, np.arange(url_count + 1, dtype=np.int64),
+                              _column_array(store.url_domain_codes).astype(np.int64))
+    if dimension in ('registrable_domain', 'public_suffix'):
+        store.ensure_registrable_domains()
+        if dimension == 'registrable_domain':
+            values, domain_codes = store.registrable_domains.values, store.domain_registrable_codes
+        else:
+            values, domain_codes = store.public_suffixes.values, store.domain_suffix_codes
+        codes = _column_array(domain_codes).astype(np.int64)[_column_array(store.url_domain_codes)]
+        return DimensionTable(values, np.arange(url_count + 1, dtype=np.int64), codes)
+
+    value_codes = {}
+    values = []
+    offsets = [0]
+    codes = []
+    for url in store.url_values:
+        for value in _url_parts(dimension, url):
+            code = value_codes.get(value)
+            if code is None:
+                code = value_codes[value] = len(values)
+                values.append(value)
+            codes.append(code)
+        offsets.append(len(codes))
+    return DimensionTable(values, np.array(offsets, dtype=np.int64), np.array(codes, dtype=np.int64))
+
+
+def _hash_rows(codes):
+    """Count-Min column of each code in every row, shape (SKETCH_DEPTH, len(codes))"""
+    return (_HASH_A[:, None] * codes[None, :] + _HASH_B[:, None]) % _HASH_PRIME % SKETCH_WIDTH
+
+
+class BucketSketch:
+    """Per-time-bucket Count-Min tables and Space-Saving summaries of one dimension"""
+
+    def __init__(self, store, table):
+        micros = store.micros_array()
+        timed = micros > 0
+        micros = micros[timed]
+        url_codes = _column_array(store.url_codes)[timed].astype(np.int64)
+
+        self.origin = int(micros.min()) // _DAY_MICROS * _DAY_MICROS if micros.size else 0
+        span_days = (int(micros.max()) - self.origin) // _DAY_MICROS + 1 if micros.size else 1
+        # Buckets are whole days, widened so a store never has more than ANALYTICS_SKETCH_BUCKETS
+        self.width = _DAY_MICROS * max(1, math.ceil(span_days / max(1, Config.ANALYTICS_SKETCH_BUCKETS)))
+        buckets = (micros - self.origin) // self.width
+        self.bucket_count = int(buckets.max()) + 1 if micros.size else 0
+        self.visits = np.bincount(buckets, minlength=self.bucket_count)
+
+        # Visits per (bucket, URL), then per (bucket, value)
+        url_total = max(len(store.url_values), 1)
+        pairs, pair_counts = np.unique(buckets * url_total + url_codes, return_counts=True)
+        value_codes, source = table.expand(pairs % url_total)
+        value_total = max(len(table.values), 1)
+        keys, inverse = np.unique((pairs // url_total)[source] * value_total + value_codes, return_inverse=True)
+        counts = np.bincount(inverse, weights=pair_counts[source]).astype(np.int64)
+        bucket_of = keys // value_total
+        value_of = keys % value_total
+
+        # Count-Min: one flat bincount per row; int32 counters halve the table (32 KB per bucket)
+        self.cm = np.zeros((self.bucket_count, SKETCH_DEPTH, SKETCH_WIDTH), dtype=np.int32)
+        for row, columns in enumerate(_hash_rows(value_of)):
+            flat = np.bincount(bucket_of * SKETCH_WIDTH + columns, weights=counts,
+                               minlength=self.bucket_count * SKETCH_WIDTH)
+            self.cm[:, row, :] = flat.reshape(self.bucket_count, SKETCH_WIDTH)
+
+        # Space-Saving summaries: the SKETCH_CAPACITY heaviest values of each bucket;
+        # floor is the largest count left out, bounding every unlisted value
+        order = np.lexsort((-counts, bucket_of))
+        bucket_of, value_of, counts = bucket_of[order], value_of[order], counts[order]
+        first = np.searchsorted(bucket_of, np.arange(self.bucket_count))
+        rank = np.arange(len(bucket_of)) - first[bucket_of]
+        kept = rank < SKETCH_CAPACITY
+        self.ss_codes = np.full((self.bucket_count, SKETCH_CAPACITY), -1, dtype=np.int64)
+        self.ss_counts = np.zeros((self.bucket_count, SKETCH_CAPACITY), dtype=np.int64)
+        self.ss_codes[bucket_of[kept], rank[kept]] = value_of[kept]
+        self.ss_counts[bucket_of[kept], rank[kept]] = counts[kept]
+        self.ss_floor = np.zeros(self.bucket_count, dtype=np.int64)
+        cut = rank == SKETCH_CAPACITY
+        self.ss_floor[bucket_of[cut]] = counts[cut]
+
+    def bucket_range(self, start_us, end_us):
+        """Buckets overlapping [start_us, end_us], as a slice"""
+        first = 0 if start_us is None else max(0, (start_us - self.origin) // self.width)
+        last = self.bucket_count - 1 if end_us is None else min(self.bucket_count - 1, (end_us - self.origin) // self.width)
+        return slice(int(first), int(last) + 1) if first <= last else slice(0, 0)
+
+    def top(self, n, start_us, end_us):
+        """Approximate top-n (codes, estimates, lower bounds), visits and error bound over a window"""
+        window = self.bucket_range(start_us, end_us)
+        codes = self.ss_codes[window].ravel()
+        listed = codes >= 0
+        candidates, inverse = np.unique(codes[listed], return_inverse=True)
+        lower = np.bincount(inverse, weights=self.ss_counts[window].ravel()[listed]).astype(np.int64)
+
+        # Count-Min estimate: minimum over rows of the window's summed counters
+        merged = self.cm[window].sum(axis=0, dtype=np.int64)
+        columns = _hash_rows(candidates)
+        estimates = merged[np.arange(SKETCH_DEPTH)[:, None], columns].min(axis=0) if candidates.size else lower
+
+        order = np.lexsort((candidates, -estimates))[:n]
+        return (candidates[order], estimates[order], lower[order], int(self.visits[window].sum()),
+                int(self.ss_floor[window].sum()), window)
+
+
+def _bounds_us(start, end):
+    """Inclusive epoch-second bounds as inclusive epoch-microsecond bounds"""
+    return None if start is None else start * 1000000, None if end is None else end * 1000000 + 999999
+
+
+def _cached(store, key, build):
+    """Get or build a per-store analytics structure (built outside the lock; the first one stored wins)"""
+    with _cache_lock:
+        entry = _cache.setdefault(store, {})
+        if key in entry:
+            return entry[key]
+    value = build()
+    with _cache_lock:
+        return _cache[store].setdefault(key, value)
+
+
+def _top_n(counts, n):
+    """Indices of the n largest non-zero counts, largest first (ties by code)"""
+    if n < len(counts):
+        candidates = np.argpartition(-counts, n)[:n]
+    else:
+        candidates = np.arange(len(counts))
+    candidates = candidates[counts[candidates] > 0]
+    return candidates[np.lexsort((candidates, -counts[candidates]))]
+
+
+def _exact_top(store, table, n, start, end, domain, registrable_domain):
+    url_codes = _column_array(store.url_codes)
+    if start is not None or end is not None or domain or registrable_domain:
+        # Only the time partitions overlapping the window are read
+        span = slice(*store.time_span(start, end))
+        url_codes = url_codes[span]
+        epochs = store.epoch_array(span)
+        mask = np.ones(len(url_codes), dtype=bool)
+        if domain:
+            mask &= store.domain_code_array(span) == store.domains.lookup(domain)
+        if registrable_domain:
+            mask &= store.registrable_code_array(span) == store.registrable_domains.lookup(registrable_domain)
+        if start is not None:
+            mask &= epochs >= start
+        if end is not None:
+            mask &= epochs <= end
+        url_codes = url_codes[mask]
+
+    counts = table.count(np.bincount(url_codes, minlength=len(store.url_values)))
+    top = _top_n(counts, n)
+    return {
+        'mode': 'exact',
+        'start': start,
+        'end': end,
+        'total_visits': int(len(url_codes)),
+        'distinct_values': int(np.count_nonzero(counts)),
+        'items': [{'value': table.values[code], 'count': int(counts[code])} for code in top]
+    }
+
+
+def _approx_top(store, table, dimension, n, start, end):
+    sketch = _cached(store, ('sketch', dimension), lambda: BucketSketch(store, table))
+    codes, estimates, lower, visits, error_bound, window = sketch.top(n, *_bounds_us(start, end))
+    return {
+        'mode': 'approx',
+        # The window actually covered, widened to whole buckets
+        'start': (sketch.origin + window.start * sketch.width) // 1000000,
+        'end': (sketch.origin + window.stop * sketch.width) // 1000000 - 1,
+        'total_visits': visits,
+        'error_bound': error_bound,
+        'items': [
+            {'value': table.values[code], 'count': int(estimate), 'lower_bound': int(low)}
+            for code, estimate, low in zip(codes, estimates, lower)
+        ]
+    }
+
+
+def top_values(store, dimension='domain', n=20, start=None, end=None, domain=None, mode='auto',
+               registrable_domain=None):
+    """
+    Top-n values of a URL dimension by visit count.
+
+    dimension is one of DIMENSIONS; start/end are optional inclusive UTC
+    epoch-second bounds; domain or registrable_domain optionally restrict
+    the visits to one domain or to all hosts under one registrable domain
+    (so dimension='domain' lists an organization's subdomains). mode 'auto'
+    uses the sketches when the window covers more than
+    Config.ANALYTICS_SKETCH_THRESHOLD visits over at least MIN_SKETCH_BUCKETS
+    buckets, and exact counts otherwise.
+    """
+    if dimension not in DIMENSIONS:
+        raise ValueError(f"Unsupported dimension: {dimension}. Use one of {', '.join(DIMENSIONS)}")
+    if mode not in MODES:
+        raise ValueError(f"Unsupported mode: {mode}. Use one of {', '.join(MODES)}")
+    if n < 1:
+        raise ValueError("n must be at least 1")
+    filtered = bool(domain or registrable_domain)
+    if mode == 'approx' and filtered:
+        raise ValueError("Approximate mode does not support a domain filter")
+
+    table = _cached(store, ('dimension', dimension), lambda: _build_dimension(store, dimension))
+    if mode == 'auto':
+        mode = 'exact'
+        if len(store) > Config.ANALYTICS_SKETCH_THRESHOLD and not filtered:
+            sketch = _cached(store, ('sketch', dimension), lambda: BucketSketch(store, table))
+            window = sketch.bucket_range(*_bounds_us(start, end))
+            # Small windows are cheap to count exactly and would be widened the most
+            if (window.stop - window.start >= MIN_SKETCH_BUCKETS
+                    and sketch.visits[window].sum() > Config.ANALYTICS_SKETCH_THRESHOLD):
+                mode = 'approx'
+
+    if mode == 'approx':
+        result = _approx_top(store, table, dimension, n, start, end)
+    else:
+        result = _exact_top(store, table, n, start, end, domain, registrable_domain)
+    result['dimension'] = dimension
+    result['domain'] = domain or ''
+    result['registrable_domain'] = registrable_domain or ''
+    return result
@@ -0,0 +1,200 @@
+"""
+Filtered selection of stored visits and downloads, shared by paging and export.
+
+select_visits() answers a filter with the positions of the matching visits,
+newest first, without materializing any entry:
+
+- start/end narrow the visit range to the store's overlapping time
+  partitions, then by binary search within them, since visits are stored
+  newest first.
+- domain and registrable_domain use a per-store inverted index: every
+  visit position grouped by domain code, so a domain's visits in a window
+  are one contiguous slice of its postings.
+- search is a case-insensitive substring match on URL and title. It is
+  evaluated once per distinct URL against a cached lowercase text of the
+  URL table, then mapped onto the candidate visits through their URL codes.
+
+Only the selected rows are then serialized, so a filtered page or export
+costs time proportional to the matches rather than to the profile.
+"""
+import threading
+import weakref
+from datetime import datetime, time as datetime_time
+import numpy as np
+from services.visit_store import _column_array
+from utils.public_suffix import split_host
+from utils.url_utils import extract_domain
+
+# Filters accepted per data type; status only applies to downloads
+VISIT_FILTERS = ('domain', 'registrable_domain', 'start', 'end', 'search')
+DOWNLOAD_FILTERS = VISIT_FILTERS + ('status',)
+
+# Per-store indexes, dropped with the store
+_cache = weakref.WeakKeyDictionary()
+_cache_lock = threading.Lock()
+
+
+def _cached(store, key, build):
+    with _cache_lock:
+        entries = _cache.setdefault(store, {})
+        if key in entries:
+            return entries[key]
+    value = build()
+    with _cache_lock:
+        return _cache[store].setdefault(key, value)
+
+
+def _parse_time(value, tz, end_of_day):
+    """Epoch seconds from an int/float, a numeric string or an ISO date/datetime in tz"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value)
+    text = str(value).strip()
+    if text.lstrip('-').isdigit():
+        return int(text)
+    try:
+        parsed = datetime.fromisoformat(text.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"Invalid date: {value}. Use epoch seconds or YYYY-MM-DD[ HH:MM[:SS]]")
+    # A bare date bounds the whole day
+    if end_of_day and len(text) == 10:
+        parsed = datetime.combine(parsed.date(), datetime_time.max)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=tz)
+    return int(parsed.timestamp())
+
+
+def parse_filters(raw, tz, allowed=VISIT_FILTERS):
+    """
+    Normalize filter parameters from a query string or JSON body.
+
+    start/end (or start_date/end_date) are inclusive bounds given as epoch
+    seconds or ISO dates/datetimes in tz; empty values are ignored. Raises
+    ValueError for unknown, unsupported or malformed filters.
+    """
+    filters = {}
+    for name, value in (raw or {}).items():
+        if value is None or value == '':
+            continue
+        key = {'start_date': 'start', 'end_date': 'end'}.get(name, name)
+        if key not in DOWNLOAD_FILTERS:
+            raise ValueError(f"Unknown filter: {name}")
+        if key not in allowed:
+            raise ValueError(f"Filter '{name}' is not supported here")
+        if key in ('start', 'end'):
+            filters[key] = _parse_time(value, tz, end_of_day=key == 'end')
+        elif key in ('search', 'status'):
+            filters[key] = str(value).strip().lower()
+        else:
+            # Domains match exactly, as in the histogram and analytics filters
+            filters[key] = str(value).strip()
+    return filters
+
+
+def _time_range(store, start, end):
+    """[lo, hi) positions of the visits within the inclusive epoch-second bounds"""
+    # Prune to the overlapping partitions, then search only within them
+    base, top = store.time_span(start, end)
+    # Newest first: search the negated times, which ascend
+    negated_micros = -store.micros_array()[base:top]
+    lo, hi = 0, len(negated_micros)
+    if end is not None:
+        lo = int(np.searchsorted(negated_micros, -(end * 1000000 + 999999), side='left'))
+    if start is not None:
+        hi = int(np.searchsorted(negated_micros, -(start * 1000000), side='right'))
+    return base + lo, base + max(lo, hi)
+
+
+def _postings(store, kind):
+    """Visit positions grouped by domain (or registrable domain) code, with group offsets"""
+    def build():
+        if kind == 'registrable_domain':
+            codes, size = store.registrable_code_array(), len(store.registrable_domains)
+        else:
+            codes, size = store.domain_code_array(), len(store.domains)
+        # Stable, so every group keeps its visits newest first
+        order = np.argsort(codes, kind='stable')
+        offsets = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(codes, minlength=size), out=offsets[1:])
+        return order, offsets
+    return _cached(store, ('postings', kind), build)
+
+
+def _domain_positions(store, kind, value, lo, hi):
+    """Positions in [lo, hi) of the visits to one domain or registrable domain"""
+    table = store.registrable_domains if kind == 'registrable_domain' else store.domains
+    code = table.lookup(value)
+    if code < 0:
+        return np.zeros(0, dtype=np.int64)
+    order, offsets = _postings(store, kind)
+    group = order[offsets[code]:offsets[code + 1]]
+    return group[np.searchsorted(group, lo):np.searchsorted(group, hi)]
+
+
+def _search_text(store):
+    """Lowercase 'url title' lines of the URL table and the offset where each line starts"""
+    def build():
+        titles = store.titles.values
+        title_codes = store.url_title_codes
+        lines = [f"{url} {titles[title_codes[code]]}".replace('\n', ' ').lower()
+                 for code, url in enumerate(store.url_values)]
+        starts = np.zeros(len(lines) + 1, dtype=np.int64)
+        np.cumsum([len(line) + 1 for line in lines], out=starts[1:])
+        return '\n'.join(lines), starts
+    return _cached(store, ('search_text',), build)
+
+
+def _matching_urls(store, term):
+    """Boolean mask over URL codes whose URL or title contains term"""
+    text, starts = _search_text(store)
+    matches = np.zeros(len(starts) - 1, dtype=bool)
+    position = text.find(term)
+    while position >= 0:
+        code = int(np.searchsorted(starts, position, side='right')) - 1
+        matches[code] = True
+        # Continue from the next line; one hit per URL is enough
+        position = text.find(term, int(starts[code + 1]))
+    return matches
+
+
+def select_visits(store, filters):
+    """Positions of the visits matching filters (see parse_filters), newest first"""
+    lo, hi = _time_range(store, filters.get('start'), filters.get('end'))
+    positions = None
+    for kind in ('domain', 'registrable_domain'):
+        if filters.get(kind):
+            selected = _domain_positions(store, kind, filters[kind], lo, hi)
+            positions = selected if positions is None else np.intersect1d(positions, selected, assume_unique=True)
+    if positions is None:
+        positions = np.arange(lo, hi, dtype=np.int64)
+    if filters.get('search') and len(positions):
+        url_codes = _column_array(store.url_codes)[positions]
+        positions = positions[_matching_urls(store, filters['search'])[url_codes]]
+    return positions
+
+
+def filter_downloads(downloads, filters):
+    """Stored downloads matching filters; domains are compared on the download URL's host"""
+    if not filters:
+        return downloads
+    start = filters.get('start')
+    end = filters.get('end')
+    selected = []
+    for download in downloads:
+        micros = download.get('download_time_us') or 0
+        if start is not None and micros < start * 1000000:
+            continue
+        if end is not None and micros > end * 1000000 + 999999:
+            continue
+        if filters.get('status') and str(download.get('status', '')).lower() != filters['status']:
+            continue
+        host = extract_domain(download.get('url') or '')
+        if filters.get('domain') and host != filters['domain']:
+            continue
+        if filters.get('registrable_domain') and split_host(host)[0] != filters['registrable_domain']:
+            continue
+        if filters.get('search'):
+            text = f"{download.get('filename') or ''} {download.get('url') or ''}".lower()
+            if filters['search'] not in text:
+                continue
+        selected.append(download)
+    return selected
@@ -0,0 +1,535 @@
+"""
+Compact column-oriented storage for processed history visits.
+
+URLs, titles and domains are dictionary-encoded: every distinct URL is
+stored once in a URL table that references interned title and domain
+strings, and each visit only holds an integer URL code and its time.
+Strings are resolved when a page of entries is serialized.
+
+Each visit also keeps its browser visit id, the id of the visit it was
+navigated from and its raw transition/visit type. link_parents() resolves
+the from-visit ids into positions once at ingest, giving the navigation
+graph used for session reconstruction.
+
+Each distinct domain also gets its registrable domain (eTLD+1, e.g.
+example.co.uk for a.cdn.example.co.uk) and public suffix from the bundled
+Public Suffix List, resolved for the whole domain table at once by
+link_registrable_domains(), so stats can roll hosts up by organization.
+
+Visit times are kept as raw Unix epoch microseconds in an int64 column.
+All comparison, sorting and bucketing works on those integers; display
+strings are formatted only at serialization, in the requested timezone.
+
+Visits are also indexed into time partitions: contiguous runs of visits in
+one UTC month (or day), each with its minimum and maximum visit time.
+time_span() prunes a time window to the positions of the partitions it
+overlaps, so range queries, histograms and filtered exports only read
+those visits. Since every partition is a contiguous slice of each visit
+column, a memory-mapped store pages in only the partitions a query
+touches, and the OS can drop cold partitions independently.
+
+A store can be saved as .npy columns plus UTF-8 string blobs and loaded
+back memory-mapped, so a reloaded profile pages in lazily instead of
+being re-parsed.
+"""
+import os
+import shutil
+from array import array
+import numpy as np
+from utils.time_utils import format_epoch_micros, resolve_timezone
+from utils.public_suffix import split_hosts
+
+_DAY_MICROS = 86400 * 1000000
+
+
+def _column_array(column):
+    """Zero-copy NumPy view of an array.array or memory-mapped column"""
+    if isinstance(column, np.ndarray):
+        return column
+    return np.frombuffer(column, dtype=np.dtype(column.typecode))
+
+
+def _text(value):
+    """A string cell; None and missing values (NaN, pd.NA from DataFrames) become ''"""
+    if isinstance(value, str):
+        return value
+    if value is None:
+        return ''
+    try:
+        if value != value:
+            return ''
+    except TypeError:
+        # pd.NA refuses to be compared
+        return ''
+    return str(value)
+
+
+def _integer(value):
+    """An integer cell; None and missing values become 0"""
+    text = _text(value)
+    return int(value) if text else 0
+
+
+def _save_strings(path, values):
+    """Write strings as a UTF-8 blob (path.bin) and int64 offsets (path.offsets.npy)"""
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    with open(f"{path}.bin", 'wb') as f:
+        f.write(b''.join(encoded))
+    np.save(f"{path}.offsets.npy", offsets)
+
+
+class MappedStrings:
+    """Read-only sequence of strings decoded on access from a memory-mapped blob"""
+
+    def __init__(self, path):
+        self._offsets = np.load(f"{path}.offsets.npy", mmap_mode='r')
+        # Zero-length files cannot be memory-mapped
+        blob_path = f"{path}.bin"
+        self._blob = np.memmap(blob_path, dtype=np.uint8, mode='r') if os.path.getsize(blob_path) else b''
+
+    def __getitem__(self, index):
+        start, end = self._offsets[index], self._offsets[index + 1]
+        return bytes(self._blob[start:end]).decode('utf-8')
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+class StringTable:
+    """Interned string dictionary mapping each distinct value to an integer code"""
+
+    def __init__(self, values=None):
+        self.values = [] if values is None else values
+        # Built on first use for tables loaded from disk
+        self._codes = {} if values is None else None
+
+    def intern(self, value):
+        """Return the code for value, adding it to the table if new"""
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self._codes[value] = code
+            self.values.append(value)
+        return code
+
+    def lookup(self, value):
+        """Return the code for value, or -1 if it is not in the table"""
+        if self._codes is None:
+            self._codes = {v: code for code, v in enumerate(self.values)}
+        return self._codes.get(value, -1)
+
+    def __len__(self):
+        return len(self.values)
+
+
+class VisitStore:
+    """Column-oriented container for history visits, ordered newest first"""
+
+    COLUMNS = ('id', 'url', 'title', 'visit_count', 'visit_time', 'visit_timestamp', 'domain',
+               'registrable_domain')
+
+    # Groupings accepted by domain_summaries()
+    DOMAIN_GROUPINGS = ('domain', 'registrable_domain')
+
+    # Partition sizes accepted by build_partitions()
+    PARTITION_GRANULARITIES = ('month', 'day')
+
+    # Integer columns written by save(), in addition to the string tables
+    NUMERIC_COLUMNS = ('url_ids', 'url_title_codes', 'url_domain_codes', 'url_visit_counts',
+                       'url_codes', 'visit_micros', 'visit_ids', 'from_visits', 'transitions',
+                       'parent_positions', 'domain_registrable_codes', 'domain_suffix_codes',
+                       'partition_offsets', 'partition_min_micros', 'partition_max_micros')
+
+    def __init__(self):
+        self.titles = StringTable()
+        self.domains = StringTable()
+
+        # Registrable domain and public suffix per domain code (filled by link_registrable_domains)
+        self.registrable_domains = StringTable()
+        self.public_suffixes = StringTable()
+        self.domain_registrable_codes = array('l')
+        self.domain_suffix_codes = array('l')
+
+        # URL table, indexed by URL code
+        self.url_values = []
+        self.url_ids = array('q')
+        self.url_title_codes = array('l')
+        self.url_domain_codes = array('l')
+        self.url_visit_counts = array('q')
+        self._url_codes = {}
+
+        # Visit columns, indexed by visit position
+        self.url_codes = array('l')
+        self.visit_micros = array('q')
+        self.visit_ids = array('q')
+        self.from_visits = array('q')
+        self.transitions = array('q')
+
+        # Position of each visit's from-visit, or -1 (filled by link_parents)
+        self.parent_positions = array('q')
+
+        # Time partitions: first position of each (plus the end) and its min/max visit time
+        # (filled by build_partitions)
+        self.partition_offsets = array('q')
+        self.partition_min_micros = array('q')
+        self.partition_max_micros = array('q')
+
+        # Directory the columns were last saved to or memory-mapped from
+        self.directory = None
+
+    def save(self, directory):
+        """Write the columns to directory so load() can memory-map them"""
+        if self.directory and os.path.abspath(self.directory) == os.path.abspath(directory):
+            return
+        # Write to a sibling directory and swap it in, so readers never see partial columns
+        staging = f"{directory}.tmp-{os.getpid()}"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        try:
+            for name in self.NUMERIC_COLUMNS:
+                np.save(os.path.join(staging, f"{name}.npy"), _column_array(getattr(self, name)))
+            _save_strings(os.path.join(staging, 'urls'), self.url_values)
+            _save_strings(os.path.join(staging, 'titles'), self.titles.values)
+            _save_strings(os.path.join(staging, 'domains'), self.domains.values)
+            _save_strings(os.path.join(staging, 'registrable_domains'), self.registrable_domains.values)
+            _save_strings(os.path.join(staging, 'public_suffixes'), self.public_suffixes.values)
+            shutil.rmtree(directory, ignore_errors=True)
+            os.replace(staging, directory)
+        finally:
+            # Left behind only when a write failed
+            shutil.rmtree(staging, ignore_errors=True)
+        self.directory = directory
+
+    @classmethod
+    def load(cls, directory):
+        """Memory-map a store written by save(). The loaded store is read-only."""
+        store = cls()
+        for name in cls.NUMERIC_COLUMNS:
+            path = os.path.join(directory, f"{name}.npy")
+            # Caches written before a column existed keep its empty default
+            if os.path.exists(path):
+                setattr(store, name, np.load(path, mmap_mode='r'))
+        store.url_values = MappedStrings(os.path.join(directory, 'urls'))
+        store.titles = StringTable(MappedStrings(os.path.join(directory, 'titles')))
+        store.domains = StringTable(MappedStrings(os.path.join(directory, 'domains')))
+        for name in ('registrable_domains', 'public_suffixes'):
+            path = os.path.join(directory, name)
+            if os.path.exists(f"{path}.offsets.npy"):
+                setattr(store, name, StringTable(MappedStrings(path)))
+        store.directory = directory
+        return store
+
+    @classmethod
+    def from_records(cls, records):
+        """Build a store from a list of entry dictionaries with a visit_time_us field"""
+        store = cls()
+        store.append_rows(
+            (r.get('id', 0), r.get('url', ''), r.get('title', ''), r.get('visit_count', 0),
+             r.get('visit_time_us', 0), r.get('domain', ''),
+             r.get('visit_id', 0), r.get('from_visit', 0), r.get('transition', 0))
+            for r in records
+        )
+        return store
+
+    def _url_code(self, row_id, url, title, visit_count, domain):
+        """Return the URL code for a row, adding a URL table entry if new"""
+        url = _text(url)
+        key = (_integer(row_id), url)
+        code = self._url_codes.get(key)
+        if code is None:
+            code = len(self.url_values)
+            self._url_codes[key] = code
+            self.url_values.append(url)
+            self.url_ids.append(_integer(row_id))
+            self.url_title_codes.append(self.titles.intern(_text(title)))
+            self.url_domain_codes.append(self.domains.intern(_text(domain)))
+            self.url_visit_counts.append(_integer(visit_count))
+        return code
+
+    def _append_visit(self, code, visit_time_us, visit_id, from_visit, transition):
+        self.url_codes.append(code)
+        self.visit_micros.append(_integer(visit_time_us))
+        self.visit_ids.append(_integer(visit_id))
+        self.from_visits.append(_integer(from_visit))
+        self.transitions.append(_integer(transition))
+
+    def append_rows(self, rows):
+        """
+        Append (id, url, title, visit_count, visit_time_us, domain, visit_id,
+        from_visit, transition) tuples
+        """
+        for row_id, url, title, visit_count, visit_time_us, domain, visit_id, from_visit, transition in rows:
+            code = self._url_code(row_id, url, title, visit_count, domain)
+            self._append_visit(code, visit_time_us, visit_id, from_visit, transition)
+
+    def append_visits(self, rows, domain_func):
+        """
+        Append (id, url, title, visit_count, visit_time_us, visit_id,
+        from_visit, transition) tuples, calling domain_func only the first
+        time each URL is seen
+        """
+        url_codes = self._url_codes
+        for row_id, url, title, visit_count, visit_time_us, visit_id, from_visit, transition in rows:
+            code = url_codes.get((row_id, url))
+            if code is None:
+                code = self._url_code(row_id, url, title, visit_count, domain_func(url))
+            self._append_visit(code, visit_time_us, visit_id, from_visit, transition)
+
+    def link_parents(self):
+        """Resolve every visit's from-visit id into the position of that visit (-1 if absent)"""
+        visit_ids = _column_array(self.visit_ids)
+        from_visits = _column_array(self.from_visits)
+        parents = np.full(len(visit_ids), -1, dtype=np.int64)
+        if not len(visit_ids):
+            self.parent_positions = parents
+            return
+        max_id = int(visit_ids.max())
+        if visit_ids.min() >= 0 and max_id <= 4 * len(visit_ids):
+            # Visit ids are SQLite rowids, normally dense: join through a direct lookup table
+            position_of = np.full(max_id + 1, -1, dtype=np.int64)
+            position_of[visit_ids] = np.arange(len(visit_ids))
+            linked = (from_visits > 0) & (from_visits <= max_id)
+            parents[linked] = position_of[from_visits[linked]]
+        else:
+            # Sparse ids: sort-and-search join of from_visit against visit id
+            order = np.argsort(visit_ids, kind='stable')
+            sorted_ids = visit_ids[order]
+            found = np.minimum(np.searchsorted(sorted_ids, from_visits), len(sorted_ids) - 1)
+            linked = (from_visits > 0) & (sorted_ids[found] == from_visits)
+            parents[linked] = order[found[linked]]
+        self.parent_positions = parents
+
+    def link_registrable_domains(self):
+        """Resolve the registrable domain and public suffix of every distinct domain"""
+        registrable, registrable_codes, suffixes, suffix_codes = split_hosts(self.domains.values)
+        self.registrable_domains = StringTable(registrable)
+        self.public_suffixes = StringTable(suffixes)
+        self.domain_registrable_codes = registrable_codes
+        self.domain_suffix_codes = suffix_codes
+
+    def ensure_registrable_domains(self):
+        """Run link_registrable_domains() unless the current domain table is already resolved"""
+        if len(self.domain_registrable_codes) != len(self.domains):
+            self.link_registrable_domains()
+
+    def build_partitions(self, granularity='month'):
+        """Split the visits into runs of the same UTC month (or day) and record each run's time range"""
+        if granularity not in self.PARTITION_GRANULARITIES:
+            raise ValueError(f"Unsupported partition granularity: {granularity}. "
+                             f"Use one of {', '.join(self.PARTITION_GRANULARITIES)}")
+        micros = self.micros_array()
+        if not len(micros):
+            self.partition_offsets = np.zeros(1, dtype=np.int64)
+            self.partition_min_micros = self.partition_max_micros = np.zeros(0, dtype=np.int64)
+            return
+        if granularity == 'day':
+            keys = micros // _DAY_MICROS
+        else:
+            keys = micros.astype('datetime64[us]').astype('datetime64[M]').astype(np.int64)
+        # Visits are newest first, so each partition is one run; an out-of-order visit just starts another
+        starts = np.concatenate(([0], np.flatnonzero(keys[1:] != keys[:-1]) + 1))
+        self.partition_offsets = np.append(starts, len(micros))
+        self.partition_min_micros = np.minimum.reduceat(micros, starts)
+        self.partition_max_micros = np.maximum.reduceat(micros, starts)
+
+    def ensure_partitions(self, granularity='month'):
+        """Run build_partitions() unless the partitions already cover the current visits"""
+        offsets = self.partition_offsets
+        if not len(offsets) or offsets[-1] != len(self):
+            self.build_partitions(granularity)
+
+    def time_span(self, start=None, end=None):
+        """
+        Positions [lo, hi) of the partitions overlapping the inclusive UTC
+        epoch-second window start..end; every visit in the window lies within.
+        Stores without partitions span all visits.
+        """
+        offsets = _column_array(self.partition_offsets)
+        if not len(offsets) or offsets[-1] != len(self):
+            return 0, len(self)
+        overlap = np.ones(len(offsets) - 1, dtype=bool)
+        if start is not None:
+            overlap &= _column_array(self.partition_max_micros) >= start * 1000000
+        if end is not None:
+            overlap &= _column_array(self.partition_min_micros) <= end * 1000000 + 999999
+        hit = np.flatnonzero(overlap)
+        if not len(hit):
+            return 0, 0
+        return int(offsets[hit[0]]), int(offsets[hit[-1] + 1])
+
+    def url_at(self, index):
+        """URL of the visit at index"""
+        return self.url_values[self.url_codes[index]]
+
+    def title_at(self, index):
+        """Title of the visit at index"""
+        return self.titles.values[self.url_title_codes[self.url_codes[index]]]
+
+    def domain_code_at(self, index):
+        """Domain code of the visit at index"""
+        return self.url_domain_codes[self.url_codes[index]]
+
+    def micros_array(self):
+        """Visit times as a zero-copy int64 NumPy array of epoch microseconds"""
+        return _column_array(self.visit_micros)
+
+    def epoch_array(self, positions=slice(None)):
+        """Visit times (of the visits at positions, e.g. a slice) as an int64 NumPy array of epoch seconds"""
+        return self.micros_array()[positions] // 1000000
+
+    def domain_code_array(self, positions=slice(None)):
+        """Domain code of every visit (or of the visits at positions) as a NumPy array"""
+        return _column_array(self.url_domain_codes)[_column_array(self.url_codes)[positions]]
+
+    def registrable_code_array(self, positions=slice(None)):
+        """Registrable domain code of every visit (or of the visits at positions) as a NumPy array"""
+        self.ensure_registrable_domains()
+        return _column_array(self.domain_registrable_codes)[self.domain_code_array(positions)]
+
+    def count_by_domain(self):
+        """Visit counts per domain, most visited first"""
+        counts = np.bincount(self.domain_code_array(), minlength=len(self.domains))
+        order = np.argsort(-counts, kind='stable')
+        return [(self.domains.values[code], int(counts[code])) for code in order if counts[code]]
+
+    def count_by_registrable_domain(self):
+        """Visit counts per registrable domain, most visited first"""
+        counts = np.bincount(self.registrable_code_array(), minlength=len(self.registrable_domains))
+        order = np.argsort(-counts, kind='stable')
+        return [(self.registrable_domains.values[code], int(counts[code])) for code in order if counts[code]]
+
+    def domain_summaries(self, group_by='domain', tz=None, positions=None):
+        """
+        Visit count, last visit time and share of all visits per domain, or per
+        registrable domain with group_by='registrable_domain', most visited first.
+        positions optionally restricts the summaries to those visits (newest first).
+        """
+        if group_by not in self.DOMAIN_GROUPINGS:
+            raise ValueError(f"Unsupported group_by: {group_by}. Use one of {', '.join(self.DOMAIN_GROUPINGS)}")
+        tz = tz or resolve_timezone()
+        if group_by == 'registrable_domain':
+            codes, values = self.registrable_code_array(), self.registrable_domains.values
+        else:
+            codes, values = self.domain_code_array(), self.domains.values
+        micros = self.micros_array()
+        if positions is not None:
+            codes, micros = codes[positions], micros[positions]
+        if not len(codes):
+            return []
+        # Visits are newest first, so a code's first position is its last visit
+        present, first = np.unique(codes, return_index=True)
+        counts = np.bincount(codes)[present]
+        last_micros = micros[first]
+        return [
+            {
+                'domain': values[present[i]],
+                'visit_count': int(counts[i]),
+                'last_visit_time': format_epoch_micros(int(last_micros[i]), tz),
+                'frequency': round(int(counts[i]) / len(codes), 6)
+            }
+            for i in np.lexsort((present, -counts)).tolist()
+        ]
+
+    def indices_for_domain(self, domain):
+        """Positions of all visits to domain, newest first"""
+        domain_code = self.domains.lookup(domain)
+        if domain_code < 0:
+            return np.array([], dtype=np.int64)
+        return np.flatnonzero(self.domain_code_array() == domain_code)
+
+    def record(self, index, tz=None):
+        """Materialize a single entry dictionary, formatting its time in tz"""
+        # int() turns NumPy scalars from memory-mapped columns into JSON-serializable ints
+        url_code = int(self.url_codes[index])
+        visit_micros = int(self.visit_micros[index])
+        domain_code = self.url_domain_codes[url_code]
+        domain = self.domains.values[domain_code]
+        if len(self.domain_registrable_codes) == len(self.domains):
+            registrable_domain = self.registrable_domains.values[self.domain_registrable_codes[domain_code]]
+        else:
+            registrable_domain = domain
+        return {
+            'id': int(self.url_ids[url_code]),
+            'url': self.url_values[url_code],
+            'title': self.titles.values[self.url_title_codes[url_code]],
+            'visit_count': int(self.url_visit_counts[url_code]),
+            'visit_time': format_epoch_micros(visit_micros, tz),
+            'visit_timestamp': visit_micros,
+            'domain': domain,
+            'registrable_domain': registrable_domain
+        }
+
+    def columns(self, positions=slice(None), fields=None, tz=None):
+        """
+        The fields (default COLUMNS) of the visits at positions (e.g. a slice) as
+        {field: list or NumPy array}, gathered column by column instead of per record
+        """
+        tz = tz or resolve_timezone()
+        codes = _column_array(self.url_codes)[positions]
+        url_codes = codes.tolist()
+        micros = self.micros_array()[positions]
+        domain_codes = _column_array(self.url_domain_codes)[codes]
+        result = {}
+        for field in fields or self.COLUMNS:
+            if field == 'id':
+                result[field] = _column_array(self.url_ids)[codes]
+            elif field == 'url':
+                result[field] = [self.url_values[code] for code in url_codes]
+            elif field == 'title':
+                titles = self.titles.values
+                result[field] = [titles[code] for code in _column_array(self.url_title_codes)[codes].tolist()]
+            elif field == 'visit_count':
+                result[field] = _column_array(self.url_visit_counts)[codes]
+            elif field == 'visit_time':
+                result[field] = [format_epoch_micros(value, tz) for value in micros.tolist()]
+            elif field == 'visit_timestamp':
+                result[field] = micros
+            elif field == 'domain':
+                domains = self.domains.values
+                result[field] = [domains[code] for code in domain_codes.tolist()]
+            elif field == 'registrable_domain':
+                if len(self.domain_registrable_codes) == len(self.domains):
+                    values = self.registrable_domains.values
+                    registrable_codes = _column_array(self.domain_registrable_codes)[domain_codes]
+                else:
+                    values, registrable_codes = self.domains.values, domain_codes
+                result[field] = [values[code] for code in registrable_codes.tolist()]
+            else:
+                result[field] = [None] * len(url_codes)
+        return result
+
+    def page(self, start, end, tz=None):
+        """Materialize entries start..end with times formatted in tz"""
+        tz = tz or resolve_timezone()
+        return [self.record(i, tz) for i in range(*slice(start, end).indices(len(self)))]
+
+    def take(self, positions, tz=None):
+        """Materialize the entries at positions with times formatted in tz"""
+        tz = tz or resolve_timezone()
+        return [self.record(i, tz) for i in np.asarray(positions).tolist()]
+
+    def iter_records(self, tz=None):
+        """Yield every entry dictionary with times formatted in tz"""
+        tz = tz or resolve_timezone()
+        for i in range(len(self)):
+            yield self.record(i, tz)
+
+    def __len__(self):
+        return len(self.url_codes)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            tz = resolve_timezone()
+            return [self.record(i, tz) for i in range(*key.indices(len(self)))]
+        if key < 0:
+            key += len(self)
+        return self.record(key)
+
+    def __iter__(self):
+        return self.iter_records()
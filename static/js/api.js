@@ -198,7 +198,7 @@ function loadPage(page) {
 /**
  * Export data with the specified format and type
  * @param {string} fileId - The file ID to export
- * @param {string} format - Export format (csv, json, excel)
+ * @param {string} format - Export format (csv, json, ndjson, ndjson.gz, ndjson.zst, excel, parquet, feather)
  * @param {string} dataType - Data type to export (history, domains, downloads, timeline)
  * @param {Object} filters - Optional filters to apply
  * @returns {Promise} - Promise that resolves when export completes
@@ -233,7 +233,7 @@ function exportData(fileId, format, dataType, filters = {}) {
         const a = document.createElement('a');
         a.style.display = 'none';
         a.href = url;
-        a.download = `browser_${dataType}_${fileId}.${format}`;
+        a.download = `browser_${dataType}_${fileId}.${format === 'excel' ? 'xlsx' : format}`;
         document.body.appendChild(a);
         a.click();
         window.URL.revokeObjectURL(url);
@@ -10,6 +10,10 @@ function getBadgeColorForMatchType(matchType) {
         case 'same_domain': return 'success';
         case 'file_pattern': return 'warning';
         case 'temporal': return 'secondary';
+        case 'referrer':
+        case 'tab_url': return 'info';
+        case 'tab_referrer':
+        case 'url_chain': return 'dark';
         default: return 'primary';
     }
 }
@@ -20,6 +24,10 @@ function formatMatchType(matchType) {
         case 'same_domain': return 'Same Domain';
         case 'file_pattern': return 'File Pattern';
         case 'temporal': return 'Temporal';
+        case 'referrer': return 'Referrer';
+        case 'tab_url': return 'Tab Page';
+        case 'tab_referrer': return 'Tab Referrer';
+        case 'url_chain': return 'Redirect Chain';
         default: return matchType;
     }
 }
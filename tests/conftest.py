@@ -0,0 +1,59 @@
+"""Shared fixtures: synthetic history databases, an isolated upload folder and a test client"""
+import os
+import shutil
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic_profiles import create_chrome_history, create_firefox_places
+from config import Config
+from services import storage
+
+
+@pytest.fixture(autouse=True)
+def upload_folder(tmp_path, monkeypatch):
+    """Every test gets its own upload folder and empty in-memory storage"""
+    folder = tmp_path / 'uploads'
+    folder.mkdir()
+    monkeypatch.setattr(Config, 'UPLOAD_FOLDER', str(folder))
+    monkeypatch.setattr(Config, 'STORAGE_DB_PATH', str(folder / 'storage.sqlite'))
+    monkeypatch.setattr(Config, 'PROFILE_FOLDER', str(tmp_path / 'profiles'))
+    monkeypatch.setattr(storage, '_shared_store', None)
+    storage.processed_files.clear()
+    yield folder
+    storage.processed_files.clear()
+
+
+@pytest.fixture
+def chrome_history(tmp_path):
+    return create_chrome_history(str(tmp_path / 'History'), num_urls=300, num_visits=3000, num_downloads=20)
+
+
+@pytest.fixture
+def firefox_places(tmp_path):
+    return create_firefox_places(str(tmp_path / 'places.sqlite'), num_places=300, num_visits=3000, num_downloads=20)
+
+
+@pytest.fixture
+def client():
+    from app import app
+    app.config['TESTING'] = True
+    return app.test_client()
+
+
+@pytest.fixture
+def process_profile():
+    """Copy a history database to an upload path, process it and return its file_id"""
+    from services.history_processor import process_history_file
+    from utils.file_utils import get_temp_file_path
+
+    def process(db_path, file_id, browser_type='chrome', engine='streaming'):
+        source = get_temp_file_path(file_id)
+        shutil.copy(db_path, source)
+        result = process_history_file(source, browser_type, file_id, engine=engine)
+        assert 'error' not in result, result.get('error')
+        return file_id
+
+    return process
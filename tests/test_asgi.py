@@ -0,0 +1,108 @@
+import asyncio
+import os
+import threading
+
+import pytest
+
+from app import app as flask_app
+from services import progressive
+
+CSS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'css', 'main.css')
+
+
+@pytest.fixture
+def asgi_app():
+    import asgi
+    return asgi.app
+
+
+async def _call(app, path, headers=()):
+    """Run one GET through the ASGI app; returns status, headers and the body actually sent"""
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'', 'http_version': '1.1',
+             'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]}
+    await app(scope, receive, send)
+    start = messages[0]
+    response_headers = {name.decode('latin-1'): value.decode('latin-1') for name, value in start['headers']}
+    return start['status'], response_headers, b''.join(message.get('body', b'') for message in messages[1:])
+
+
+def _request(app, path, headers=()):
+    return asyncio.run(_call(app, path, headers))
+
+
+def test_full_file(asgi_app, monkeypatch):
+    import asgi
+
+    def iterated(self):
+        raise AssertionError("file bodies are read by _send_file, not iterated in a pool thread")
+
+    monkeypatch.setattr(asgi.FileBody, '__next__', iterated)
+    status, headers, body = _request(asgi_app, '/static/css/main.css')
+    with open(CSS_PATH, 'rb') as f:
+        content = f.read()
+    assert status == 200
+    assert body == content
+    assert 'x-sendfile' not in headers
+
+
+def test_flask_app_config_is_untouched(asgi_app, client):
+    assert not flask_app.config['USE_X_SENDFILE']
+    # Served without the bridge, file responses still carry their bytes
+    response = client.get('/static/css/main.css')
+    with open(CSS_PATH, 'rb') as f:
+        assert response.data == f.read()
+    assert 'X-Sendfile' not in response.headers
+
+
+def test_range_request_sends_only_the_range(asgi_app):
+    status, headers, body = _request(asgi_app, '/static/css/main.css', [('Range', 'bytes=5-14')])
+    with open(CSS_PATH, 'rb') as f:
+        content = f.read()
+    assert status == 206
+    assert headers['content-length'] == '10'
+    assert body == content[5:15]
+
+
+def test_not_modified_sends_no_body(asgi_app):
+    _, headers, _ = _request(asgi_app, '/static/css/main.css')
+    status, _, body = _request(asgi_app, '/static/css/main.css', [('If-None-Match', headers['etag'])])
+    assert status == 304
+    assert body == b''
+
+
+def test_json_responses_pass_through(asgi_app):
+    status, headers, body = _request(asgi_app, '/get_page')
+    assert status == 400
+    assert headers['content-type'] == 'application/json'
+    assert b'Invalid file ID' in body
+
+
+def test_waiting_event_stream_holds_no_pool_thread(monkeypatch):
+    import asgi
+    channel = progressive.ProgressChannel('stream-test')
+    monkeypatch.setattr(progressive, '_channels', {'stream-test': channel})
+    bridge = asgi.FlaskASGI(flask_app, 1)
+
+    async def scenario():
+        stream = asyncio.ensure_future(_call(bridge, '/progress/stream-test'))
+        await asyncio.sleep(0.2)
+        # The only pool thread is free while the stream waits for its first event
+        status, _, _ = await asyncio.wait_for(_call(bridge, '/get_page'), 5)
+        threading.Timer(0.1, channel.publish, ('complete', {'total_entries': 1}, True)).start()
+        return status, await asyncio.wait_for(stream, 5)
+
+    try:
+        status, (stream_status, _, body) = asyncio.run(scenario())
+    finally:
+        bridge.executor.shutdown(wait=True)
+    assert status == 400
+    assert stream_status == 200
+    assert body == b'id: 0\nevent: complete\ndata: {"total_entries":1}\n\n'
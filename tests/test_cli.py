@@ -0,0 +1,51 @@
+import csv
+import json
+import os
+import shutil
+import sqlite3
+
+import cli
+from services.batch_processor import find_history_databases
+
+
+def _evidence(tmp_path, chrome_history, firefox_places):
+    root = tmp_path / 'evidence'
+    (root / 'alice' / 'Default').mkdir(parents=True)
+    (root / 'bob' / 'firefox').mkdir(parents=True)
+    shutil.copy(chrome_history, root / 'alice' / 'Default' / 'History')
+    # Detected by content, whatever the file is called
+    shutil.copy(firefox_places, root / 'bob' / 'firefox' / 'renamed.db')
+    sqlite3.connect(root / 'bob' / 'other.sqlite').execute('CREATE TABLE notes (body TEXT)')
+    (root / 'bob' / 'readme.txt').write_text('not a database')
+    return root
+
+
+def test_finds_history_databases_by_content(tmp_path, chrome_history, firefox_places):
+    root = _evidence(tmp_path, chrome_history, firefox_places)
+    found = {os.path.relpath(path, root): browser_type for path, browser_type in find_history_databases(str(root))}
+    assert found == {os.path.join('alice', 'Default', 'History'): 'chrome',
+                     os.path.join('bob', 'firefox', 'renamed.db'): 'firefox'}
+
+
+def test_cli_writes_profiles_merged_history_and_manifest(tmp_path, chrome_history, firefox_places, capsys):
+    root = _evidence(tmp_path, chrome_history, firefox_places)
+    output = tmp_path / 'out'
+    assert cli.main([str(root), '-o', str(output), '--format', 'csv', '--workers', '1',
+                     '--engine', 'streaming']) == 0
+    assert '2 profiles processed, 0 failed, 6000 visits' in capsys.readouterr().out
+
+    manifest = json.loads((output / 'manifest.json').read_text())
+    assert manifest['processed'] == 2 and manifest['total_visits'] == 6000
+    for profile in manifest['profiles']:
+        assert os.path.exists(profile['outputs']['history'])
+    with open(manifest['merged']['path'], newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 6000
+    assert {row['browser_type'] for row in rows} == {'chrome', 'firefox'}
+    timestamps = [int(row['visit_timestamp']) for row in rows]
+    assert timestamps == sorted(timestamps, reverse=True)
+
+
+def test_cli_rejects_unknown_timezones(tmp_path, capsys):
+    assert cli.main([str(tmp_path), '-o', str(tmp_path / 'out'), '--tz', 'Not/AZone']) == 2
+    assert 'Unknown timezone' in capsys.readouterr().err
@@ -0,0 +1,77 @@
+import sqlite3
+
+from services.download_correlation import correlate_chrome_downloads
+from services.firefox_downloads import read_firefox_downloads
+from services.storage import get_processed_data
+
+
+def test_chrome_sources_come_from_recorded_links(chrome_history, process_profile):
+    data = get_processed_data(process_profile(chrome_history, 'downloadfile'))
+    assert len(data['download_sources']) == len(data['downloads']) == 20
+    referrers = {download['url']: download['referrer'] for download in data['downloads']}
+    for group in data['download_sources']:
+        source = group['sources'][0]
+        assert (source['url'], source['match_type']) == (referrers[group['download_url']], 'referrer')
+        assert source['time_us'] <= group['download_time_us']
+
+
+def test_downloads_without_links_fall_back_in_order():
+    downloads = [
+        {'id': 1, 'filename': 'a', 'url': 'https://x.example/a', 'download_time_us': 3},
+        {'id': 2, 'filename': 'b', 'url': '', 'download_time_us': 2},
+        {'id': 3, 'filename': 'c', 'url': 'https://x.example/c', 'download_time_us': 1},
+    ]
+    calls = []
+
+    def fallback(unresolved):
+        calls.append([download['id'] for download in unresolved])
+        return [{'download_url': download['url'], 'sources': []} for download in unresolved]
+
+    # No links query in the plan: every download with a URL and time goes to the fallback
+    groups = correlate_chrome_downloads(sqlite3.connect(':memory:'), {}, downloads, fallback)
+    assert calls == [[1, 3]]
+    assert [group['download_url'] for group in groups] == ['https://x.example/a', 'https://x.example/c']
+
+
+def _annotated_places(destination_id=1, metadata_id=2):
+    conn = sqlite3.connect(':memory:')
+    conn.executescript("""
+    CREATE TABLE moz_places (id INTEGER PRIMARY KEY, url TEXT);
+    CREATE TABLE moz_anno_attributes (id INTEGER PRIMARY KEY, name TEXT);
+    CREATE TABLE moz_annos (id INTEGER PRIMARY KEY, place_id INTEGER, anno_attribute_id INTEGER,
+                            content TEXT, dateAdded INTEGER);
+    CREATE UNIQUE INDEX moz_annos_placeattributeindex ON moz_annos (place_id, anno_attribute_id);
+    INSERT INTO moz_places VALUES (1, 'https://x.example/a.zip'), (2, 'https://x.example/b.pdf');
+    """)
+    conn.execute("INSERT INTO moz_anno_attributes VALUES (?, 'downloads/destinationFileURI')", (destination_id,))
+    conn.execute("INSERT INTO moz_anno_attributes VALUES (?, 'downloads/metaData')", (metadata_id,))
+    conn.execute("INSERT INTO moz_anno_attributes VALUES (9, 'bookmarkProperties/description')")
+    conn.executemany("INSERT INTO moz_annos (place_id, anno_attribute_id, content, dateAdded) VALUES (?, ?, ?, ?)", [
+        (1, destination_id, 'file:///home/user/a.zip', 2000000),
+        (1, metadata_id, '{"state": 1, "endTime": 2500, "fileSize": 10}', 2000000),
+        (2, destination_id, 'file:///home/user/b.pdf', 1000000),
+        (2, metadata_id, 'not json', 1000000),
+        (2, 9, 'unrelated', 1000000),
+    ])
+    return conn
+
+
+def test_firefox_downloads_pivot_their_annotations():
+    conn = _annotated_places(destination_id=7, metadata_id=3)
+    downloads = read_firefox_downloads(conn, {'tables': ['moz_places', 'moz_annos', 'moz_anno_attributes']})
+    assert [(d['filename'], d['url'], d['download_time_us']) for d in downloads] == [
+        ('a.zip', 'https://x.example/a.zip', 2000000), ('b.pdf', 'https://x.example/b.pdf', 1000000)]
+    assert (downloads[0]['status'], downloads[0]['end_time_us'], downloads[0]['file_size']) == \
+        ('completed', 2500000, 10)
+    # Malformed metadata leaves the defaults
+    assert (downloads[1]['end_time_us'], downloads[1]['file_size']) == (0, 0)
+
+
+def test_firefox_profiles_without_downloads(firefox_places):
+    conn = sqlite3.connect(':memory:')
+    assert read_firefox_downloads(conn, {'tables': []}) == []
+    conn = sqlite3.connect(firefox_places)
+    downloads = read_firefox_downloads(conn, {'tables': ['moz_anno_attributes']})
+    assert len(downloads) == 20
+    assert [d['download_time_us'] for d in downloads] == sorted((d['download_time_us'] for d in downloads),
+                                                                 reverse=True)
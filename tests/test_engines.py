@@ -0,0 +1,74 @@
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from config import Config
+from services import parallel_ingest
+from services.history_processor import process_history_file
+from services.storage import get_processed_data
+from utils.workspace import source_path
+
+COLUMNS = ('visit_ids', 'from_visits', 'transitions', 'parent_positions', 'partition_offsets')
+
+
+def _snapshot(data):
+    store = data['entries']
+    return (list(store.iter_records()), {name: np.asarray(getattr(store, name)).tolist() for name in COLUMNS},
+            data['total_entries'], data['downloads'])
+
+
+@pytest.mark.parametrize('browser_type', ['chrome', 'firefox'])
+@pytest.mark.parametrize('workers', [1, 2])
+def test_parallel_engine_matches_streaming(browser_type, workers, monkeypatch, request, process_profile):
+    db_path = request.getfixturevalue('chrome_history' if browser_type == 'chrome' else 'firefox_places')
+    monkeypatch.setattr(Config, 'INGEST_WORKERS', workers)
+    # Many small rowid ranges, merged out of order
+    monkeypatch.setattr(Config, 'INGEST_CHUNK_ROWS', 250)
+
+    streaming = get_processed_data(process_profile(db_path, 'streamingfile', browser_type, 'streaming'))
+    parallel = get_processed_data(process_profile(db_path, 'parallelfile', browser_type, 'parallel'))
+    assert len(streaming['entries']) == 3000
+    assert _snapshot(parallel) == _snapshot(streaming)
+
+
+def test_rowid_ranges_cover_the_table(chrome_history):
+    ranges = parallel_ingest.rowid_ranges(chrome_history, 'visits', 700)
+    assert ranges[0][0] <= 1 and ranges[-1][1] >= 3000
+    assert all(hi + 1 == next_lo for (_, hi), (next_lo, _) in zip(ranges, ranges[1:]))
+
+
+def test_ingest_pool_is_created_once(monkeypatch):
+    created = []
+
+    class Pool:
+        def __init__(self, **kwargs):
+            # Starting real workers takes a while; other threads arrive meanwhile
+            time.sleep(0.05)
+            created.append(kwargs)
+
+    monkeypatch.setattr(parallel_ingest, '_ingest_pool', None)
+    monkeypatch.setattr(parallel_ingest, 'ProcessPoolExecutor', Pool)
+    with ThreadPoolExecutor(8) as threads:
+        pools = list(threads.map(lambda _: parallel_ingest._get_ingest_pool(), range(32)))
+    assert len(created) == 1 and all(pool is pools[0] for pool in pools)
+
+
+@pytest.mark.parametrize('browser_type', ['chrome', 'firefox'])
+def test_streaming_engine_matches_pandas(browser_type, monkeypatch, request, process_profile):
+    db_path = request.getfixturevalue('chrome_history' if browser_type == 'chrome' else 'firefox_places')
+    pandas_data = get_processed_data(process_profile(db_path, 'pandasfile', browser_type, 'pandas'))
+    # Batches far smaller than the tables, so rows straddle fetchmany() calls
+    monkeypatch.setattr(Config, 'STREAMING_BATCH_SIZE', 7)
+    streaming = get_processed_data(process_profile(db_path, 'streamingfile', browser_type, 'streaming'))
+    assert _snapshot(streaming) == _snapshot(pandas_data)
+    assert len(streaming['downloads']) == 20
+
+
+def test_streaming_engine_returns_the_first_page(chrome_history):
+    shutil.copy(chrome_history, source_path('pagefile'))
+    result = process_history_file(source_path('pagefile'), 'chrome', 'pagefile', 2, 25, engine='streaming')
+    assert result['page'] == 2 and len(result['entries']) == 25
+    assert result['entries'] == get_processed_data('pagefile')['entries'].page(25, 50)
@@ -0,0 +1,107 @@
+import csv
+import gzip
+import json
+
+import pytest
+
+from services import exporters
+from services.exporters import history_chunks, list_chunks, write_export
+from services.storage import get_processed_data
+from utils.time_utils import resolve_timezone
+
+FIELDS = ['url', 'title', 'visit_time', 'visit_timestamp', 'visit_count', 'domain', 'registrable_domain']
+
+
+@pytest.fixture
+def store(chrome_history, process_profile):
+    return get_processed_data(process_profile(chrome_history, 'exportfile'))['entries']
+
+
+def _expected(store, positions=None):
+    records = store.iter_records() if positions is None else store.take(positions)
+    return [{field: record[field] for field in FIELDS} for record in records]
+
+
+def test_column_chunks_match_the_records(store):
+    tz = resolve_timezone('America/New_York')
+    rows = [row for chunk in history_chunks(store, FIELDS, tz, chunk_size=700) for row in chunk]
+    columns = list(history_chunks(store, FIELDS, tz, chunk_size=700, columnar=True))
+    assert len(columns) == 5
+    assert [{field: chunk[field][i] for field in FIELDS} for chunk in columns
+            for i in range(len(chunk['url']))] == rows
+    columns = store.columns(slice(3, 5), ['id', 'missing'])
+    assert columns['id'].tolist() == [store.record(3)['id'], store.record(4)['id']]
+    assert columns['missing'] == [None, None]
+
+
+@pytest.mark.parametrize('export_format', ['csv', 'json', 'ndjson', 'ndjson.gz'])
+def test_text_exports(store, tmp_path, export_format):
+    path = tmp_path / 'export'
+    positions = list(range(0, len(store), 7))
+    assert write_export(export_format, history_chunks(store, FIELDS, chunk_size=100, positions=positions),
+                        FIELDS, str(path)) == len(positions)
+    if export_format == 'csv':
+        with open(path, newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+        expected = [{field: str(value) for field, value in row.items()} for row in _expected(store, positions)]
+    else:
+        text = gzip.decompress(path.read_bytes()).decode() if export_format == 'ndjson.gz' else path.read_text()
+        rows = json.loads(text) if export_format == 'json' else [json.loads(line) for line in text.splitlines()]
+        expected = _expected(store, positions)
+    assert rows == expected
+
+
+@pytest.mark.parametrize('export_format', ['parquet', 'feather'])
+def test_arrow_exports_from_column_chunks(store, tmp_path, export_format):
+    pa = pytest.importorskip('pyarrow')
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    path = str(tmp_path / 'export')
+    assert write_export(export_format, history_chunks(store, FIELDS, chunk_size=1000, columnar=True),
+                        FIELDS, path) == len(store)
+    table = pq.read_table(path) if export_format == 'parquet' else feather.read_table(path)
+    assert table.schema.field('visit_timestamp').type == pa.int64()
+    assert table.to_pylist() == _expected(store)
+
+
+def test_arrow_export_of_row_chunks(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    items = [{'date': '2024-01-01', 'visit_count': 3}, {'date': '2024-01-02', 'visit_count': None}]
+    path = str(tmp_path / 'rows.parquet')
+    assert write_export('parquet', list_chunks(items, ['date', 'visit_count']), ['date', 'visit_count'], path) == 2
+    assert pq.read_table(path).to_pylist() == items
+
+
+def test_arrow_schema_comes_from_the_fields(tmp_path):
+    pa = pytest.importorskip('pyarrow')
+    pq = pytest.importorskip('pyarrow.parquet')
+    # The first chunk's numbers are all null; later chunks have them
+    items = [{'date': '2024-01-01', 'visit_count': None, 'unique_urls': None},
+             {'date': '2024-01-02', 'visit_count': 4, 'unique_urls': 2},
+             {'date': '2024-01-03', 'visit_count': 7, 'unique_urls': None}]
+    fields = ['date', 'visit_count', 'unique_urls']
+    path = str(tmp_path / 'rows.parquet')
+    assert write_export('parquet', list_chunks(items, fields, chunk_size=1), fields, path) == 3
+    table = pq.read_table(path)
+    assert table.schema.field('visit_count').type == pa.int64()
+    assert table.to_pylist() == items
+
+    empty = str(tmp_path / 'empty.parquet')
+    assert write_export('parquet', iter(()), fields, empty) == 0
+    assert pq.read_table(empty).schema.field('unique_urls').type == pa.int64()
+
+
+def test_excel_export_splits_sheets_at_the_row_limit(tmp_path, monkeypatch):
+    openpyxl = pytest.importorskip('openpyxl')
+    monkeypatch.setattr(exporters, 'EXCEL_MAX_ROWS', 3)
+    items = [{'date': f'2024-01-0{day}', 'visit_count': day} for day in range(1, 8)]
+    fields = ['date', 'visit_count']
+    path = str(tmp_path / 'rows.xlsx')
+    assert write_export('excel', list_chunks(items, fields, chunk_size=2), fields, path) == 7
+
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    sheets = [list(sheet.iter_rows(values_only=True)) for sheet in workbook.worksheets]
+    assert [len(rows) for rows in sheets] == [4, 4, 2]
+    assert all(rows[0] == ('date', 'visit_count') for rows in sheets)
+    assert [row for rows in sheets for row in rows[1:]] == [(item['date'], item['visit_count']) for item in items]
@@ -0,0 +1,47 @@
+from collections import Counter
+from datetime import datetime, timezone
+
+import pytest
+
+from services.histogram import build_histogram
+from services.storage import get_processed_data
+
+
+@pytest.fixture
+def file_id(chrome_history, process_profile):
+    return process_profile(chrome_history, 'histogramfile')
+
+
+@pytest.fixture
+def store(file_id):
+    return get_processed_data(file_id)['entries']
+
+
+@pytest.mark.parametrize('bucket', ['minute', 'hour', 'day'])
+def test_fixed_buckets_match_a_full_count(store, bucket):
+    width = {'minute': 60, 'hour': 3600, 'day': 86400}[bucket]
+    epochs = store.epoch_array().tolist()
+    start, end = sorted(epochs)[100], sorted(epochs)[-100]
+    expected = Counter(epoch // width * width for epoch in epochs if start <= epoch <= end)
+    result = build_histogram(store, bucket, start=start, end=end)
+    assert result['total_visits'] == sum(expected.values())
+    assert dict(zip(result['epochs'], result['counts'])) == expected
+    assert result['epochs'] == sorted(expected)
+
+
+def test_weekday_hour_matrix(store):
+    domain = store.count_by_domain()[0][0]
+    result = build_histogram(store, 'weekday_hour', domain=domain)
+    expected = Counter(
+        (datetime.fromtimestamp(epoch, timezone.utc).weekday(), datetime.fromtimestamp(epoch, timezone.utc).hour)
+        for epoch, record in zip(store.epoch_array().tolist(), store) if record['domain'] == domain
+    )
+    assert result['weekdays'][0] == 'Monday'
+    assert {(day, hour): count for day, row in enumerate(result['counts'])
+            for hour, count in enumerate(row) if count} == expected
+
+
+def test_histogram_route(client, file_id, store):
+    result = client.get(f'/histogram?file_id={file_id}&bucket=day').get_json()
+    assert sum(result['counts']) == len(store)
+    assert client.get(f'/histogram?file_id={file_id}&bucket=fortnight').status_code == 400
@@ -0,0 +1,45 @@
+import gzip
+
+import pytest
+
+from config import Config
+from services.storage import get_data_version, update_sync_info
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, monkeypatch):
+    monkeypatch.setattr(Config, 'STORAGE_BACKEND', request.param)
+    return request.param
+
+
+def test_sync_info_revalidates_when_nothing_was_found(backend, client, chrome_history, process_profile):
+    file_id = process_profile(chrome_history, 'syncfile')
+    # A profile without sync data: every request looks for it again
+    update_sync_info(file_id, {})
+    version = get_data_version(file_id)
+
+    first = client.get(f'/get_sync_info?file_id={file_id}')
+    assert first.status_code == 200
+    second = client.get(f'/get_sync_info?file_id={file_id}', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 304
+    # Looking for sync info must not bump the version other endpoints' ETags are built from
+    assert get_data_version(file_id) == version
+
+
+def test_data_endpoints_return_304_for_a_matching_etag(backend, client, chrome_history, process_profile):
+    file_id = process_profile(chrome_history, 'etagfile')
+    for url in (f'/get_page?file_id={file_id}&page=1', f'/get_downloads?file_id={file_id}'):
+        first = client.get(url)
+        assert first.status_code == 200 and first.headers['ETag']
+        assert client.get(url, headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+    # A different timezone is a different representation
+    other = client.get(f'/get_downloads?file_id={file_id}&tz=Europe/Berlin',
+                       headers={'If-None-Match': first.headers['ETag']})
+    assert other.status_code == 200
+
+
+def test_large_responses_are_compressed(client, chrome_history, process_profile):
+    file_id = process_profile(chrome_history, 'gzipfile')
+    response = client.get(f'/get_page?file_id={file_id}&page=1', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert b'"entries"' in gzip.decompress(response.data)
@@ -0,0 +1,80 @@
+import pytest
+
+from config import Config
+from services import ioc_matcher
+from services.ioc_matcher import (IndicatorSet, delete_indicator_list, get_indicator_list,
+                                  list_indicator_lists, match_store, register_indicator_list)
+from services.storage import get_processed_data
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    """An empty indicator list registry per test"""
+    monkeypatch.setattr(ioc_matcher, '_indicator_sets', {})
+
+
+def test_indicator_set_classifies_and_matches():
+    indicators = IndicatorSet(['# comment', 'evil.example', 'hxxp://bad[.]test/payload',
+                               'd41d8cd98f00b204e9800998ecf8427e', 'not an indicator!'])
+    assert indicators.counts() == {'domain': 1, 'url': 1, 'hash': 1}
+    assert indicators.skipped == 1
+    assert indicators.match_host('cdn.evil.example:443') == ['evil.example']
+    assert indicators.match_url('http://bad.test/payload?x=1') == ['bad.test/payload']
+    assert indicators.match_hash('D41D8CD98F00B204E9800998ECF8427E') == ['d41d8cd98f00b204e9800998ecf8427e']
+
+
+def test_lists_are_capped_least_recently_used_first(monkeypatch):
+    monkeypatch.setattr(Config, 'IOC_MAX_LISTS', 2)
+    first = register_indicator_list(['one.example'], 'first')
+    second = register_indicator_list(['two.example'], 'second')
+    assert get_indicator_list(first) is not None
+    third = register_indicator_list(['three.example'], 'third')
+    assert get_indicator_list(second) is None
+    assert {item['list_id'] for item in list_indicator_lists()} == {first, third}
+
+
+def test_idle_lists_expire(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(ioc_matcher.time, 'time', lambda: clock[0])
+    monkeypatch.setattr(Config, 'IOC_LIST_TTL_SECONDS', 60)
+    list_id = register_indicator_list(['evil.example'])
+    clock[0] += 50
+    assert get_indicator_list(list_id) is not None
+    clock[0] += 50
+    assert get_indicator_list(list_id) is not None
+    clock[0] += 61
+    assert get_indicator_list(list_id) is None
+    assert list_indicator_lists() == []
+
+
+def test_delete_drops_the_list_and_its_cached_matches(chrome_history, process_profile):
+    store = get_processed_data(process_profile(chrome_history, 'iocfile'))['entries']
+    list_id = register_indicator_list([store.domains.values[1]])
+    positions, _, _ = match_store(store, get_indicator_list(list_id), list_id)
+    assert len(positions) > 0
+    assert list_id in ioc_matcher._match_cache[store]
+
+    assert delete_indicator_list(list_id)
+    assert get_indicator_list(list_id) is None
+    assert list_id not in ioc_matcher._match_cache[store]
+    assert not delete_indicator_list(list_id)
+
+
+def test_delete_route(client):
+    response = client.post('/ioc/lists', json={'indicators': ['evil.example'], 'name': 'test'})
+    list_id = response.get_json()['list_id']
+    assert client.delete(f'/ioc/lists/{list_id}').get_json() == {'list_id': list_id, 'deleted': True}
+    assert client.get('/ioc/lists').get_json() == {'lists': []}
+    assert client.delete(f'/ioc/lists/{list_id}').status_code == 404
+
+
+def test_non_string_indicators_are_skipped(client, chrome_history, process_profile):
+    response = client.post('/ioc/lists', json={'indicators': ['evil.example', 5, None, {'url': 'x'}]})
+    assert response.status_code == 200
+    assert response.get_json()['counts']['domain'] == 1
+    assert response.get_json()['skipped'] == 3
+
+    file_id = process_profile(chrome_history, 'adhocfile')
+    response = client.post('/ioc/match', json={'file_id': file_id, 'indicators': ['evil.example', 5]})
+    assert response.status_code == 200
+    assert response.get_json()['indicator_counts']['domain'] == 1
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from benchmarks.bench_url_analytics import build_store
+from services.histogram import build_histogram
+from services.visit_store import VisitStore
+
+
+def _store(partitioned):
+    store = build_store(200, 6000)
+    # An out-of-order visit (e.g. a clock change) starts a partition of its own
+    store.visit_micros[100] -= 3 * 86400 * 1000000
+    if partitioned:
+        store.build_partitions('day')
+    return store
+
+
+@pytest.fixture(scope='module')
+def stores():
+    return _store(True), _store(False)
+
+
+def test_partitions_cover_their_runs(stores):
+    store = stores[0]
+    offsets = store.partition_offsets.tolist()
+    assert offsets[0] == 0 and offsets[-1] == len(store)
+    # Four UTC days plus the out-of-order visit between two runs of one day
+    assert len(offsets) - 1 == len(np.unique(store.epoch_array() // 86400)) + 2
+    micros = store.micros_array()
+    for index in range(len(offsets) - 1):
+        run = micros[offsets[index]:offsets[index + 1]]
+        assert run.min() == store.partition_min_micros[index] and run.max() == store.partition_max_micros[index]
+
+
+def test_time_span_contains_every_visit_in_the_window(stores):
+    store = stores[0]
+    epochs = store.epoch_array()
+    rng = np.random.default_rng(1)
+    for start, end in rng.integers(epochs.min() - 3600, epochs.max() + 3600, size=(50, 2)):
+        start, end = int(min(start, end)), int(max(start, end))
+        lo, hi = store.time_span(start, end)
+        inside = np.flatnonzero((epochs >= start) & (epochs <= end))
+        assert not len(inside) or (lo <= inside[0] and inside[-1] < hi)
+    assert store.time_span(int(epochs.max()) + 1, None) == (0, 0)
+    assert stores[1].time_span(0, 1) == (0, len(stores[1]))
+
+
+@pytest.mark.parametrize('bucket', ['hour', 'day'])
+def test_pruned_histograms_match_full_scans(stores, bucket):
+    epochs = stores[0].epoch_array()
+    start, end = int(epochs.min()) + 86400, int(epochs.max()) - 43200
+    assert build_histogram(stores[0], bucket, start=start, end=end) == \
+        build_histogram(stores[1], bucket, start=start, end=end)
+
+
+def test_partitions_survive_save_and_load(stores, tmp_path):
+    stores[0].save(str(tmp_path / 'columns'))
+    loaded = VisitStore.load(str(tmp_path / 'columns'))
+    loaded.ensure_partitions('month')
+    assert np.array_equal(loaded.partition_offsets, stores[0].partition_offsets)
+    with pytest.raises(ValueError):
+        loaded.build_partitions('year')
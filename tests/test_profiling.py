@@ -0,0 +1,84 @@
+import os
+import pstats
+
+import pytest
+
+from config import Config
+from utils.profiling import RequestProfile, list_profiles, phase, profiling_active
+
+TOKEN = 'secret-token'
+
+
+@pytest.fixture
+def file_id(chrome_history, process_profile):
+    return process_profile(chrome_history, 'profiledfile')
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(Config, 'PROFILING_TOKEN', TOKEN)
+
+
+def test_profiling_is_invisible_without_a_token(client, file_id):
+    response = client.get(f'/get_page?file_id={file_id}&profile=cprofile')
+    assert response.status_code == 200 and 'X-Profile-Id' not in response.headers
+    assert client.get('/admin/profiles').status_code == 404
+
+
+def test_profiling_requires_the_admin_token(client, file_id, enabled):
+    # Without the token in its header, profiling parameters are ignored
+    for path, headers in [(f'/get_page?file_id={file_id}&profile=cprofile', {}),
+                          (f'/get_page?file_id={file_id}&profile=cprofile&profile_token={TOKEN}', {}),
+                          (f'/get_page?file_id={file_id}', {'X-Profile': 'cprofile', 'X-Profile-Token': 'wrong'})]:
+        response = client.get(path, headers=headers)
+        assert response.status_code == 200 and 'X-Profile-Id' not in response.headers
+    assert client.get('/admin/profiles', headers={'X-Profile-Token': 'wrong'}).status_code == 403
+    assert client.get(f'/admin/profiles?profile_token={TOKEN}').status_code == 403
+    response = client.get(f'/get_page?file_id={file_id}', headers={'X-Profile': 'trace', 'X-Profile-Token': TOKEN})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('mode', ['cprofile', 'sample'])
+def test_profiled_request_records_phases(client, file_id, enabled, mode):
+    headers = {'X-Profile': mode, 'X-Profile-Token': TOKEN}
+    response = client.get(f'/get_page?file_id={file_id}&page_size=500', headers=headers)
+    assert response.status_code == 200
+    profile_id = response.headers['X-Profile-Id']
+    timings = response.headers['Server-Timing']
+    assert 'load;dur=' in timings and 'serialize;dur=' in timings and 'total;dur=' in timings
+
+    summary = client.get(f'/admin/profiles/{profile_id}', headers=headers).get_json()
+    assert summary['mode'] == mode and summary['path'] == '/get_page'
+    assert {item['name'] for item in summary['phases']} >= {'load', 'serialize'}
+    download = client.get(f'/admin/profiles/{profile_id}/download', headers=headers)
+    assert download.status_code == 200
+    if mode == 'cprofile':
+        path = os.path.join(Config.PROFILE_FOLDER, summary['profile_file'])
+        assert pstats.Stats(path).total_calls > 0
+    assert client.get('/admin/profiles/../etc', headers=headers).status_code == 404
+
+
+def test_phases_nest_and_only_count_while_profiling(enabled):
+    with phase('ignored'):
+        assert not profiling_active()
+
+    profile = RequestProfile('cprofile', 'GET', '/test')
+    profile.start()
+    try:
+        with phase('outer'):
+            with phase('inner'):
+                pass
+    finally:
+        profile.stop()
+    assert [name for name, _ in profile.phases] == ['outer.inner', 'outer']
+    assert not profiling_active()
+
+
+def test_only_the_newest_profiles_are_kept(monkeypatch, enabled):
+    monkeypatch.setattr(Config, 'PROFILE_KEEP', 2)
+    for _ in range(4):
+        profile = RequestProfile('cprofile', 'GET', '/test')
+        profile.start()
+        profile.save(200)
+    assert len(list_profiles()) == 2
+    assert len(os.listdir(Config.PROFILE_FOLDER)) == 4
@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pytest
+
+from config import Config
+from services import progressive
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    """A fresh progressive pool and channel registry per test; the pool is shut down afterwards"""
+    monkeypatch.setattr(progressive, '_executor', None)
+    monkeypatch.setattr(progressive, '_channels', {})
+    yield
+    if progressive._executor is not None:
+        progressive._executor.shutdown(wait=True)
+
+
+def _events(body):
+    return [line.split(': ', 1)[1] for line in body.splitlines() if line.startswith('event: ')]
+
+
+def test_progressive_upload_streams_every_event(client, chrome_history, executor):
+    with open(chrome_history, 'rb') as f:
+        response = client.post('/upload/progressive', data={'file': (f, 'History')},
+                               content_type='multipart/form-data')
+    assert response.status_code == 202
+    events = _events(client.get(response.get_json()['events_url']).get_data(as_text=True))
+    assert events[:3] == ['preview', 'estimate', 'aggregates']
+    assert events[-1] == 'complete'
+
+    file_id = response.get_json()['file_id']
+    page = client.get(f'/get_page?file_id={file_id}&page=1&page_size=10').get_json()
+    assert page['total_entries'] == 3000
+
+
+def test_concurrent_ingests_are_capped(monkeypatch, executor):
+    monkeypatch.setattr(Config, 'PROGRESSIVE_WORKERS', 2)
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    def run(channel, *args):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        channel.publish('complete', {}, final=True)
+
+    monkeypatch.setattr(progressive, '_run', run)
+    channels = [progressive.start_progressive('unused', 'chrome', f'file{n}', 1, 10, None) for n in range(6)]
+    # Queued ingests are already registered, so garbage collection keeps their uploads
+    assert len(progressive.active_file_ids()) >= 4
+    for channel in channels:
+        channel.wait(0, 5)
+    assert all(channel.finished_at is not None for channel in channels)
+    assert peak[0] == 2
+
+
+def test_other_workers_replay_the_progress_log(executor):
+    channel = progressive.ProgressChannel('logged')
+    channel.publish('preview', {'entries': []})
+    # Another worker has no channel in memory; it reads the workspace log
+    log = progressive.get_channel('logged')
+    assert isinstance(log, progressive.ProgressLog)
+    assert log.wait(0, 0) == ([('preview', {'entries': []})], False)
+
+    with open(log.path, 'a') as f:
+        f.write('["aggre')
+    assert log.wait(1, 0) == ([], False)
+    with open(log.path, 'a') as f:
+        f.write('gates",{"visits_processed":5},false]\n')
+    channel.publish('complete', {'total_entries': 5}, final=True)
+    assert log.wait(1, 0) == ([('aggregates', {'visits_processed': 5}), ('complete', {'total_entries': 5})], True)
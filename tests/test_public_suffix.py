@@ -0,0 +1,41 @@
+import pytest
+
+from utils.public_suffix import normalize_host, split_host, split_hosts
+
+HOSTS = [
+    'www.example.co.uk', 'example.co.uk', 'co.uk', 'a.b.c.example.com', 'EXAMPLE.COM.',
+    'user:pw@mail.example.org:8080', 'a.b.kawasaki.jp', 'a.b.city.kawasaki.jp', 'foo.blogspot.com',
+    'localhost', 'test.unknowntld', '192.168.0.1', '[::1]', 'xn--bcher-kva.example', '',
+]
+
+
+@pytest.mark.parametrize('host, expected', [
+    ('www.example.co.uk', ('example.co.uk', 'co.uk')),
+    ('co.uk', ('co.uk', 'co.uk')),
+    ('user:pw@mail.example.org:8080', ('example.org', 'org')),
+    # Wildcard rule *.kawasaki.jp and its exception !city.kawasaki.jp
+    ('a.b.kawasaki.jp', ('a.b.kawasaki.jp', 'b.kawasaki.jp')),
+    ('a.b.city.kawasaki.jp', ('city.kawasaki.jp', 'kawasaki.jp')),
+    # Private section rules count too
+    ('foo.blogspot.com', ('foo.blogspot.com', 'blogspot.com')),
+    ('test.unknowntld', ('test.unknowntld', 'unknowntld')),
+    ('192.168.0.1', ('192.168.0.1', '')),
+    ('[::1]:443', ('[::1]', '')),
+    ('', ('', '')),
+])
+def test_split_host(host, expected):
+    assert split_host(host) == expected
+
+
+def test_normalize_host():
+    assert normalize_host('User@WWW.Example.COM.:443') == 'www.example.com'
+
+
+def test_split_hosts_matches_split_host():
+    hosts = HOSTS + [f'shop{n}.example{n % 7}.co.uk' for n in range(50)] + HOSTS
+    registrable_values, registrable_codes, suffix_values, suffix_codes = split_hosts(hosts)
+    assert [(registrable_values[r], suffix_values[s]) for r, s in zip(registrable_codes, suffix_codes)] == \
+        [split_host(host) for host in hosts]
+    # Codes index distinct values
+    assert len(registrable_values) == len(set(registrable_values))
+    assert split_hosts([])[0] == []
@@ -0,0 +1,25 @@
+import shutil
+import sqlite3
+
+import pytest
+
+from services.schema_detection import detect_browser_type_from_content, get_query_plan
+
+
+@pytest.mark.parametrize('name', ['History', 'what?mode=rw', 'fifty%20percent', 'hash#tag'])
+def test_query_plan_for_paths_with_uri_characters(chrome_history, tmp_path, name):
+    path = tmp_path / 'odd dir' / name
+    path.parent.mkdir()
+    shutil.copy(chrome_history, path)
+    plan = get_query_plan(str(path))
+    assert plan['browser_type'] == 'chrome'
+    assert get_query_plan(str(path)) is plan
+
+
+def test_detects_firefox_and_rejects_non_databases(firefox_places, tmp_path):
+    assert detect_browser_type_from_content(firefox_places) == 'firefox'
+    junk = tmp_path / 'junk.sqlite'
+    junk.write_bytes(b'not a database' * 100)
+    assert detect_browser_type_from_content(str(junk)) is None
+    with pytest.raises(sqlite3.DatabaseError):
+        get_query_plan(str(junk))
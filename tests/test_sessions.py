@@ -0,0 +1,65 @@
+import pytest
+
+from config import Config
+from services import sessions
+from services.sessions import get_navigation_tree, get_sessions, session_bounds
+from services.storage import get_processed_data
+
+
+@pytest.fixture
+def store(chrome_history, process_profile):
+    return get_processed_data(process_profile(chrome_history, 'sessionfile'))['entries']
+
+
+def _brute_force(store, gap_minutes):
+    micros = store.micros_array().tolist()
+    bounds, start = [], 0
+    for i in range(1, len(micros)):
+        if micros[i - 1] - micros[i] > gap_minutes * 60 * 1000000:
+            bounds.append((start, i))
+            start = i
+    return bounds + [(start, len(micros))]
+
+
+@pytest.mark.parametrize('gap_minutes', [None, 1, 5, 240])
+def test_sessions_split_on_idle_gaps(store, gap_minutes):
+    starts, ends = session_bounds(store, gap_minutes)
+    assert list(zip(starts.tolist(), ends.tolist())) == \
+        _brute_force(store, gap_minutes or Config.SESSION_GAP_MINUTES)
+
+
+def test_only_the_default_gap_is_cached(store, monkeypatch):
+    for gap_minutes in range(1, 50):
+        session_bounds(store, gap_minutes)
+    default = session_bounds(store)
+    assert sessions._cache[store] == (Config.SESSION_GAP_MINUTES, default)
+    assert session_bounds(store, Config.SESSION_GAP_MINUTES) is default
+
+    monkeypatch.setattr(Config, 'SESSION_GAP_MINUTES', 5)
+    assert session_bounds(store) is not default
+    assert sessions._cache[store][0] == 5
+
+
+def test_navigation_trees_cover_the_session(store):
+    result = get_sessions(store, page_size=100000, gap_minutes=5)
+    assert result['total_sessions'] == len(result['sessions'])
+    session = max(result['sessions'], key=lambda item: item['visit_count'])
+    tree = get_navigation_tree(store, 'chrome', session['session_id'], page_size=100000, gap_minutes=5)
+
+    def count(nodes):
+        return sum(1 + count(node['children']) for node in nodes)
+
+    assert tree['total_roots'] == len(tree['trees']) == session['root_count']
+    assert count(tree['trees']) == tree['total_visits'] == session['visit_count']
+    with pytest.raises(KeyError):
+        get_navigation_tree(store, 'chrome', result['total_sessions'])
+
+
+def test_session_routes(client, chrome_history, process_profile):
+    file_id = process_profile(chrome_history, 'sessionroutes')
+    response = client.get(f'/sessions?file_id={file_id}&page_size=2&gap_minutes=10')
+    assert response.status_code == 200
+    assert response.get_json()['gap_minutes'] == 10
+    assert client.get(f'/sessions?file_id={file_id}&gap_minutes=0').status_code == 400
+    assert client.get(f'/sessions/tree?file_id={file_id}&session_id=0').status_code == 200
+    assert client.get(f'/sessions/tree?file_id={file_id}&session_id=100000').status_code == 400
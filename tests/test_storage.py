@@ -0,0 +1,148 @@
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from config import Config
+from services import history_processor, storage
+from services.shared_storage import SQLiteSharedStore
+from utils.single_flight import SingleFlight
+
+
+def test_shared_store_versions_increase(tmp_path):
+    store = SQLiteSharedStore(str(tmp_path / 'shared.sqlite'))
+    assert store.get('a') is None and store.version('a') is None
+    assert store.put('a', {'n': 1}) == 1
+    assert store.put('a', {'n': 2}) == 2
+    assert store.put('b', {'n': 3}) == 1
+    # Another worker's connection sees the same records
+    other = SQLiteSharedStore(store.db_path)
+    assert other.get('a') == (2, {'n': 2, 'sync_info': {}, 'version': 2, 'payload_version': 2})
+    assert sorted(other.list_ids()) == ['a', 'b']
+
+
+def test_sync_info_is_stored_beside_the_payload(tmp_path, monkeypatch):
+    store = SQLiteSharedStore(str(tmp_path / 'shared.sqlite'))
+    connections = []
+    connect = store._connect
+    monkeypatch.setattr(store, '_connect', lambda: connections.append(connect()) or connections[-1])
+
+    store.put('a', {'n': 1, 'sync_info': {'old': True}})
+    assert store.put_sync_info('a', {'accounts': []}) == 2
+    assert store.put_sync_info('missing', {}) is None
+    # A worker holding payload version 1 gets the small fields only
+    assert store.get('a', payload_version=1) == (2, {'sync_info': {'accounts': []}, 'version': 2,
+                                                     'payload_version': 1})
+    assert store.get('a') == (2, {'n': 1, 'sync_info': {'accounts': []}, 'version': 2, 'payload_version': 1})
+    store.version('a')
+    store.list_ids()
+
+    for conn in connections:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+
+
+def test_concurrent_puts_never_reuse_a_version(tmp_path):
+    path = str(tmp_path / 'shared.sqlite')
+    SQLiteSharedStore(path)
+    with ThreadPoolExecutor(8) as pool:
+        versions = list(pool.map(lambda n: SQLiteSharedStore(path).put('file', {'n': n}), range(40)))
+    assert sorted(versions) == list(range(1, 41))
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_records_round_trip_through_each_backend(backend, monkeypatch, chrome_history, process_profile):
+    monkeypatch.setattr(Config, 'STORAGE_BACKEND', backend)
+    file_id = process_profile(chrome_history, f'{backend}file')
+    data = storage.get_processed_data(file_id)
+    version = storage.get_data_version(file_id)
+    entries = list(data['entries'].iter_records())
+
+    # Another process (or this one after eviction) reloads the stored copy
+    storage.processed_files.clear()
+    assert storage.file_exists(file_id)
+    reloaded = storage.get_processed_data(file_id)
+    assert reloaded['version'] == version
+    assert list(reloaded['entries'].iter_records()) == entries
+
+    storage.update_sync_info(file_id, {'accounts': []})
+    assert storage.get_data_version(file_id) > version
+    assert storage.get_processed_data(file_id)['sync_info'] == {'accounts': []}
+
+    if backend == 'sqlite':
+        # Other workers see the new sync info and keep the visits they have loaded
+        held = storage.processed_files[file_id]
+        storage.processed_files[file_id] = dict(held, version=version, sync_info={})
+        refreshed = storage.get_processed_data(file_id)
+        assert refreshed['sync_info'] == {'accounts': []}
+        assert refreshed['entries'] is held['entries']
+
+
+def test_single_flight_shares_one_call():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'done'
+
+    with ThreadPoolExecutor(4) as pool:
+        leader = pool.submit(flight.do, 'key', slow)
+        started.wait(5)
+        followers = [pool.submit(flight.do, 'key', slow) for _ in range(3)]
+        # Let the followers reach the in-flight call before it finishes
+        time.sleep(0.2)
+        release.set()
+        assert leader.result() == 'done'
+        assert [future.result() for future in followers] == ['done'] * 3
+    assert flight.in_flight() == []
+    assert len(calls) == 1
+
+
+def test_single_flight_shares_errors():
+    def fail():
+        raise RuntimeError('failed')
+
+    flight = SingleFlight()
+    with pytest.raises(RuntimeError):
+        flight.do('key', fail)
+    assert flight.in_flight() == []
+
+
+def test_ensure_processed_reprocesses_an_evicted_upload(monkeypatch, chrome_history, process_profile):
+    monkeypatch.setattr(Config, 'COLUMN_CACHE', False)
+    file_id = process_profile(chrome_history, 'evictedfile')
+    storage.processed_files.clear()
+    assert not storage.file_exists(file_id)
+
+    parsed = []
+    process = history_processor.process_history_file
+    monkeypatch.setattr(history_processor, 'process_history_file',
+                        lambda *args, **kwargs: parsed.append(args) or process(*args, **kwargs))
+    with ThreadPoolExecutor(4) as pool:
+        assert all(pool.map(lambda _: history_processor.ensure_processed(file_id), range(4)))
+    assert len(parsed) == 1
+    assert history_processor.ensure_processed('missingfile') is False
+
+
+def test_workers_pick_up_records_stored_by_another_worker(monkeypatch, chrome_history, process_profile):
+    monkeypatch.setattr(Config, 'STORAGE_BACKEND', 'sqlite')
+    file_id = process_profile(chrome_history, 'sharedfile')
+    assert storage.list_file_ids() == [file_id]
+    local = storage.get_processed_data(file_id)
+
+    # Another worker process updates the record through its own connection
+    other = SQLiteSharedStore(Config.STORAGE_DB_PATH)
+    version, record = other.get(file_id)
+    record['browser_type'] = 'edge'
+    assert other.put(file_id, record) == version + 1
+
+    refreshed = storage.get_processed_data(file_id)
+    assert refreshed is not local
+    assert refreshed['browser_type'] == 'edge' and refreshed['version'] == version + 1
+    assert storage.get_processed_data(file_id) is refreshed
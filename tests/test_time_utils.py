@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from services.serializers import serialize_sync_info
+from services.storage import get_processed_data
+from services.sync_info import extract_chrome_sync_info
+from utils.time_utils import (CHROME_EPOCH_OFFSET_US, chrome_time_to_datetime, chrome_time_to_unix_micros,
+                              format_epoch_micros, resolve_timezone)
+
+
+def test_chrome_times_convert_to_unix_micros():
+    micros = 1700000000123456
+    assert chrome_time_to_unix_micros(micros + CHROME_EPOCH_OFFSET_US) == micros
+    assert chrome_time_to_unix_micros(str(micros + CHROME_EPOCH_OFFSET_US)) == micros
+    for missing in (0, None, '', 'garbage'):
+        assert chrome_time_to_unix_micros(missing) == 0
+    assert chrome_time_to_datetime(micros + CHROME_EPOCH_OFFSET_US) == '2023-11-14 22:13:20'
+
+
+def test_formatting_in_a_timezone():
+    micros = 1700000000123456
+    assert format_epoch_micros(micros) == '2023-11-14 22:13:20'
+    assert format_epoch_micros(micros, resolve_timezone('Asia/Tokyo')) == '2023-11-15 07:13:20'
+    assert format_epoch_micros(0) == ''
+    with pytest.raises(ValueError):
+        resolve_timezone('Not/AZone')
+
+
+def test_stored_visit_times_are_integer_micros(chrome_history, process_profile):
+    store = get_processed_data(process_profile(chrome_history, 'timefile'))['entries']
+    record = store.record(0, resolve_timezone('America/New_York'))
+    assert isinstance(record['visit_timestamp'], int)
+    assert store.micros_array().dtype.kind == 'i'
+    assert record['visit_time'] == format_epoch_micros(record['visit_timestamp'], resolve_timezone('America/New_York'))
+    assert (store.epoch_array() == store.micros_array() // 1000000).all()
+
+
+def test_chrome_sync_times_are_stored_as_micros(tmp_path):
+    micros = 1700000000123456
+    with open(tmp_path / 'Preferences', 'w') as f:
+        json.dump({'sync': {'first_setup_complete': True, 'first_setup_time': str(micros + CHROME_EPOCH_OFFSET_US),
+                            'last_synced_time': str(micros + 3600000000 + CHROME_EPOCH_OFFSET_US)}}, f)
+    sync_info = extract_chrome_sync_info(str(tmp_path / 'History'))
+    assert sync_info['sync_settings']['first_sync_time_us'] == micros
+    assert sync_info['account_info']['last_sync_time_us'] == micros + 3600000000
+
+    serialized = serialize_sync_info(sync_info, resolve_timezone('Asia/Tokyo'))
+    assert serialized['sync_settings']['first_sync_time'] == '2023-11-15 07:13:20'
+    assert serialized['sync_settings']['last_sync_time'] == '2023-11-15 08:13:20'
+    assert serialized['account_info']['last_sync_time'] == '2023-11-15 08:13:20'
+    assert 'first_sync_time' not in sync_info['sync_settings']
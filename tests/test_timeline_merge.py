@@ -0,0 +1,44 @@
+import pytest
+
+from services.storage import get_processed_data
+from services.timeline_merge import merge_timelines
+
+
+@pytest.fixture
+def file_ids(chrome_history, firefox_places, process_profile):
+    return [process_profile(chrome_history, 'chromefile'),
+            process_profile(firefox_places, 'firefoxfile', 'firefox'),
+            process_profile(chrome_history, 'chromecopy')]
+
+
+def _full_merge(file_ids):
+    """Every visit of every profile, sorted newest first (ties by profile order)"""
+    visits = []
+    for index, file_id in enumerate(file_ids):
+        store = get_processed_data(file_id)['entries']
+        visits += [(store.visit_micros[position], -index, position, file_id) for position in range(len(store))]
+    return [(file_id, position) for _, _, position, file_id in sorted(visits, reverse=True)]
+
+
+@pytest.mark.parametrize('page_size', [1, 333, 1000])
+def test_pages_match_a_full_sort(file_ids, page_size):
+    expected = _full_merge(file_ids)
+    first = merge_timelines(file_ids, 1, page_size)
+    assert first['total_entries'] == len(expected) == 9000
+    for page in (1, 2, first['total_pages'] // 2, first['total_pages']):
+        result = merge_timelines(file_ids, page, page_size)
+        offset = (page - 1) * page_size
+        stores = {file_id: get_processed_data(file_id)['entries'] for file_id in file_ids}
+        assert [(entry['file_id'], entry['visit_timestamp']) for entry in result['entries']] == [
+            (file_id, stores[file_id].visit_micros[position])
+            for file_id, position in expected[offset:offset + page_size]
+        ]
+
+
+def test_route_tags_entries_with_their_profile(client, file_ids):
+    response = client.get(f"/timeline?file_ids={','.join(file_ids[:2])}&labels=work,home&page_size=50")
+    result = response.get_json()
+    assert [profile['profile'] for profile in result['profiles']] == ['work', 'home']
+    assert {entry['profile'] for entry in result['entries']} <= {'work', 'home'}
+    assert client.get('/timeline?file_ids=chromefile,nosuchfile').status_code == 400
+    assert client.get('/timeline').status_code == 400
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from benchmarks.bench_url_analytics import build_store
+from config import Config
+from services import timeline_rollup as rollup_module
+from services.timeline_rollup import estimate, timeline_rollup
+
+
+@pytest.fixture(scope='module')
+def stores():
+    # Two profiles with different visit mixes over the same URLs
+    return [build_store(5000, 60000, seed) for seed in (1, 2)]
+
+
+def _relative_errors(approx, exact, key):
+    return [abs(a[key] - e[key]) / e[key] for a, e in zip(approx['timeline'], exact['timeline']) if e[key]]
+
+
+@pytest.mark.parametrize('interval', ['day', 'week', 'month'])
+def test_approx_agrees_with_exact_within_the_relative_error(stores, interval):
+    exact = timeline_rollup(stores, interval=interval, mode='exact')
+    approx = timeline_rollup(stores, interval=interval, mode='approx')
+    bound = approx['relative_error']
+
+    assert approx['total_visits'] == exact['total_visits'] == sum(len(store) for store in stores)
+    assert [row['date'] for row in approx['timeline']] == [row['date'] for row in exact['timeline']]
+    assert [row['visit_count'] for row in approx['timeline']] == [row['visit_count'] for row in exact['timeline']]
+    for key in ('unique_urls', 'unique_domains'):
+        assert abs(approx[key] - exact[key]) <= 4 * bound * exact[key]
+        errors = _relative_errors(approx, exact, key)
+        assert np.median(errors) <= 2 * bound
+        assert max(errors) <= 5 * bound
+
+
+def test_windows_are_widened_to_whole_days(stores):
+    epochs = stores[0].epoch_array()
+    start, end = int(epochs[-1]) + 3600, int(epochs[0]) - 3600
+    approx = timeline_rollup(stores, start, end, mode='approx')
+    exact = timeline_rollup(stores, approx['start'], approx['end'], mode='exact')
+    assert approx['start'] <= start and approx['end'] >= end
+    assert approx['total_visits'] == exact['total_visits']
+
+
+def test_estimate_of_empty_and_small_sketches():
+    precision = 8
+    registers = np.zeros(1 << precision, dtype=np.uint8)
+    histogram = np.bincount(registers, minlength=66 - precision)
+    assert estimate(histogram).tolist() == [0]
+    registers[:10] = 1
+    assert estimate(np.bincount(registers, minlength=66 - precision)).tolist() == [10]
+
+
+def test_sketches_are_built_outside_the_lock_and_rebuilt_per_precision(monkeypatch):
+    store = build_store(100, 1000)
+    built = []
+
+    class Sketches(rollup_module.DaySketches):
+        def __init__(self, store, precision):
+            assert not rollup_module._cache_lock.locked()
+            built.append(precision)
+            super().__init__(store, precision)
+
+    monkeypatch.setattr(rollup_module, 'DaySketches', Sketches)
+    first = rollup_module._sketches(store)
+    assert rollup_module._sketches(store) is first
+    monkeypatch.setattr(Config, 'HLL_PRECISION', Config.HLL_PRECISION - 2)
+    assert rollup_module._sketches(store).precision == Config.HLL_PRECISION
+    assert built == [Config.HLL_PRECISION + 2, Config.HLL_PRECISION]
+
+
+def test_visit_selection_requires_exact_mode(stores):
+    with pytest.raises(ValueError):
+        timeline_rollup(stores, mode='approx', positions=[np.arange(10), np.arange(10)])
+    assert timeline_rollup(stores, positions=[np.arange(10), np.arange(0)])['total_visits'] == 10
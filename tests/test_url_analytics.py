@@ -0,0 +1,51 @@
+from collections import Counter
+
+import pytest
+
+from services import url_analytics
+from services.storage import get_processed_data
+from services.url_analytics import top_values
+
+
+@pytest.fixture
+def store(chrome_history, process_profile):
+    return get_processed_data(process_profile(chrome_history, 'analyticsfile'))['entries']
+
+
+def test_exact_top_domains_match_a_full_count(store):
+    counts = Counter(record['domain'] for record in store.iter_records())
+    result = top_values(store, 'domain', n=5, mode='exact')
+    assert result['total_visits'] == len(store)
+    assert [(item['value'], item['count']) for item in result['items']] == \
+        sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:5]
+
+
+def test_approx_counts_bound_the_exact_ones(store):
+    exact = {item['value']: item['count'] for item in top_values(store, 'domain', n=1000, mode='exact')['items']}
+    approx = top_values(store, 'domain', n=5, mode='approx')
+    assert approx['total_visits'] == len(store)
+    for item in approx['items']:
+        assert item['lower_bound'] <= exact[item['value']] <= item['count']
+        assert item['count'] - exact[item['value']] <= approx['error_bound']
+
+
+def test_cached_builds_outside_the_lock(store):
+    def build():
+        # Other stores' and keys' lookups must not wait for this build
+        assert not url_analytics._cache_lock.locked()
+        return object()
+
+    first = url_analytics._cached(store, 'test', build)
+    assert url_analytics._cached(store, 'test', build) is first
+
+
+def test_auto_counts_small_windows_exactly(store, monkeypatch):
+    monkeypatch.setattr(url_analytics.Config, 'ANALYTICS_SKETCH_THRESHOLD', 100)
+    epochs = store.epoch_array()
+    newest = int(epochs.max())
+    assert top_values(store, 'domain', n=5)['mode'] == 'approx'
+    # One hour lies inside a single day bucket; sketches would widen it to the whole day
+    hour = top_values(store, 'domain', n=5, start=newest - 3600, end=newest)
+    assert hour['mode'] == 'exact'
+    assert hour['start'] == newest - 3600
+    assert hour['total_visits'] == int(((epochs >= newest - 3600) & (epochs <= newest)).sum())
@@ -0,0 +1,78 @@
+import csv
+import io
+
+import numpy as np
+import pytest
+
+from services.storage import get_processed_data
+from services.visit_query import parse_filters, select_visits
+from utils.time_utils import resolve_timezone
+
+
+def _brute_force(store, filters):
+    selected = []
+    for position, record in enumerate(store.iter_records()):
+        seconds = record['visit_timestamp'] // 1000000
+        if 'start' in filters and seconds < filters['start']:
+            continue
+        if 'end' in filters and seconds > filters['end']:
+            continue
+        if 'domain' in filters and record['domain'] != filters['domain']:
+            continue
+        if 'registrable_domain' in filters and record['registrable_domain'] != filters['registrable_domain']:
+            continue
+        if 'search' in filters and filters['search'] not in f"{record['url']} {record['title']}".lower():
+            continue
+        selected.append(position)
+    return selected
+
+
+@pytest.fixture
+def store(chrome_history, process_profile):
+    return get_processed_data(process_profile(chrome_history, 'queryfile'))['entries']
+
+
+def test_select_visits_matches_a_full_scan(store):
+    epochs = store.epoch_array()
+    middle = int(np.median(epochs))
+    # Bounds on exact visit times check both ends are inclusive
+    cases = [
+        {},
+        {'start': middle},
+        {'end': middle},
+        {'start': int(epochs[len(epochs) // 3]), 'end': int(epochs[len(epochs) // 5])},
+        {'domain': store.domains.values[0]},
+        {'registrable_domain': store.registrable_domains.values[0], 'end': middle},
+        {'search': 'section1', 'start': middle},
+        {'domain': 'missing.example'},
+    ]
+    for filters in cases:
+        assert select_visits(store, filters).tolist() == _brute_force(store, filters), filters
+
+
+def test_parse_filters():
+    tz = resolve_timezone('UTC')
+    assert parse_filters({'start_date': '2023-01-02', 'end_date': '2023-01-02', 'search': ' Foo '}, tz) == {
+        'start': 1672617600, 'end': 1672703999, 'search': 'foo'}
+    with pytest.raises(ValueError):
+        parse_filters({'status': 'complete'}, tz)
+    with pytest.raises(ValueError):
+        parse_filters({'start': 'yesterday'}, tz)
+
+
+def test_timeline_export_applies_the_front_end_filters(client, chrome_history, process_profile):
+    file_id = process_profile(chrome_history, 'timelinefile')
+    store = get_processed_data(file_id)['entries']
+
+    def export(filters):
+        response = client.post('/api/export', json={'file_id': file_id, 'format': 'csv', 'data_type': 'timeline',
+                                                    'filters': filters})
+        assert response.status_code == 200, response.get_json()
+        return list(csv.DictReader(io.StringIO(response.data.decode('utf-8'))))
+
+    everything = export({})
+    assert sum(int(row['visit_count']) for row in everything) == len(store)
+    searched = export({'search': 'section1'})
+    assert sum(int(row['visit_count']) for row in searched) == len(_brute_force(store, {'search': 'section1'}))
+    dated = export({'start_date': everything[1]['date'], 'end_date': everything[1]['date']})
+    assert dated == [everything[1]]
@@ -0,0 +1,91 @@
+import os
+import shutil
+import sqlite3
+
+import numpy as np
+import pytest
+
+from services import storage
+from services.history_processor import process_history_file
+from services.visit_store import VisitStore
+from utils.workspace import source_path
+
+
+def test_missing_values_become_empty_strings_and_zero():
+    store = VisitStore.from_records([
+        {'id': 1, 'url': 'https://a.example/x', 'title': float('nan'), 'visit_count': float('nan'),
+         'visit_time_us': 2000000, 'domain': 'a.example'},
+        {'id': 2, 'url': 'https://b.example/', 'title': None, 'visit_count': None,
+         'visit_time_us': 1000000, 'domain': None},
+    ])
+    assert store.titles.values == ['']
+    assert list(store.url_visit_counts) == [0, 0]
+    assert store.record(1)['domain'] == ''
+
+
+def test_save_and_load_round_trip(tmp_path):
+    store = VisitStore.from_records([
+        {'id': 1, 'url': 'https://a.example/x', 'title': 'A', 'visit_count': 3, 'visit_time_us': 5000000,
+         'domain': 'a.example'},
+        {'id': 2, 'url': 'https://b.example/', 'title': 'B', 'visit_count': 1, 'visit_time_us': 4000000,
+         'domain': 'b.example'},
+    ])
+    store.link_parents()
+    store.link_registrable_domains()
+    store.build_partitions()
+    store.save(str(tmp_path / 'columns'))
+
+    loaded = VisitStore.load(str(tmp_path / 'columns'))
+    assert list(loaded.iter_records()) == list(store.iter_records())
+    assert np.array_equal(loaded.micros_array(), store.micros_array())
+
+
+def test_failed_save_removes_its_staging_directory(tmp_path):
+    store = VisitStore.from_records([{'id': 1, 'url': 'https://a.example/', 'title': 'A', 'visit_time_us': 1}])
+    store.titles.values[0] = 1.5  # not encodable
+    workspace = tmp_path / 'workspace'
+    workspace.mkdir()
+    with pytest.raises(AttributeError):
+        store.save(str(workspace / 'columns'))
+    assert os.listdir(workspace) == []
+
+
+def test_null_titles_survive_the_column_cache(chrome_history):
+    source = source_path('nulltitles')
+    shutil.copy(chrome_history, source)
+    conn = sqlite3.connect(source)
+    conn.execute("UPDATE urls SET title = NULL WHERE id % 2 = 0")
+    conn.commit()
+    conn.close()
+
+    result = process_history_file(source, 'chrome', 'nulltitles', engine='pandas')
+    assert 'error' not in result
+    # Evict the in-memory copy, as after a restart; the record pages back in from the cache
+    storage.processed_files.clear()
+    data = storage.get_processed_data('nulltitles')
+    assert data is not None
+    assert all(isinstance(title, str) for title in data['entries'].titles.values)
+    assert not [name for name in os.listdir(os.path.dirname(source)) if '.tmp-' in name]
+
+
+def test_urls_titles_and_domains_are_stored_once():
+    calls = []
+
+    def domain(url):
+        calls.append(url)
+        return url.split('/')[2]
+
+    store = VisitStore()
+    store.append_visits([
+        (1, 'https://a.example/x', 'Same', 2, 3000000, 11, 0, 0),
+        (2, 'https://a.example/y', 'Same', 1, 2000000, 12, 11, 0),
+        (1, 'https://a.example/x', 'Same', 2, 1000000, 13, 0, 0),
+    ], domain)
+    assert store.url_values == ['https://a.example/x', 'https://a.example/y']
+    assert store.titles.values == ['Same'] and store.domains.values == ['a.example']
+    assert list(store.url_codes) == [0, 1, 0]
+    # The domain of a URL is derived once, not per visit
+    assert calls == ['https://a.example/x', 'https://a.example/y']
+    assert [record['url'] for record in store] == ['https://a.example/x', 'https://a.example/y', 'https://a.example/x']
+    assert store.domains.lookup('a.example') == 0 and store.domains.lookup('b.example') == -1
+    assert store.count_by_domain() == [('a.example', 3)]
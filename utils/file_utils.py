@@ -1,6 +1,9 @@
 import os
+import sqlite3
 import uuid
+from urllib.request import pathname2url
 from config import Config
+from utils.workspace import source_path, export_path
 
 def ensure_upload_directory():
     """Create upload folder if it doesn't exist"""
@@ -15,13 +18,21 @@ def generate_file_id():
     return file_id
 
 def get_temp_file_path(file_id):
-    """Get the path to the temporary file"""
-    return os.path.join(Config.UPLOAD_FOLDER, f"{file_id}.db")
+    """Get the path to the uploaded database in the file's workspace"""
+    return source_path(file_id)
 
 def get_csv_file_path(file_id, type_suffix=""):
-    """Get the path to a CSV file for export"""
+    """Get the path to a CSV file for export in the file's workspace"""
     suffix = f"_{type_suffix}" if type_suffix else ""
-    return os.path.join(Config.UPLOAD_FOLDER, f"{file_id}{suffix}.csv")
+    return export_path(file_id, f"{file_id}{suffix}.csv")
+
+def get_export_file_path(file_id, type_suffix, extension):
+    """Get the path to an export file in the given format in the file's workspace"""
+    return export_path(file_id, f"{file_id}_{type_suffix}.{extension}")
+
+def connect_readonly(file_path):
+    """Open a SQLite database read-only, so concurrent readers never take write locks or create journals"""
+    return sqlite3.connect(f"file:{pathname2url(os.path.abspath(file_path))}?mode=ro", uri=True)
 
 def detect_browser_type(filename):
     """Determine browser type based on file name"""
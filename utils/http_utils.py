@@ -0,0 +1,81 @@
+"""
+Conditional and compressed JSON responses for the data endpoints.
+
+Responses carry a strong ETag derived from the file_id, the stored
+dataset version and the normalized query parameters, so a repeated
+request can be answered with 304 Not Modified before any serialization
+work is done. Bodies above Config.COMPRESSION_MIN_SIZE are compressed
+with brotli (if installed) or gzip, depending on Accept-Encoding.
+"""
+import gzip
+import hashlib
+import json
+from flask import request, jsonify, Response
+from config import Config
+from utils.profiling import phase
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Preferred first when the client accepts several encodings
+_ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def make_etag(file_id, version, **params):
+    """Build a strong ETag from a file_id, its dataset version and the query parameters"""
+    key = json.dumps([file_id, version, sorted((name, str(value)) for name, value in params.items())])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+
+def _etag_variants(etag):
+    """The ETag of every representation (identity, br, gzip) of a response"""
+    return [etag] + [f"{etag}-{encoding}" for encoding in _ENCODINGS]
+
+
+def _set_cache_headers(response, etag):
+    response.set_etag(etag)
+    # Cache, but revalidate with If-None-Match on every use
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def not_modified(etag):
+    """Return a 304 response if the request's If-None-Match matches etag, else None"""
+    if_none_match = request.if_none_match
+    if not if_none_match:
+        return None
+    for variant in _etag_variants(etag):
+        if if_none_match.contains(variant) or if_none_match.star_tag:
+            return _set_cache_headers(Response(status=304), variant)
+    return None
+
+
+def _compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=Config.COMPRESSION_LEVEL_BROTLI)
+    return gzip.compress(body, compresslevel=Config.COMPRESSION_LEVEL_GZIP)
+
+
+def json_response(payload, etag=None):
+    """jsonify payload, compressing large bodies and attaching cache headers when etag is given"""
+    with phase('encode_json'):
+        response = jsonify(payload)
+        body = response.get_data()
+
+    encoding = None
+    if len(body) >= Config.COMPRESSION_MIN_SIZE:
+        encoding = request.accept_encodings.best_match(_ENCODINGS)
+    if encoding:
+        with phase('compress'):
+            response.set_data(_compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+
+    if etag is None:
+        if encoding:
+            response.vary.add('Accept-Encoding')
+        return response
+    # Each encoding is a different representation, so it gets its own strong ETag
+    return _set_cache_headers(response, f"{etag}-{encoding}" if encoding else etag)
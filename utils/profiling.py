@@ -0,0 +1,262 @@
+"""
+Opt-in profiling of single requests, with per-phase timings.
+
+A RequestProfile runs one request under a profiler:
+
+    sample    a background thread records the request thread's stack every
+              PROFILE_SAMPLE_INTERVAL_MS; written in folded-stack format
+              ("outer;inner;leaf <samples>" per line), which flamegraph.pl,
+              speedscope and inferno read directly
+    cprofile  the deterministic cProfile profiler; written as a pstats file
+              (snakeviz, flameprof, gprof2dot)
+
+phase(name) times a block of processing code while a profile is active in
+the current context and does nothing otherwise, so processors mark their
+phases unconditionally. Nested phases are recorded as "outer.inner".
+
+Each finished profile is stored in Config.PROFILE_FOLDER as <id>.json (the
+summary: phases, functions with the most self time) next to the profile file itself; only
+the newest Config.PROFILE_KEEP are kept.
+"""
+import contextvars
+import cProfile
+import hmac
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from config import Config
+
+PROFILE_MODES = ('sample', 'cprofile')
+
+# Profile file written per mode
+PROFILE_EXTENSIONS = {'sample': 'folded', 'cprofile': 'prof'}
+
+# Functions listed in a profile summary, by self time
+TOP_FUNCTIONS = 25
+
+_PROFILE_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+# Profile of the request running in this context, if any
+_active = contextvars.ContextVar('request_profile', default=None)
+
+
+def token_matches(token):
+    """Whether token is the configured admin token; always False when profiling is disabled"""
+    if not Config.PROFILING_TOKEN or not token:
+        return False
+    return hmac.compare_digest(str(token).encode('utf-8'), Config.PROFILING_TOKEN.encode('utf-8'))
+
+
+def profiling_active():
+    """Whether the current request is being profiled"""
+    return _active.get() is not None
+
+
+@contextmanager
+def phase(name):
+    """Record the duration of a named processing phase of the profiled request"""
+    profile = _active.get()
+    if profile is None:
+        yield
+        return
+    profile._stack.append(name)
+    label = '.'.join(profile._stack)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.phases.append((label, time.perf_counter() - started))
+        profile._stack.pop()
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    module = frame.f_globals.get('__name__', os.path.basename(code.co_filename))
+    return f"{module}:{getattr(code, 'co_qualname', code.co_name)}".replace(';', ':')
+
+
+class _Sampler(threading.Thread):
+    """Counts the folded stacks of one thread, sampled at a fixed interval"""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            if labels:
+                self.stacks[';'.join(reversed(labels))] += 1
+
+    def finish(self):
+        self._done.set()
+        self.join()
+
+
+class RequestProfile:
+    """Profiler, phase timings and summary of one request"""
+
+    def __init__(self, mode, method, path):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unsupported profile mode: {mode}. Use one of {', '.join(PROFILE_MODES)}")
+        self.id = uuid.uuid4().hex
+        self.mode = mode
+        self.method = method
+        self.path = path
+        self.phases = []
+        self.duration = None
+        self._stack = []
+        self._profiler = None
+        self._sampler = None
+
+    def start(self):
+        """Start profiling the calling thread"""
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        _active.set(self)
+        if self.mode == 'cprofile':
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._sampler = _Sampler(threading.get_ident(), Config.PROFILE_SAMPLE_INTERVAL_MS / 1000)
+            self._sampler.start()
+
+    def stop(self):
+        """Stop profiling; safe to call more than once"""
+        if self.duration is not None:
+            return
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self._sampler is not None:
+            self._sampler.finish()
+        self.duration = time.perf_counter() - self._started
+        _active.set(None)
+
+    def server_timing(self):
+        """Server-Timing header value: every phase plus the total, in milliseconds"""
+        metrics = [f"{re.sub(r'[^A-Za-z0-9_.-]', '_', name)};dur={seconds * 1000:.1f}" for name, seconds in self.phases]
+        metrics.append(f"total;dur={(self.duration or 0) * 1000:.1f}")
+        return ', '.join(metrics)
+
+    def _top_functions(self):
+        if self.mode == 'cprofile':
+            stats = pstats.Stats(self._profiler).stats
+            ranked = sorted(stats.items(), key=lambda item: -item[1][2])[:TOP_FUNCTIONS]
+            return [
+                {
+                    'function': f"{name} ({os.path.basename(filename)}:{line})",
+                    'calls': calls,
+                    'self_ms': round(self_time * 1000, 3),
+                    'cumulative_ms': round(cumulative * 1000, 3)
+                }
+                for (filename, line, name), (_, calls, self_time, cumulative, _) in ranked
+            ]
+        # Inclusive samples count a function once per stack it appears in; self samples only at the leaf.
+        # Samples are spread over the measured duration, since the sampler can be delayed by the GIL
+        inclusive = Counter()
+        leaf = Counter()
+        for stack, samples in self._sampler.stacks.items():
+            labels = stack.split(';')
+            for label in set(labels):
+                inclusive[label] += samples
+            leaf[labels[-1]] += samples
+        sample_ms = self.duration * 1000 / max(sum(leaf.values()), 1)
+        return [
+            {
+                'function': label,
+                'samples': samples,
+                'self_samples': leaf[label],
+                'self_ms': round(leaf[label] * sample_ms, 3),
+                'cumulative_ms': round(samples * sample_ms, 3)
+            }
+            for label, samples in sorted(inclusive.items(), key=lambda item: (-leaf[item[0]], -item[1]))[:TOP_FUNCTIONS]
+        ]
+
+    def save(self, status_code):
+        """Write the profile and its summary to Config.PROFILE_FOLDER and return the summary"""
+        self.stop()
+        os.makedirs(Config.PROFILE_FOLDER, exist_ok=True)
+        filename = f"{self.id}.{PROFILE_EXTENSIONS[self.mode]}"
+        path = os.path.join(Config.PROFILE_FOLDER, filename)
+        if self.mode == 'cprofile':
+            self._profiler.dump_stats(path)
+        else:
+            with open(path, 'w', encoding='utf-8') as f:
+                for stack, samples in self._sampler.stacks.items():
+                    f.write(f"{stack} {samples}\n")
+
+        summary = {
+            'id': self.id,
+            'mode': self.mode,
+            'method': self.method,
+            'path': self.path,
+            'status_code': status_code,
+            'started_at': self.started_at,
+            'duration_ms': round(self.duration * 1000, 3),
+            'phases': [{'name': name, 'ms': round(seconds * 1000, 3)} for name, seconds in self.phases],
+            'samples': sum(self._sampler.stacks.values()) if self._sampler is not None else None,
+            'top_functions': self._top_functions(),
+            'profile_file': filename
+        }
+        with open(os.path.join(Config.PROFILE_FOLDER, f"{self.id}.json"), 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        _prune_profiles()
+        return summary
+
+
+def _summary_paths():
+    """Summary files, newest first"""
+    if not os.path.isdir(Config.PROFILE_FOLDER):
+        return []
+    paths = [os.path.join(Config.PROFILE_FOLDER, name) for name in os.listdir(Config.PROFILE_FOLDER)
+             if name.endswith('.json') and _PROFILE_ID_PATTERN.match(name[:-5])]
+    return sorted(paths, key=os.path.getmtime, reverse=True)
+
+
+def _prune_profiles():
+    for path in _summary_paths()[Config.PROFILE_KEEP:]:
+        profile_id = os.path.basename(path)[:-5]
+        for extension in ('json',) + tuple(PROFILE_EXTENSIONS.values()):
+            try:
+                os.remove(os.path.join(Config.PROFILE_FOLDER, f"{profile_id}.{extension}"))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles():
+    """Summaries of the stored profiles, newest first, without their function lists"""
+    summaries = []
+    for path in _summary_paths():
+        try:
+            with open(path, encoding='utf-8') as f:
+                summary = json.load(f)
+        except (OSError, ValueError):
+            continue
+        summary.pop('top_functions', None)
+        summaries.append(summary)
+    return summaries
+
+
+def load_profile(profile_id):
+    """Summary of a stored profile, or None"""
+    if not _PROFILE_ID_PATTERN.match(str(profile_id)):
+        return None
+    try:
+        with open(os.path.join(Config.PROFILE_FOLDER, f"{profile_id}.json"), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
@@ -0,0 +1,303 @@
+"""
+Registrable domains (eTLD+1) from the bundled Public Suffix List.
+
+public_suffix_list.dat is an offline copy of https://publicsuffix.org/list/
+(ICANN and private sections). Its rules are loaded once into a trie keyed by
+reversed labels ('uk' -> 'co' -> ...), with wildcard ('*.ck') and exception
+('!www.ck') rules; the longest matching rule is the public suffix and the
+suffix plus one more label is the registrable domain, so a.cdn.example.co.uk
+and b.cdn.example.co.uk both roll up to example.co.uk.
+
+split_host() walks the trie for a single host. split_hosts() resolves a
+whole column of distinct hosts with NumPy: the hosts are joined into one
+byte buffer, every suffix gets a 64-bit polynomial hash from a segmented
+cumulative sum, and the trie is walked one level at a time for all hosts
+at once by looking the suffix hashes up in a bucketed table of the hashes
+of the trie's nodes. Only hosts still on a trie path are looked up at each level.
+
+Hosts that are IP addresses, single labels or themselves a public suffix
+roll up to themselves, with an empty suffix for IP addresses.
+"""
+import os
+import numpy as np
+
+PUBLIC_SUFFIX_LIST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'public_suffix_list.dat')
+
+# Trie node keys marking the end of a rule; never valid labels
+_RULE = 0
+_EXCEPTION = 1
+
+# Node flags of the flattened trie
+_FLAG_RULE = 1
+_FLAG_EXCEPTION = 2
+_FLAG_WILDCARD = 4
+_FLAG_CHILDREN = 8
+
+# Suffix hash parameters: odd 64-bit multipliers; hosts are at most 253 bytes
+_HASH_BASE = np.uint64(0x9E3779B97F4A7C15)
+_LENGTH_MIX = np.uint64(0xC2B2AE3D27D4EB4F)
+with np.errstate(over='ignore'):
+    _HASH_POWERS = np.concatenate((np.ones(1, dtype=np.uint64),
+                                   np.cumprod(np.full(1023, _HASH_BASE, dtype=np.uint64))))
+
+# Top-of-hash bits indexing the node table; 2 ** 16 buckets for ~10k nodes
+_BUCKET_BITS = 16
+_BUCKET_SHIFT = np.uint64(64 - _BUCKET_BITS)
+
+_trie = None
+
+
+def _rule_variants(rule):
+    """A rule as written plus its punycode form, which is what URLs carry"""
+    variants = [rule]
+    try:
+        encoded = '.'.join(
+            label if label in ('*', '') else label.encode('idna').decode('ascii')
+            for label in rule.split('.')
+        )
+    except UnicodeError:
+        return variants
+    if encoded != rule:
+        variants.append(encoded)
+    return variants
+
+
+class PublicSuffixTrie:
+    """Public Suffix List rules in a reversed-label trie of nested dicts"""
+
+    def __init__(self, lines):
+        self.root = {}
+        self.rule_count = 0
+        # Longest rule in labels, which bounds how many labels a lookup reads
+        self.max_depth = 1
+        self._node_table = None
+        for line in lines:
+            rule = line.split(None, 1)[0] if line.strip() else ''
+            if not rule or rule.startswith('//'):
+                continue
+            kind = _RULE
+            if rule.startswith('!'):
+                kind, rule = _EXCEPTION, rule[1:]
+            for variant in _rule_variants(rule.lower()):
+                node = self.root
+                labels = variant.split('.')
+                for label in reversed(labels):
+                    node = node.setdefault(label, {})
+                node[kind] = True
+                self.max_depth = max(self.max_depth, len(labels))
+            self.rule_count += 1
+
+    @classmethod
+    def from_file(cls, path=PUBLIC_SUFFIX_LIST_PATH):
+        with open(path, encoding='utf-8') as f:
+            return cls(f)
+
+    def suffix_length(self, labels):
+        """
+        Number of labels in the public suffix of a host given as its labels
+        reversed (TLD first). Unlisted TLDs count as one-label suffixes.
+        """
+        node = self.root
+        length = 1
+        for depth, label in enumerate(labels, 1):
+            if '*' in node:
+                length = depth
+            child = node.get(label)
+            if child is None:
+                break
+            if _EXCEPTION in child:
+                return depth - 1
+            if _RULE in child:
+                length = depth
+            node = child
+        return length
+
+    def node_table(self):
+        """
+        Every trie node as the hash of its suffix string (sorted), a parallel
+        array of rule/exception/wildcard/children flags, and the offset of
+        the first hash in every _BUCKET_BITS-bit top-of-hash bucket
+        """
+        if self._node_table is None:
+            paths, flags = [], []
+            stack = [(self.root, '')]
+            while stack:
+                node, path = stack.pop()
+                children = [(label, child) for label, child in node.items()
+                            if isinstance(label, str) and label != '*']
+                if path:
+                    paths.append(path)
+                    flags.append((_FLAG_RULE if _RULE in node else 0)
+                                 | (_FLAG_EXCEPTION if _EXCEPTION in node else 0)
+                                 | (_FLAG_WILDCARD if '*' in node else 0)
+                                 | (_FLAG_CHILDREN if children else 0))
+                stack.extend((child, f"{label}.{path}" if path else label) for label, child in children)
+            hashes = _hash_strings(paths)
+            order = np.argsort(hashes)
+            hashes = hashes[order]
+            buckets = np.searchsorted(hashes >> _BUCKET_SHIFT, np.arange((1 << _BUCKET_BITS) + 1, dtype=np.uint64))
+            self._node_table = (hashes, np.array(flags, dtype=np.int64)[order], buckets)
+        return self._node_table
+
+    def node_flags(self, hashes):
+        """Flags of the nodes with the given suffix hashes, 0 where there is no such node"""
+        node_hashes, node_flags, buckets = self.node_table()
+        bucket = (hashes >> _BUCKET_SHIFT).astype(np.int64)
+        found = buckets[bucket]
+        # Nearly every bucket holds at most one node; binary-search the few that hold more
+        crowded = np.flatnonzero(buckets[bucket + 1] - found > 1)
+        found[crowded] = np.searchsorted(node_hashes, hashes[crowded])
+        found = np.minimum(found, len(node_hashes) - 1)
+        return np.where(node_hashes[found] == hashes, node_flags[found], 0)
+
+
+def get_trie():
+    """The bundled list's trie, loaded on first use"""
+    global _trie
+    if _trie is None:
+        _trie = PublicSuffixTrie.from_file()
+    return _trie
+
+
+def normalize_host(host):
+    """Lowercase a URL netloc and drop any userinfo, port and trailing dot"""
+    host = (host or '').lower().rsplit('@', 1)[-1]
+    if host.startswith('['):
+        return host.split(']', 1)[0] + ']'
+    return host.split(':', 1)[0].rstrip('.')
+
+
+def _is_ip(host):
+    # No TLD ends in a digit, so a trailing digit means an IPv4 address
+    return host.startswith('[') or host[-1:].isdigit()
+
+
+def split_host(host):
+    """(registrable domain, public suffix) of one host"""
+    host = normalize_host(host)
+    if not host or _is_ip(host):
+        return host, ''
+    labels = host.split('.')
+    length = get_trie().suffix_length(reversed(labels))
+    suffix = '.'.join(labels[-length:]) if length else ''
+    if length >= len(labels):
+        return host, suffix
+    return '.'.join(labels[-length - 1:]), suffix
+
+
+class _HostBuffer:
+    """Newline-separated strings as one UTF-8 buffer, with a hash for every suffix of every string"""
+
+    def __init__(self, text):
+        self.text = text
+        self.blob = text.encode('utf-8')
+        self.buffer = np.frombuffer(self.blob, dtype=np.uint8)
+        breaks = np.flatnonzero(self.buffer == 10)
+        self.starts = np.concatenate(([0], breaks + 1)).astype(np.int64)
+        self.ends = np.append(breaks, len(self.buffer)).astype(np.int64)
+
+        # Byte j of a string ending at e weighs _HASH_BASE ** (e - 1 - j), so a
+        # suffix's hash is a difference of two reverse cumulative sums (mod 2 ** 64)
+        lengths = self.ends - self.starts + 1
+        distance = np.repeat(self.ends, lengths)[:len(self.buffer)] - 1 - np.arange(len(self.buffer))
+        with np.errstate(over='ignore'):
+            terms = self.buffer.astype(np.uint64) * _HASH_POWERS[np.clip(distance, 0, len(_HASH_POWERS) - 1)]
+            self.totals = np.zeros(len(self.buffer) + 1, dtype=np.uint64)
+            self.totals[:-1] = np.cumsum(terms[::-1])[::-1]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def hashes(self, starts, rows=None):
+        """Hashes of the suffixes beginning at starts of the strings in rows (default all)"""
+        ends = self.ends if rows is None else self.ends[rows]
+        with np.errstate(over='ignore'):
+            return (self.totals[starts] - self.totals[ends]) ^ ((ends - starts).astype(np.uint64) * _LENGTH_MIX)
+
+    def factorize(self, starts):
+        """Distinct suffixes beginning at starts as (decoded values, codes)"""
+        _, first, codes = np.unique(self.hashes(starts), return_index=True, return_inverse=True)
+        bounds = zip(starts[first].tolist(), self.ends[first].tolist())
+        if len(self.text) == len(self.blob):
+            # ASCII: byte offsets are character offsets
+            values = [self.text[start:end] for start, end in bounds]
+        else:
+            values = [self.blob[start:end].decode('utf-8') for start, end in bounds]
+        return values, codes.astype(np.int64).ravel()
+
+
+def _hash_strings(values):
+    """Hashes of whole strings, comparable with _HostBuffer suffix hashes"""
+    if not values:
+        return np.zeros(0, dtype=np.uint64)
+    strings = _HostBuffer('\n'.join(values))
+    return strings.hashes(strings.starts)
+
+
+def _normalized(hosts):
+    """Lowercased hosts joined by newlines, with userinfo, ports and trailing dots stripped"""
+    joined = '\n'.join(hosts).lower()
+    if '@' not in joined and ':' not in joined and '.\n' not in joined and not joined.endswith('.'):
+        return joined
+    return '\n'.join(normalize_host(host) for host in joined.split('\n'))
+
+
+def split_hosts(hosts):
+    """
+    Resolve a sequence of host strings (typically distinct) at once. Returns
+    (registrable values, registrable codes, suffix values, suffix codes):
+    each host's registrable domain and public suffix as codes into lists of
+    distinct values, so callers can store them as integer columns.
+    """
+    hosts = list(hosts)
+    if not hosts:
+        empty = np.zeros(0, dtype=np.int64)
+        return [], empty, [], empty
+    trie = get_trie()
+    strings = _HostBuffer(_normalized(hosts))
+    buffer, starts, ends = strings.buffer, strings.starts, strings.ends
+
+    # Label counts from the dots before each host's start and end
+    dots = np.flatnonzero(buffer == ord('.'))
+    dots_before_end = np.searchsorted(dots, ends)
+    label_counts = dots_before_end - np.searchsorted(dots, starts) + 1
+
+    # suffix_starts[k - 1]: where each host's last k labels begin (its start once k >= its label count)
+    depth = trie.max_depth + 1
+    suffix_starts = np.tile(starts, (depth + 1, 1))
+    for k in range(1, depth + 2):
+        longer = np.flatnonzero(label_counts > k)
+        suffix_starts[k - 1, longer] = dots[dots_before_end[longer] - k] + 1
+
+    # Walk the trie level by level: a host stays active while its suffix is a trie node.
+    # The longest matching rule wins, but an exception rule overrides it.
+    length = np.ones(len(strings), dtype=np.int64)
+    exception_length = np.full(len(strings), -1, dtype=np.int64)
+    active = np.arange(len(strings))
+    wildcard = np.zeros(0, dtype=np.int64)
+    for k in range(1, depth + 1):
+        # A wildcard under the previous level's node matches any k-th label
+        length[wildcard[label_counts[wildcard] >= k]] = k
+        active = active[label_counts[active] >= k]
+        if not len(active):
+            break
+        flags = trie.node_flags(strings.hashes(suffix_starts[k - 1, active], active))
+        length[active[(flags & _FLAG_RULE) > 0]] = k
+        exception_length[active[(flags & _FLAG_EXCEPTION) > 0]] = k - 1
+        wildcard = active[(flags & _FLAG_WILDCARD) > 0]
+        active = active[(flags & _FLAG_CHILDREN) > 0]
+    length = np.where(exception_length >= 0, exception_length, length)
+
+    # IPs, single labels and hosts that are a public suffix themselves stand for themselves
+    rows = np.arange(len(strings))
+    padded = np.append(buffer, np.uint8(0))
+    first_bytes, last_bytes = padded[starts], padded[np.maximum(ends - 1, 0)]
+    is_ip = (ends > starts) & ((first_bytes == ord('[')) | ((last_bytes >= ord('0')) & (last_bytes <= ord('9'))))
+    registrable_starts = np.where((length < label_counts) & ~is_ip,
+                                  suffix_starts[np.minimum(length, depth), rows], starts)
+    public_suffix_starts = np.where((length > 0) & ~is_ip,
+                                    suffix_starts[np.maximum(length - 1, 0), rows], ends)
+
+    registrable_values, registrable_codes = strings.factorize(registrable_starts)
+    suffix_values, suffix_codes = strings.factorize(public_suffix_starts)
+    return registrable_values, registrable_codes, suffix_values, suffix_codes
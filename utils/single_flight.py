@@ -0,0 +1,55 @@
+"""
+Single-flight call deduplication.
+
+SingleFlight.do(key, func) runs func once per key at a time: callers that
+arrive while a call for the same key is in flight wait for it and share
+its result (or its exception) instead of starting their own. Once the
+call finishes the key is released, so later callers run func again and
+should first check whether its effect is already in place.
+"""
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Per-key deduplication of concurrent calls within one process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, *args, **kwargs):
+        """Run func(*args, **kwargs), or wait for the in-flight call with the same key"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self):
+        """Keys with a call currently running"""
+        with self._lock:
+            return list(self._calls)
@@ -1,24 +1,56 @@
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from config import Config
 
-def chrome_time_to_datetime(chrome_time):
+# Microseconds between 1601-01-01 (Chrome/WebKit epoch) and 1970-01-01
+CHROME_EPOCH_OFFSET_US = 11644473600 * 1000000
+
+_UNIX_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+def chrome_time_to_unix_micros(chrome_time):
+    """Convert Chrome's timestamp (microseconds since 1601-01-01) to Unix epoch microseconds"""
+    try:
+        if not chrome_time:
+            return 0
+        return int(chrome_time) - CHROME_EPOCH_OFFSET_US
+    except (TypeError, ValueError):
+        return 0
+
+def resolve_timezone(name=None):
+    """
+    Get a tzinfo for an IANA timezone name, defaulting to Config.DISPLAY_TIMEZONE.
+    Raises ValueError for unknown names.
+    """
+    return _load_timezone(name or Config.DISPLAY_TIMEZONE)
+
+@lru_cache(maxsize=64)
+def _load_timezone(name):
+    """Load and cache a tzinfo by name"""
+    if name.upper() == 'UTC':
+        return timezone.utc
+    try:
+        from zoneinfo import ZoneInfo
+        return ZoneInfo(name)
+    except Exception:
+        raise ValueError(f"Unknown timezone: {name}")
+
+def format_epoch_micros(micros, tz=None):
+    """Format Unix epoch microseconds as 'YYYY-MM-DD HH:MM:SS' in tz (default display timezone)"""
+    if not micros:
+        return ""
+    dt = _UNIX_EPOCH + timedelta(microseconds=int(micros))
+    if tz is None:
+        tz = resolve_timezone()
+    if tz is not timezone.utc:
+        dt = dt.astimezone(tz)
+    return dt.strftime('%Y-%m-%d %H:%M:%S')
+
+def chrome_time_to_datetime(chrome_time, tz=None):
     """
     Convert Chrome's timestamp format (microseconds since 1601-01-01) to a readable date string
     """
     try:
-        if not chrome_time:
-            return ""
-        
-        # Chrome time is microseconds since 1601-01-01
-        # First convert to seconds
-        chrome_time_seconds = int(chrome_time) / 1000000
-        
-        # Adjust for epoch difference (seconds between 1601-01-01 and 1970-01-01)
-        epoch_adjust = 11644473600
-        unix_time = chrome_time_seconds - epoch_adjust
-        
-        # Convert to datetime
-        dt = datetime.fromtimestamp(unix_time)
-        return dt.strftime('%Y-%m-%d %H:%M:%S')
+        return format_epoch_micros(chrome_time_to_unix_micros(chrome_time), tz)
     except Exception as e:
         print(f"Error converting Chrome time: {e}")
         return ""
@@ -36,6 +68,24 @@ def convert_download_state(state):
     
     return states.get(state, 'unknown')
 
+def convert_firefox_download_state(state):
+    """Convert Firefox download state code (nsIDownloadManager) to text"""
+    # Firefox download states, mapped onto the names used for Chrome
+    states = {
+        0: 'in_progress',
+        1: 'completed',
+        2: 'failed',
+        3: 'canceled',
+        4: 'interrupted',
+        5: 'in_progress',
+        6: 'blocked',
+        7: 'in_progress',
+        8: 'blocked',
+        9: 'blocked'
+    }
+    
+    return states.get(state, 'unknown')
+
 def map_chrome_visit_source(source_code):
     """
     Map Chrome's visit_source integer codes to human-readable descriptions
@@ -49,4 +99,39 @@ def map_chrome_visit_source(source_code):
         5: 'Imported from Safari'
     }
     
-    return sources.get(source_code, f'Unknown source ({source_code})')
\ No newline at end of file
+    return sources.get(source_code, f'Unknown source ({source_code})')
+
+def map_chrome_transition(transition):
+    """Map a Chrome visits.transition value to its core page transition type"""
+    # The low byte is the core type; the high bits are qualifiers (redirects, chain start/end)
+    transitions = {
+        0: 'link',
+        1: 'typed',
+        2: 'auto_bookmark',
+        3: 'auto_subframe',
+        4: 'manual_subframe',
+        5: 'generated',
+        6: 'auto_toplevel',
+        7: 'form_submit',
+        8: 'reload',
+        9: 'keyword',
+        10: 'keyword_generated'
+    }
+    
+    return transitions.get(int(transition) & 0xFF, 'unknown')
+
+def map_firefox_visit_type(visit_type):
+    """Map a Firefox moz_historyvisits.visit_type value to text"""
+    visit_types = {
+        1: 'link',
+        2: 'typed',
+        3: 'bookmark',
+        4: 'embed',
+        5: 'redirect_permanent',
+        6: 'redirect_temporary',
+        7: 'download',
+        8: 'framed_link',
+        9: 'reload'
+    }
+    
+    return visit_types.get(int(visit_type), 'unknown')
@@ -0,0 +1,190 @@
+"""
+Per-upload workspace layout and quota-based garbage collection.
+
+Every uploaded file gets its own directory under Config.UPLOAD_FOLDER:
+
+    <file_id>/
+        source.db     the uploaded history database, never modified
+        columns/      memory-mappable visit columns (.npy) and stored metadata
+        exports/      generated export files, removed after EXPORT_TTL_SECONDS
+        .last_used    touched whenever the workspace is used, for LRU eviction
+        *.lock        lock files of workspace_lock()
+
+collect_garbage() removes expired exports and legacy flat files, then evicts
+least recently used workspaces until the folder fits in WORKSPACE_QUOTA_MB.
+
+workspace_lock() is an exclusive advisory lock on a file in the workspace,
+held across processes (e.g. several server workers re-processing the same
+upload). Where fcntl is unavailable it is a no-op.
+"""
+import os
+import re
+import shutil
+import time
+from contextlib import contextmanager
+from config import Config
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+SOURCE_NAME = 'source.db'
+LOCK_SUFFIX = '.lock'
+COLUMNS_DIR = 'columns'
+EXPORTS_DIR = 'exports'
+LAST_USED_NAME = '.last_used'
+
+# file_ids are uuid4 strings; anything else must not become a path component
+_FILE_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+
+# Pre-workspace flat files: {file_id}.db and {file_id}_{type}.{ext}
+_LEGACY_FILE_PATTERN = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}[._]')
+
+# Minimum seconds between .last_used touches for the same workspace
+_TOUCH_INTERVAL = 60
+_last_touched = {}
+
+
+def workspace_dir(file_id):
+    """Get the workspace directory of a file_id. Raises ValueError for unsafe ids."""
+    file_id = str(file_id)
+    if not _FILE_ID_PATTERN.match(file_id):
+        raise ValueError(f"Invalid file ID: {file_id}")
+    return os.path.join(Config.UPLOAD_FOLDER, file_id)
+
+
+def workspace_path(file_id, *parts, create=True):
+    """Get a path inside a workspace, creating its parent directory if requested"""
+    path = os.path.join(workspace_dir(file_id), *parts)
+    if create:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def source_path(file_id):
+    """Path of the uploaded history database"""
+    return workspace_path(file_id, SOURCE_NAME)
+
+
+def columns_dir(file_id):
+    """Directory holding the memory-mappable column cache"""
+    return workspace_path(file_id, COLUMNS_DIR, create=False)
+
+
+def export_path(file_id, filename):
+    """Path of a generated export file"""
+    return workspace_path(file_id, EXPORTS_DIR, filename)
+
+
+def touch_workspace(file_id):
+    """Mark a workspace as recently used (rate-limited to one write per minute)"""
+    now = time.time()
+    if now - _last_touched.get(file_id, 0) < _TOUCH_INTERVAL:
+        return
+    directory = workspace_dir(file_id)
+    if not os.path.isdir(directory):
+        return
+    _last_touched[file_id] = now
+    with open(os.path.join(directory, LAST_USED_NAME), 'a'):
+        pass
+    os.utime(os.path.join(directory, LAST_USED_NAME), (now, now))
+
+
+@contextmanager
+def workspace_lock(file_id, name):
+    """Hold an exclusive lock named name in the workspace, blocking until it is free"""
+    if fcntl is None:
+        yield
+        return
+    with open(workspace_path(file_id, f"{name}{LOCK_SUFFIX}"), 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _last_used(directory):
+    marker = os.path.join(directory, LAST_USED_NAME)
+    return os.path.getmtime(marker if os.path.exists(marker) else directory)
+
+
+def _tree_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _remove(path):
+    """Remove a file or directory tree, returning the bytes freed"""
+    size = _tree_size(path) if os.path.isdir(path) else os.path.getsize(path)
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        os.remove(path)
+    return size
+
+
+def collect_garbage(protected=()):
+    """
+    Remove expired exports and legacy flat files, then evict least recently
+    used workspaces (never those in protected) until the upload folder is
+    within Config.WORKSPACE_QUOTA_MB. Returns a summary dictionary.
+    """
+    root = Config.UPLOAD_FOLDER
+    protected = {str(file_id) for file_id in protected}
+    expiry = time.time() - Config.EXPORT_TTL_SECONDS
+    removed = 0
+    freed = 0
+    evicted = []
+
+    if not os.path.isdir(root):
+        return {'removed_files': 0, 'evicted': [], 'freed_bytes': 0}
+
+    workspaces = []
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        try:
+            if os.path.isdir(path) and _FILE_ID_PATTERN.match(name):
+                exports = os.path.join(path, EXPORTS_DIR)
+                for export in os.listdir(exports) if os.path.isdir(exports) else []:
+                    export_file = os.path.join(exports, export)
+                    if os.path.getmtime(export_file) < expiry:
+                        freed += _remove(export_file)
+                        removed += 1
+                workspaces.append((_last_used(path), name, path))
+            elif os.path.isfile(path) and _LEGACY_FILE_PATTERN.match(name) and os.path.getmtime(path) < expiry:
+                freed += _remove(path)
+                removed += 1
+        except OSError as e:
+            print(f"Error collecting {path}: {e}")
+
+    quota = Config.WORKSPACE_QUOTA_MB * 1024 * 1024
+    sizes = {name: _tree_size(path) for _, name, path in workspaces}
+    total = sum(sizes.values())
+
+    # Oldest first
+    for _, name, path in sorted(workspaces):
+        if total <= quota:
+            break
+        if name in protected:
+            continue
+        try:
+            freed += _remove(path)
+        except OSError as e:
+            print(f"Error evicting workspace {name}: {e}")
+            continue
+        total -= sizes[name]
+        _last_touched.pop(name, None)
+        evicted.append(name)
+
+    if removed or evicted:
+        print(f"Workspace GC removed {removed} files, evicted {len(evicted)} workspaces, "
+              f"freed {freed / (1024 * 1024):.1f} MB")
+    return {'removed_files': removed, 'evicted': evicted, 'freed_bytes': freed}